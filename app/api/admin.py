@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from app.db import get_db
 from app.models import models
 from app.schemas import schemas
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_read_db
+from app.services.export import default_until, export_stream
+from app.services.system_config import config_registry, notify_change, validate
 
 router = APIRouter()
 
 # Dependencia para verificar que el usuario es Admin
-def get_admin_user(current_user: models.User = Depends(get_current_user)):
+async def get_admin_user(current_user: models.User = Depends(get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -19,31 +24,69 @@ def get_admin_user(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 @router.put("/config", response_model=schemas.SystemConfigResponse)
-def update_system_config(
+async def update_system_config(
     config_in: schemas.SystemConfigUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin_user: models.User = Depends(get_admin_user)
 ):
     """
     Actualiza una configuración del sistema.
-    Solo accesible por administradores.
+    Solo accesible por administradores. Todos los workers recargan la configuración
+    en memoria al confirmarse el cambio (ver app/services/system_config.py).
     """
-    config_item = db.query(models.SystemConfig).filter(models.SystemConfig.key == config_in.key).first()
+    config_item = await db.scalar(select(models.SystemConfig).where(models.SystemConfig.key == config_in.key))
     if not config_item:
         raise HTTPException(status_code=404, detail=f"Config key '{config_in.key}' not found")
-    
+    try:
+        validate(config_in.key, config_in.value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Invalid value for config key '{config_in.key}'")
+
     config_item.value = config_in.value
-    db.commit()
-    db.refresh(config_item)
+    await notify_change(db, config_in.key)
+    await db.commit()
+    await db.refresh(config_item)
+    # Este worker no espera a su propia notificación
+    config_registry.set(config_item.key, config_item.value)
     return config_item
 
 @router.get("/config", response_model=List[schemas.SystemConfigResponse])
-def get_system_configs(
-    db: Session = Depends(get_db),
+async def get_system_configs(
+    db: AsyncSession = Depends(get_read_db),
     admin_user: models.User = Depends(get_admin_user)
 ):
     """
     Obtiene todas las configuraciones del sistema.
     Solo accesible por administradores.
     """
-    return db.query(models.SystemConfig).all()
+    return (await db.scalars(select(models.SystemConfig))).all()
+
+_EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@router.get("/export/{entity}", response_class=StreamingResponse)
+async def export_data(
+    entity: str = Path(..., pattern="^(routes|bookings|payments)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None, # Marca de agua del extracto anterior (exclusiva)
+    until: Optional[datetime] = None, # Por defecto, ahora menos EXPORT_WATERMARK_LAG_SECONDS
+    gzip: bool = False,
+    include_path: bool = False, # Sólo rutas: el path como GeoJSON
+    db: AsyncSession = Depends(get_read_db),
+    admin_user: models.User = Depends(get_admin_user)
+):
+    """
+    Extracto en streaming (NDJSON o CSV, opcionalmente gzip) de rutas, reservas o pagos
+    con marca de agua (`created_at` o `booked_at`) en (since, until]. La cabecera
+    `X-Export-Watermark` trae el `until` usado: es el `since` del siguiente extracto.
+    Solo accesible por administradores.
+    """
+    until = until or default_until()
+    filename = f"{entity}-{until:%Y%m%dT%H%M%S}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_stream(db, entity, format, since, until, gzip, include_path),
+        media_type="application/gzip" if gzip else _EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Watermark": until.isoformat(),
+        },
+    )
@@ -1,21 +1,22 @@
-import random
-import string
-from fastapi import APIRouter, Depends, HTTPException, status
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 
-from app.db import get_db
+from app.db import ReadSessionLocal, get_db, wrote_recently
 from app.models import models
 from app.schemas import schemas
 from app.config import settings
-from passlib.context import CryptContext
 from jose import JWTError, jwt
+from app.services import otp, read_after_write
+from app.services.otp import check_rate_limit, generate_code, get_otp_store
+from app.services.passwords import hash_password, verify_password
+from app.services.user_cache import CachedUser, user_cache
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -28,7 +29,18 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def create_user_access_token(user) -> str:
+    """Token de sesión de un usuario; en modo stateless incluye sus datos en el claim `usr`."""
+    data = {"sub": str(user.id)}
+    if settings.AUTH_STATELESS_TOKENS:
+        data["usr"] = CachedUser.from_model(user).to_claims()
+    return create_access_token(data=data, expires_delta=timedelta(minutes=60))
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """
+    Devuelve un `CachedUser` (foto de solo lectura del usuario), no una instancia del ORM.
+    Se toma del token (modo stateless), de la caché o, si no está, de la tabla `users`.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,22 +54,45 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = schemas.TokenData(id=user_id)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.id == token_data.id).first()
+
+    # Para read-your-writes: las escrituras de esta sesión quedan asociadas al usuario
+    db.info["user_id"] = token_data.id
+
+    if settings.AUTH_STATELESS_TOKENS and "usr" in payload:
+        return CachedUser.from_claims(uuid.UUID(token_data.id), payload["usr"])
+
+    user = user_cache.get(token_data.id)
     if user is None:
-        raise credentials_exception
+        db_user = await db.scalar(select(models.User).where(models.User.id == token_data.id))
+        if db_user is None:
+            raise credentials_exception
+        user = CachedUser.from_model(db_user)
+        user_cache.set(token_data.id, user)
     return user
 
+async def get_read_db(request: Request, current_user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Sesión para endpoints de solo lectura: usa la réplica si está configurada
+    (READ_DATABASE_URL), salvo que el usuario haya escrito hace poco, en cuyo
+    caso se queda en el primario para que vea sus propios cambios. "Hace poco" lo
+    sabe este worker o lo dice la marca firmada que trae el cliente (ver
+    app/services/read_after_write.py), aunque la escritura la haya atendido otro.
+    """
+    if (ReadSessionLocal is None or wrote_recently(current_user.id)
+            or read_after_write.valid_marker(read_after_write.marker_from(request), current_user.id)):
+        yield db
+        return
+    async with ReadSessionLocal() as read_db:
+        yield read_db
+
 @router.post("/register", response_model=schemas.UserResponse, deprecated=True)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     # Este endpoint se mantiene pero se marca como obsoleto, favoreciendo el registro por OTP
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    password_bytes = user.password.encode('utf-8')
-    truncated_password = password_bytes[:72]
-    
-    hashed_password = pwd_context.hash(truncated_password)
+
+    hashed_password = await hash_password(user.password)
     db_user = models.User(
         full_name=user.full_name,
         email=user.email,
@@ -65,72 +100,67 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         password_hash=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Se busca por email o telefono. El username del form puede ser cualquiera de los dos.
-    user = db.query(models.User).filter(
+    user = await db.scalar(select(models.User).where(
         (models.User.email == form_data.username) | (models.User.phone_number == form_data.username)
-    ).first()
-    if not user or not user.password_hash or not pwd_context.verify(form_data.password, user.password_hash):
+    ))
+    valid, new_hash = False, None
+    if user and user.password_hash:
+        valid, new_hash = await verify_password(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=60)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    if new_hash:
+        # El hash usaba menos rondas que BCRYPT_ROUNDS: se reemplaza de forma transparente
+        user.password_hash = new_hash
+        await db.commit()
+    access_token = create_user_access_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 # --- Nuevos Endpoints para registro por Teléfono (OTP) ---
 
 @router.post("/otp/request", response_model=schemas.PhoneVerificationResponse)
-def request_otp(req: schemas.PhoneVerificationRequest, db: Session = Depends(get_db)):
+async def request_otp(req: schemas.PhoneVerificationRequest, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Genera un código OTP para un número de teléfono y lo devuelve para simulación.
+    Limitado por teléfono y por IP (429 con Retry-After); ver app/services/otp.py.
     """
+    check_rate_limit(req.phone_number, request.client.host if request.client else None)
     # En producción, aquí se haría la llamada a la API de SMS (Twilio, etc.)
-    otp_code = "".join(random.choices(string.digits, k=6))
-    expires_at = datetime.utcnow() + timedelta(minutes=5)
-
-    # Guardar o actualizar el código de verificación
-    verification = db.query(models.PhoneVerification).filter_by(phone_number=req.phone_number).first()
-    if verification:
-        verification.otp_code = otp_code
-        verification.expires_at = expires_at
-    else:
-        verification = models.PhoneVerification(
-            phone_number=req.phone_number,
-            otp_code=otp_code,
-            expires_at=expires_at,
-        )
-        db.add(verification)
-    
-    db.commit()
+    otp_code = generate_code()
+
+    # Guardar o reemplazar el código de verificación
+    await get_otp_store().issue(db, req.phone_number, otp_code, settings.OTP_TTL_SECONDS)
+    await db.commit()
 
     # Devolvemos el código para que el frontend pueda simular el flujo
     return {"phone_number": req.phone_number, "otp_code": otp_code}
 
 @router.post("/otp/verify", response_model=schemas.Token)
-def verify_otp_and_register(req: schemas.PhoneVerificationVerify, db: Session = Depends(get_db)):
+async def verify_otp_and_register(req: schemas.PhoneVerificationVerify, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Verifica un código OTP y, si es correcto, crea/loguea al usuario.
     """
-    verification = db.query(models.PhoneVerification).filter_by(phone_number=req.phone_number).first()
-
-    if not verification or verification.otp_code != req.otp_code:
+    check_rate_limit(req.phone_number, request.client.host if request.client else None)
+    # Un código correcto se consume (se borra) en la misma operación
+    result = await get_otp_store().consume(db, req.phone_number, req.otp_code)
+    if result == otp.INVALID:
         raise HTTPException(status_code=400, detail="Invalid OTP code")
-    
-    if datetime.utcnow() > verification.expires_at:
+    if result == otp.EXPIRED:
+        await db.commit()  # El código vencido también se consumió
         raise HTTPException(status_code=400, detail="OTP code has expired")
 
     # El código es válido, buscar o crear al usuario
-    user = db.query(models.User).filter_by(phone_number=req.phone_number).first()
+    user = await db.scalar(select(models.User).filter_by(phone_number=req.phone_number))
     if not user:
         user = models.User(
             phone_number=req.phone_number,
@@ -139,15 +169,10 @@ def verify_otp_and_register(req: schemas.PhoneVerificationVerify, db: Session =
         )
         db.add(user)
     
-    # Eliminar el código de verificación usado
-    db.delete(verification)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     # Crear token y devolverlo
-    access_token_expires = timedelta(minutes=60)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -1,21 +1,102 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from geoalchemy2.elements import WKBElement
-from typing import List
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+from typing import List, Optional
 import uuid
 
 from app.db import get_db
 from app.models import models
 from app.schemas import schemas
 from app.api.auth import get_current_user
+from app.services import seats
+from app.services.pricing import route_distance_km, stop_distance_km, trip_price
+from app.services.quotes import quote_pairs, redeem_quote_token
+from app.config import settings
 
 router = APIRouter()
 
+async def _get_bookable_route(db: AsyncSession, route_id: uuid.UUID) -> models.Route:
+    route = await db.scalar(select(models.Route).where(models.Route.id == route_id))
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    if route.status != models.RouteStatus.active:
+        raise HTTPException(status_code=400, detail="Route is not active")
+    if route.available_seats <= 0:
+        raise HTTPException(status_code=400, detail="No available seats")
+    return route
+
+async def _get_bookable_occurrence_id(db: AsyncSession, route: models.Route, occurrence_id: Optional[uuid.UUID]) -> Optional[uuid.UUID]:
+    """En rutas recurrentes se reserva una ocurrencia concreta, que tiene sus propios asientos."""
+    if not route.is_recurrent:
+        if occurrence_id is not None:
+            raise HTTPException(status_code=400, detail="Route is not recurrent")
+        return None
+    if occurrence_id is None:
+        raise HTTPException(status_code=400, detail="occurrence_id is required for recurrent routes")
+    occurrence = await db.scalar(select(models.RouteOccurrence).where(
+        models.RouteOccurrence.id == occurrence_id,
+        models.RouteOccurrence.route_id == route.id
+    ))
+    if not occurrence:
+        raise HTTPException(status_code=404, detail="Route occurrence not found")
+    if occurrence.status != models.RouteStatus.active:
+        raise HTTPException(status_code=400, detail="Route occurrence is not active")
+    return occurrence.id
+
+async def _get_route_stops(db: AsyncSession, route: models.Route, pickup_stop_id, dropoff_stop_id):
+    if not pickup_stop_id or not dropoff_stop_id:
+        raise HTTPException(status_code=400, detail="Both pickup_stop_id and dropoff_stop_id are required")
+    result = await db.scalars(select(models.RouteStop).where(
+        models.RouteStop.route_id == route.id,
+        models.RouteStop.id.in_([pickup_stop_id, dropoff_stop_id])
+    ))
+    found = {stop.id: stop for stop in result}
+    if pickup_stop_id not in found or dropoff_stop_id not in found:
+        raise HTTPException(status_code=404, detail="Stop not found on this route")
+    return found[pickup_stop_id], found[dropoff_stop_id]
+
+@router.post("/quote", response_model=schemas.QuoteResponse)
+async def quote_booking(
+    quote_in: schemas.QuoteRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Calcula el precio de un viaje sin crear la reserva.
+    El `quote_token` de la respuesta se puede enviar a POST /bookings para reservar con ese precio.
+    """
+    route = await _get_bookable_route(db, quote_in.route_id)
+    [quote] = await quote_pairs(db, route, [(quote_in.pickup_point.coordinates, quote_in.dropoff_point.coordinates)])
+    if quote is None:
+        raise HTTPException(status_code=400, detail="Could not calculate distance along route. Ensure pickup/dropoff points are near the route path.")
+    return quote
+
+@router.post("/quote/batch", response_model=List[schemas.QuoteResponse])
+async def quote_booking_batch(
+    batch_in: schemas.BatchQuoteRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Cotiza varias combinaciones de recogida/bajada sobre una misma ruta en una sola llamada.
+    Las respuestas vienen en el mismo orden que los pares enviados.
+    """
+    if not batch_in.pairs:
+        return []
+    if len(batch_in.pairs) > settings.QUOTE_BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.QUOTE_BATCH_MAX_PAIRS} pairs per request")
+    route = await _get_bookable_route(db, batch_in.route_id)
+    quotes = await quote_pairs(db, route, [(p.pickup_point.coordinates, p.dropoff_point.coordinates) for p in batch_in.pairs])
+    if any(q is None for q in quotes):
+        raise HTTPException(status_code=400, detail="Could not calculate distance along route. Ensure pickup/dropoff points are near the route path.")
+    return quotes
+
 @router.post("/", response_model=schemas.BookingResponse, status_code=status.HTTP_201_CREATED)
-def create_booking(
+async def create_booking(
     booking_in: schemas.BookingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
@@ -23,109 +104,90 @@ def create_booking(
     Calcula el precio basado en la distancia a recorrer sobre el path de la ruta.
     La reserva se crea en estado 'pending' hasta que se procesa el pago.
     """
-    route = db.query(models.Route).filter(models.Route.id == booking_in.route_id).first()
-    if not route:
-        raise HTTPException(status_code=404, detail="Route not found")
-    if route.status != models.RouteStatus.active:
-        raise HTTPException(status_code=400, detail="Route is not active")
-    if route.available_seats <= 0:
-        raise HTTPException(status_code=400, detail="No available seats")
+    route = await _get_bookable_route(db, booking_in.route_id)
+    occurrence_id = await _get_bookable_occurrence_id(db, route, booking_in.occurrence_id)
+
+    # Convertir puntos de entrada a WKBElement para guardar en la BD
+    pickup_wkb = from_shape(Point(booking_in.pickup_point.coordinates[:2]), srid=4326, extended=True)
+    dropoff_wkb = from_shape(Point(booking_in.dropoff_point.coordinates[:2]), srid=4326, extended=True)
 
     # --- Lógica de Cálculo de Precio ---
-    # 1. Proyectar los puntos de subida/bajada del pasajero sobre la línea de la ruta
-    # 2. Crear una sub-línea (un recorte) del path de la ruta entre esos dos puntos
-    # 3. Calcular la longitud de esa sub-línea en metros y convertir a km
-    # 4. Multiplicar por el precio/km de la ruta
-
-    # Esta es una consulta SQL compleja que usa funciones de PostGIS
-    sql_query = text("""
-        WITH
-        line AS (SELECT path FROM routes WHERE id = :route_id),
-        start_point AS (SELECT ST_SetSRID(ST_MakePoint(:start_lon, :start_lat), 4326) as geom),
-        end_point AS (SELECT ST_SetSRID(ST_MakePoint(:end_lon, :end_lat), 4326) as geom),
-        
-        start_fraction AS (SELECT ST_LineLocatePoint(line.path, start_point.geom) as fraction FROM line, start_point),
-        end_fraction AS (SELECT ST_LineLocatePoint(line.path, end_point.geom) as fraction FROM line, end_point),
-
-        subline AS (
-            SELECT ST_LineSubstring(line.path, LEAST(start_fraction.fraction, end_fraction.fraction), GREATEST(start_fraction.fraction, end_fraction.fraction)) as segment
-            FROM line, start_fraction, end_fraction
+    # Entre dos paradas de la ruta, el precio sale de sus fracciones ya guardadas.
+    # Si el pasajero ya cotizó estos puntos, se reutiliza el precio de la cotización.
+    # Si no, se calcula la distancia sobre el path de la ruta (ver app/services/pricing.py).
+    calculated_price = None
+    if booking_in.pickup_stop_id or booking_in.dropoff_stop_id:
+        pickup_stop, dropoff_stop = await _get_route_stops(db, route, booking_in.pickup_stop_id, booking_in.dropoff_stop_id)
+        if pickup_stop.fraction >= dropoff_stop.fraction:
+            raise HTTPException(status_code=400, detail="The pickup stop must come before the dropoff stop")
+        pickup_wkb, dropoff_wkb = pickup_stop.location, dropoff_stop.location
+        calculated_price = trip_price(stop_distance_km(route, pickup_stop.fraction, dropoff_stop.fraction), route)
+    elif booking_in.quote_token:
+        calculated_price = redeem_quote_token(
+            booking_in.quote_token, route, booking_in.pickup_point.coordinates, booking_in.dropoff_point.coordinates
         )
+        if calculated_price is None:
+            raise HTTPException(status_code=400, detail="Invalid or expired quote token")
+    else:
+        distance_km = await route_distance_km(
+            db, route, booking_in.pickup_point.coordinates, booking_in.dropoff_point.coordinates
+        )
+        if distance_km is None:
+            raise HTTPException(status_code=400, detail="Could not calculate distance along route. Ensure pickup/dropoff points are near the route path.")
+        calculated_price = trip_price(distance_km, route)
 
-        SELECT ST_Length(segment::geography) / 1000.0 as distance_km FROM subline;
-    """)
-
-    result = db.execute(sql_query, {
-        "route_id": str(route.id),
-        "start_lon": booking_in.pickup_point.coordinates[0],
-        "start_lat": booking_in.pickup_point.coordinates[1],
-        "end_lon": booking_in.dropoff_point.coordinates[0],
-        "end_lat": booking_in.dropoff_point.coordinates[1],
-    }).first()
-
-    if not result or result.distance_km is None:
-        raise HTTPException(status_code=400, detail="Could not calculate distance along route. Ensure pickup/dropoff points are near the route path.")
-
-    distance_km = result.distance_km
-    calculated_price = float(distance_km) * float(route.price_per_km)
-
-    # Convertir puntos de entrada a WKBElement para guardar en la BD
-    pickup_wkb = WKBElement(f'SRID=4326;POINT({booking_in.pickup_point.coordinates[0]} {booking_in.pickup_point.coordinates[1]})', extended=True)
-    dropoff_wkb = WKBElement(f'SRID=4326;POINT({booking_in.dropoff_point.coordinates[0]} {booking_in.dropoff_point.coordinates[1]})', extended=True)
+    # Retener un asiento hasta que se pague (o venza la retención)
+    if await seats.reserve_seat(db, route.id, occurrence_id) is None:
+        raise HTTPException(status_code=400, detail="No available seats")
 
     db_booking = models.Booking(
         passenger_id=current_user.id,
         route_id=booking_in.route_id,
+        occurrence_id=occurrence_id,
         pickup_point=pickup_wkb,
         dropoff_point=dropoff_wkb,
-        calculated_price=calculated_price
+        calculated_price=calculated_price,
+        hold_expires_at=seats.hold_expiry()
         # El status por defecto es 'pending'
     )
     db.add(db_booking)
-    db.commit()
-    db.refresh(db_booking)
+    await db.commit()
+    await db.refresh(db_booking)
 
     return db_booking
 
 @router.post("/{booking_id}/pay", response_model=schemas.PaymentResponse)
-def pay_for_booking(
+async def pay_for_booking(
     booking_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Simula el pago de una reserva pendiente.
-    Esta operación es atómica: descuenta el asiento y confirma la reserva.
+    El asiento ya está retenido desde la reserva, así que no se bloquea la fila de la ruta;
+    si la retención venció y se liberó, se intenta tomar otro asiento con un UPDATE atómico.
     """
-    with db.begin_nested(): # Inicia un SAVEPOINT para la transacción
-        booking = db.query(models.Booking).filter(
-            models.Booking.id == booking_id,
-            models.Booking.passenger_id == current_user.id
-        ).first()
-
-        if not booking:
-            raise HTTPException(status_code=404, detail="Booking not found or you don't have access to it")
-        if booking.status != models.BookingStatus.pending:
-            raise HTTPException(status_code=400, detail=f"Booking is not pending. Current status: {booking.status}")
-
-        # Bloquear la fila de la ruta para evitar que dos personas reserven el último asiento a la vez
-        route = db.query(models.Route).filter(models.Route.id == booking.route_id).with_for_update().one()
-
-        if route.available_seats <= 0:
-            raise HTTPException(status_code=400, detail="No more available seats on this route")
-
-        # Todo en orden, proceder con la reserva y pago (simulado)
-        route.available_seats -= 1
-        booking.status = models.BookingStatus.confirmed
-
-        db_payment = models.Payment(
-            booking_id=booking.id,
-            amount=booking.calculated_price,
-            status=models.PaymentStatus.completed,
-            payment_gateway_ref=f"sim_{uuid.uuid4()}" # ID de transacción simulado
-        )
-        db.add(db_payment)
-        db.commit()
-    
-    db.refresh(db_payment)
+    booking = await db.scalar(select(models.Booking).where(
+        models.Booking.id == booking_id,
+        models.Booking.passenger_id == current_user.id
+    ))
+
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found or you don't have access to it")
+    if booking.status not in (models.BookingStatus.pending, models.BookingStatus.expired):
+        raise HTTPException(status_code=400, detail=f"Booking is not pending. Current status: {booking.status}")
+
+    if not await seats.confirm_booking(db, booking):
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="No more available seats on this route")
+
+    db_payment = models.Payment(
+        booking_id=booking.id,
+        amount=booking.calculated_price,
+        status=models.PaymentStatus.completed,
+        payment_gateway_ref=f"sim_{uuid.uuid4()}" # ID de transacción simulado
+    )
+    db.add(db_payment)
+    await db.commit()
+    await db.refresh(db_payment)
     return db_payment
@@ -1,94 +1,471 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from geoalchemy2.elements import WKBElement
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from sqlalchemy import func, or_, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db import get_db
+from datetime import datetime, timezone
+import asyncio
+import uuid
+from app.db import AsyncSessionLocal, get_db
 from app.models import models
 from app.schemas import schemas
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_read_db
 from app.services.geolocation import get_location_details
+from app.services.geojson import path_format_params
+from app.services.simplification import path_levels
+from app.services.route_index import route_index
+from app.services.search_cache import is_bookable, search_cache
+from app.services.seat_feed import seat_feed, seat_update, serve
+from app.services.system_config import DEFAULT_PRICE_PER_KM, config_registry
+from app.services import journeys, matching, proximity, recurrence, route_import, stops
+from app.services.pagination import as_utc, decode_cursor, encode_cursor, naive_utc
+from app.config import settings
 
 router = APIRouter()
 
 @router.post("/", response_model=schemas.RouteResponse, status_code=201)
-def create_route(
+async def create_route(
     route: schemas.RouteCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Validar que el vehicle_id pertenezca al usuario actual
-    vehicle = db.query(models.Vehicle).filter(
+    vehicle = await db.scalar(select(models.Vehicle).where(
         models.Vehicle.id == route.vehicle_id,
         models.Vehicle.owner_id == current_user.id
-    ).first()
+    ))
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found or does not belong to the current user")
 
     # Obtener precio por km
     price_per_km = route.price_per_km
     if price_per_km is None:
-        default_price_config = db.query(models.SystemConfig).filter(models.SystemConfig.key == 'default_price_per_km_cop').first()
-        if not default_price_config:
+        # Desde la configuración en memoria; sólo consulta la BD si no se pudo cargar al arrancar
+        await config_registry.ensure_loaded(db)
+        price_per_km = config_registry.get(DEFAULT_PRICE_PER_KM, None)
+        if price_per_km is None:
             raise HTTPException(status_code=500, detail="Default price per km is not configured")
-        price_per_km = float(default_price_config.value)
 
-    # Obtener detalles de localización (simulado)
+    # Ciudad y país de origen y destino (las dos consultas en paralelo)
     start_coords = route.path.coordinates[0]
     end_coords = route.path.coordinates[-1]
-    start_location = get_location_details(lon=start_coords[0], lat=start_coords[1])
-    end_location = get_location_details(lon=end_coords[0], lat=end_coords[1])
+    start_location, end_location = await asyncio.gather(
+        get_location_details(lon=start_coords[0], lat=start_coords[1]),
+        get_location_details(lon=end_coords[0], lat=end_coords[1]),
+    )
 
-    # Convertir Pydantic schema a un objeto WKBElement para GeoAlchemy2
-    coordinates_str = ", ".join([f"{p[0]} {p[1]}" for p in route.path.coordinates])
-    path_wkb = WKBElement(f'SRID=4326;LINESTRING({coordinates_str})', extended=True)
+    # Path completo (precio, recogida/bajada) y versiones simplificadas (búsqueda, zoom)
+    paths = path_levels(route.path.coordinates)
 
     db_route = models.Route(
         driver_id=current_user.id,
         vehicle_id=route.vehicle_id,
-        departure_time=route.departure_time,
-        estimated_arrival_time=route.estimated_arrival_time,
+        # Las columnas son TIMESTAMP sin zona horaria: se guardan en UTC
+        departure_time=naive_utc(route.departure_time),
+        estimated_arrival_time=naive_utc(route.estimated_arrival_time),
         available_seats=route.available_seats,
         price_per_km=price_per_km,
-        path=path_wkb,
+        **paths,
         start_city=start_location['city'],
         start_country=start_location['country'],
         end_city=end_location['city'],
-        end_country=end_location['country']
+        end_country=end_location['country'],
+        is_recurrent=route.recurrence is not None,
+        recurrence_pattern=route.recurrence.model_dump(mode="json") if route.recurrence else None
     )
     db.add(db_route)
-    db.commit()
-    db.refresh(db_route)
+    await db.flush()
+
+    # Paradas: las enviadas o generadas a lo largo del path, en un solo INSERT
+    await stops.create_route_stops(
+        db, db_route.id, route.path.coordinates,
+        [stop.location.coordinates for stop in sorted(route.stops or [], key=lambda stop: stop.order)],
+        route.stop_interval_meters
+    )
+    occurrences = []
+    if db_route.is_recurrent:
+        # Ruta recurrente: el path se guarda una vez y se generan las ocurrencias de la ventana
+        occurrences = await recurrence.materialize(db, db_route)
+    await db.commit()
+    await db.refresh(db_route)
+
+    if settings.ROUTE_INDEX_ENABLED:
+        route_index.upsert_route(db_route)
+        recurrence.index_occurrences(occurrences)
+    elif settings.SEARCH_CACHE_ENABLED:
+        # Los corredores en caché por los que pasa la ruta ya no tienen todos sus viajes
+        search_cache.route_added(
+            route.path.coordinates,
+            [occurrence.departure_time for occurrence in occurrences] or [db_route.departure_time]
+        )
+    if settings.JOURNEY_PLANNER_ENABLED:
+        # Sólo se calculan las vecinas de la ruta nueva; en un hilo, para no bloquear el event loop
+        await asyncio.to_thread(
+            journeys.transfer_graph.add, db_route.id, route.path.coordinates, db_route.departure_time,
+            db_route.estimated_arrival_time, db_route.is_recurrent
+        )
     return db_route
 
-@router.get("/search", response_model=List[schemas.RouteResponse])
-def search_routes(
+_BULK_CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/geo+json": "geojson",
+    "application/json": "geojson",
+}
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkRouteImportResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/x-ndjson": {"schema": {"type": "string"}},
+        "application/geo+json": {"schema": {"type": "object"}},
+    }}},
+)
+async def bulk_import_routes(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    input_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|geojson)$"), # Por defecto, según Content-Type
+):
+    """
+    Crea muchas rutas del usuario actual: NDJSON (una ruta por línea, como en `POST /routes/`
+    o como Feature GeoJSON) o un FeatureCollection GeoJSON (`geometry` = path, `properties` =
+    el resto de campos). El cuerpo se procesa en streaming y se confirma por lotes, así que
+    las filas inválidas no impiden crear las demás: la respuesta trae los errores por fila.
+    """
+    if input_format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        input_format = _BULK_CONTENT_TYPES.get(content_type)
+        if input_format is None:
+            raise HTTPException(status_code=415, detail="Use application/x-ndjson or application/geo+json, or pass ?format=")
+    return await route_import.import_routes(db, current_user.id, request.stream(), input_format)
+
+@router.get("/search", response_model=List[schemas.RouteResponse], dependencies=[Depends(path_format_params)])
+async def search_routes(
     from_lat: float,
     from_lon: float,
     to_lat: float,
     to_lon: float,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user), # Asegurarse que el usuario está logueado
-    buffer_meters: Optional[int] = 500 # Radio de búsqueda alrededor de los puntos
+    buffer_meters: int = Query(500, gt=0, le=settings.ROUTE_SEARCH_MAX_BUFFER_M), # Radio de búsqueda alrededor de los puntos
+    departure_after: Optional[datetime] = None,
+    departure_before: Optional[datetime] = None,
+    cursor: Optional[str] = None, # Valor de la cabecera X-Next-Cursor de la página anterior
+    limit: int = Query(20, ge=1, le=settings.ROUTE_SEARCH_MAX_PAGE_SIZE)
 ):
     """
     Busca rutas que pasen cerca de los puntos de origen y destino especificados por el pasajero.
+    Si el índice espacial en memoria está habilitado, el filtro geográfico se resuelve
+    en el proceso (con el radio en metros) y a la BD sólo se le piden las filas. Si no,
+    los viajes de cada corredor origen/destino se cachean (ver app/services/search_cache.py).
+
+    Los resultados se ordenan por hora de salida y se paginan por keyset: si hay más
+    resultados, la respuesta incluye la cabecera `X-Next-Cursor` para pedir la siguiente página.
+    De las rutas recurrentes se devuelve cada ocurrencia (con su `occurrence_id`, salida y asientos).
+    Cada resultado incluye las paradas más cercanas al origen y al destino (`pickup_stop`,
+    `dropoff_stop`) con su fracción sobre el path, para reservar entre ellas sin volver a proyectar.
     """
-    # Convertir los puntos de origen y destino del pasajero a objetos PostGIS POINT
-    passenger_origin = func.ST_SetSRID(func.ST_MakePoint(from_lon, from_lat), 4326)
-    passenger_destination = func.ST_SetSRID(func.ST_MakePoint(to_lon, to_lat), 4326)
+    after_key = decode_cursor(cursor)
 
-    # Realizar la búsqueda geoespacial
-    routes = db.query(models.Route).filter(
-        models.Route.available_seats > 0,
-        models.Route.status == models.RouteStatus.active,
-        # La ruta debe pasar cerca del origen del pasajero
-        func.ST_DWithin(models.Route.path, passenger_origin, buffer_meters),
-        # La ruta debe pasar cerca del destino del pasajero
-        func.ST_DWithin(models.Route.path, passenger_destination, buffer_meters)
-    ).all()
+    if settings.ROUTE_INDEX_ENABLED:
+        routes = await _search_with_index(
+            db, from_lon, from_lat, to_lon, to_lat, buffer_meters,
+            departure_after, departure_before, after_key, limit + 1
+        )
+    else:
+        routes = None
+        if settings.SEARCH_CACHE_ENABLED:
+            routes = await _search_with_cache(
+                db, from_lon, from_lat, to_lon, to_lat, buffer_meters,
+                departure_after, departure_before, after_key, limit + 1
+            )
+        if routes is None:
+            query, trips = _trips_near(from_lon, from_lat, to_lon, to_lat, buffer_meters)
+            query = query.where(
+                trips.c.available_seats > 0,
+                trips.c.status == models.RouteStatus.active,
+            )
+            # Ventana de salida y keyset; usan el índice (status, departure_time) de cada tabla
+            if departure_after is not None:
+                query = query.where(trips.c.departure_time >= naive_utc(departure_after))
+            if departure_before is not None:
+                query = query.where(trips.c.departure_time < naive_utc(departure_before))
+            if after_key is not None:
+                after_departure, after_id = after_key
+                query = query.where(tuple_(trips.c.departure_time, trips.c.trip_id) > (naive_utc(after_departure), after_id))
+            result = await db.execute(query.order_by(trips.c.departure_time, trips.c.trip_id).limit(limit + 1))
+            routes = [recurrence.trip(*row) for row in result.all()]
 
     if not routes:
         raise HTTPException(status_code=404, detail="No se encontraron rutas que cumplan los criterios.")
-    
+
+    if len(routes) > limit:
+        routes = routes[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(*recurrence.trip_key(routes[-1]))
+    await stops.attach_nearest_stops(db, routes, from_lon, from_lat, to_lon, to_lat)
+    return routes
+
+@router.get("/match", response_model=List[schemas.RouteMatchResponse], dependencies=[Depends(path_format_params)])
+async def match_routes(
+    from_lat: float,
+    from_lon: float,
+    to_lat: float,
+    to_lon: float,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    buffer_meters: int = Query(500, gt=0, le=settings.ROUTE_SEARCH_MAX_BUFFER_M),
+    desired_departure: Optional[datetime] = None, # Por defecto: ahora
+    departure_after: Optional[datetime] = None,
+    departure_before: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=settings.MATCH_MAX_RESULTS)
+):
+    """
+    Devuelve las mejores rutas para el pasajero: sólo las que lo recogen antes de dejarlo,
+    ordenadas por caminata total y diferencia con la hora de salida deseada.
+    Cada resultado incluye las fracciones y los puntos de recogida/bajada sobre la ruta.
+    """
+    if desired_departure is None:
+        desired_departure = departure_after or datetime.now(timezone.utc)
+    matches = await matching.match_routes(
+        db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure, limit,
+        departure_after=departure_after, departure_before=departure_before
+    )
+    if not matches:
+        raise HTTPException(status_code=404, detail="No se encontraron rutas que cumplan los criterios.")
+    return matches
+
+@router.get("/journeys", response_model=List[schemas.JourneyResponse], dependencies=[Depends(path_format_params)])
+async def plan_journeys(
+    from_lat: float,
+    from_lon: float,
+    to_lat: float,
+    to_lon: float,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    buffer_meters: int = Query(500, gt=0, le=settings.ROUTE_SEARCH_MAX_BUFFER_M),
+    transfer_meters: Optional[float] = Query(None, gt=0, le=settings.JOURNEY_TRANSFER_METERS), # Por defecto: el máximo
+    desired_departure: Optional[datetime] = None, # Por defecto: departure_after
+    departure_after: Optional[datetime] = None, # Por defecto: ahora
+    departure_before: Optional[datetime] = None,
+    limit: int = Query(5, ge=1, le=settings.JOURNEY_MAX_RESULTS)
+):
+    """
+    Viajes de dos tramos para cuando ninguna ruta sirve sola: la primera pasa cerca del
+    origen, la segunda cerca del destino y entre ellas se camina hasta `transfer_meters`
+    con horarios compatibles. Ordenados por caminata total, espera y diferencia con la
+    hora de salida deseada. Ver app/services/journeys.py.
+    """
+    if not settings.JOURNEY_PLANNER_ENABLED:
+        raise HTTPException(status_code=404, detail="Journey planner is disabled")
+    departure_after = departure_after or datetime.now(timezone.utc)
+    journeys_found = await journeys.plan_journeys(
+        db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure or departure_after, limit,
+        departure_after, departure_before=departure_before, transfer_meters=transfer_meters
+    )
+    if not journeys_found:
+        raise HTTPException(status_code=404, detail="No se encontraron viajes con transbordo que cumplan los criterios.")
+    return journeys_found
+
+@router.websocket("/live")
+async def live_seats(websocket: WebSocket, token: str = Query(...)):
+    """
+    Cambios de asientos de las rutas u ocurrencias suscritas, en vez de repetir
+    /routes/search. El protocolo está en app/services/seat_feed.py.
+    """
+    if not settings.SEAT_FEED_ENABLED:
+        await websocket.close(code=1008)
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await get_current_user(token, db)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await serve(websocket, seat_feed, _seat_snapshot, settings.SEAT_FEED_MAX_IDS, settings.SEAT_FEED_SEND_TIMEOUT_SECONDS)
+
+async def _seat_snapshot(ids: List[str]) -> List[dict]:
+    """Estado actual de los ids recién suscritos; de una ruta recurrente, sus próximas ocurrencias."""
+    trip_ids = [uuid.UUID(trip_id) for trip_id in ids]
+    # Una sesión corta por suscripción: la conexión no retiene una conexión del pool
+    async with AsyncSessionLocal() as db:
+        routes = await db.execute(
+            select(models.Route.id, models.Route.available_seats, models.Route.status)
+            .where(models.Route.id.in_(trip_ids))
+        )
+        occurrences = await db.execute(
+            select(models.RouteOccurrence.route_id, models.RouteOccurrence.id,
+                   models.RouteOccurrence.available_seats, models.RouteOccurrence.status)
+            .where(or_(
+                models.RouteOccurrence.id.in_(trip_ids),
+                models.RouteOccurrence.route_id.in_(trip_ids)
+                & (models.RouteOccurrence.departure_time >= datetime.utcnow()),
+            ))
+        )
+        return [seat_update(route_id, None, seats, route_status) for route_id, seats, route_status in routes] + [
+            seat_update(route_id, occurrence_id, seats, route_status)
+            for route_id, occurrence_id, seats, route_status in occurrences
+        ]
+
+@router.get("/{route_id}/occurrences", response_model=List[schemas.RouteOccurrenceResponse])
+async def list_route_occurrences(
+    route_id: uuid.UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    departure_after: Optional[datetime] = None, # Por defecto: ahora
+    departure_before: Optional[datetime] = None
+):
+    """
+    Ocurrencias de una ruta recurrente dentro de una ventana de salida (p. ej. una semana).
+    Sólo se lee el rango pedido, por el índice único (route_id, departure_time).
+    """
+    route = await db.get(models.Route, route_id)
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    if not route.is_recurrent:
+        raise HTTPException(status_code=400, detail="Route is not recurrent")
+
+    query = select(models.RouteOccurrence).where(
+        models.RouteOccurrence.route_id == route_id,
+        models.RouteOccurrence.departure_time >= naive_utc(departure_after or datetime.utcnow())
+    )
+    if departure_before is not None:
+        query = query.where(models.RouteOccurrence.departure_time < naive_utc(departure_before))
+    result = await db.scalars(query.order_by(models.RouteOccurrence.departure_time))
+    return result.all()
+
+def _trips_near(from_lon, from_lat, to_lon, to_lat, buffer_meters):
+    """
+    Consulta de los viajes cuyas rutas pasan cerca del origen y luego del destino, sin
+    filtrar asientos, estado ni salida. Devuelve la consulta y la subconsulta de viajes.
+    """
+    # Filtro grueso con el path simplificado (índice más pequeño, menos vértices);
+    # ampliar el radio con la tolerancia garantiza no perder rutas válidas.
+    coarse_buffer = buffer_meters + settings.PATH_COARSE_TOLERANCE_M
+
+    # Viajes: rutas sueltas y ocurrencias de las recurrentes (ver app/services/recurrence.py)
+    trips = recurrence.bookable_trips()
+
+    # Realizar la búsqueda geoespacial. Los radios van en metros: cada condición usa el
+    # índice GiST de la columna y luego mide sobre el elipsoide (ver app/services/proximity.py)
+    query = select(
+        models.Route,
+        trips.c.occurrence_id,
+        trips.c.departure_time,
+        trips.c.estimated_arrival_time,
+        trips.c.available_seats,
+        trips.c.status,
+    ).join(trips, trips.c.route_id == models.Route.id).where(
+        proximity.dwithin_meters(models.Route.path_coarse, from_lon, from_lat, coarse_buffer),
+        proximity.dwithin_meters(models.Route.path_coarse, to_lon, to_lat, coarse_buffer),
+        *_path_near(from_lon, from_lat, to_lon, to_lat, buffer_meters)
+    )
+    return query, trips
+
+def _path_near(from_lon, from_lat, to_lon, to_lat, buffer_meters):
+    """Condiciones exactas sobre `Route.path`: pasa cerca del origen y luego del destino."""
+    return (
+        # La ruta debe pasar cerca del origen del pasajero
+        proximity.dwithin_meters(models.Route.path, from_lon, from_lat, buffer_meters),
+        # La ruta debe pasar cerca del destino del pasajero
+        proximity.dwithin_meters(models.Route.path, to_lon, to_lat, buffer_meters),
+        # Y en ese orden: el origen debe quedar antes que el destino sobre el path
+        func.ST_LineLocatePoint(models.Route.path, proximity.make_point(from_lon, from_lat))
+        < func.ST_LineLocatePoint(models.Route.path, proximity.make_point(to_lon, to_lat)),
+    )
+
+async def _routes_near(db, route_ids, from_lon, from_lat, to_lon, to_lat, buffer_meters) -> set:
+    """De `route_ids`, las que cumplen `_path_near` para los puntos del pasajero (por clave primaria)."""
+    result = await db.scalars(select(models.Route.id).where(
+        models.Route.id.in_(list(route_ids)), *_path_near(from_lon, from_lat, to_lon, to_lat, buffer_meters)
+    ))
+    return set(result.all())
+
+async def _search_with_cache(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, departure_after, departure_before, after_key, limit):
+    """
+    Pagina sobre los viajes del corredor en caché (ver app/services/search_cache.py) y
+    carga sólo las filas de la página. El corredor es un superconjunto (desde los centros
+    de las celdas, con el radio ampliado): las rutas de cada página se comprueban con la
+    distancia exacta a los puntos pedidos. Devuelve None si el corredor es demasiado
+    grande para cachearlo: entonces se consulta directo.
+    """
+    key = search_cache.key(from_lon, from_lat, to_lon, to_lat, buffer_meters, departure_after, departure_before)
+    entry = search_cache.get(key)
+    if entry is None:
+        generation = search_cache.generation
+        query, trips = _trips_near(*search_cache.points(key), search_cache.corridor_meters(key))
+        # También los llenos: así el corredor se invalida si vuelven a tener asientos
+        query = query.with_only_columns(
+            trips.c.departure_time, trips.c.trip_id, trips.c.route_id, trips.c.available_seats, trips.c.status
+        ).where(trips.c.status.in_([models.RouteStatus.active, models.RouteStatus.full]))
+        window_after, window_before = search_cache.window(key)
+        if window_after is not None:
+            query = query.where(trips.c.departure_time >= naive_utc(window_after))
+        if window_before is not None:
+            query = query.where(trips.c.departure_time < naive_utc(window_before))
+        result = await db.execute(
+            query.order_by(trips.c.departure_time, trips.c.trip_id).limit(search_cache.max_results + 1)
+        )
+        entry = search_cache.set(key, [
+            (as_utc(row.departure_time), row.trip_id, row.route_id, is_bookable(row.available_seats, row.status))
+            for row in result
+        ], generation)
+    if not entry.complete:
+        return None
+
+    after = as_utc(departure_after) if departure_after is not None else None
+    before = as_utc(departure_before) if departure_before is not None else None
+    keys = [
+        (departure, trip_id, route_id) for departure, trip_id, route_id, bookable in entry.trips
+        if bookable and (after is None or departure >= after) and (before is None or departure < before)
+        and (after_key is None or (departure, trip_id) > after_key)
+    ]
+    routes = []
+    near = {}  # route_id -> pasa a buffer_meters de los puntos pedidos
+    while keys and len(routes) < limit:
+        batch = keys[:limit - len(routes)]
+        keys = keys[len(batch):]
+        unchecked = {route_id for _, _, route_id in batch if route_id not in near}
+        if unchecked:
+            found = await _routes_near(db, unchecked, from_lon, from_lat, to_lon, to_lat, buffer_meters)
+            near.update((route_id, route_id in found) for route_id in unchecked)
+        page_ids = [trip_id for _, trip_id, route_id in batch if near[route_id]]
+        if not page_ids:
+            continue
+        trips = await recurrence.load_trips(db, page_ids)
+        for trip_id in page_ids:
+            trip = trips.get(trip_id)
+            if trip is None or not is_bookable(trip.available_seats, trip.status):
+                search_cache.mark_stale(key)
+                continue
+            routes.append(trip)
+    return routes
+
+async def _search_with_index(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, departure_after, departure_before, after_key, limit):
+    """
+    Filtra, ordena y pagina con el índice en memoria y carga sólo las filas de la página.
+    El índice puede ir atrasado respecto a la BD (otro worker reservó o canceló): las filas
+    cargadas se vuelven a comprobar y se siguen pidiendo candidatas hasta llenar la página.
+    """
+    trip_ids = route_index.search(
+        from_lon, from_lat, to_lon, to_lat, buffer_meters,
+        departure_after=departure_after, departure_before=departure_before
+    )
+    keys = sorted((as_utc(route_index.get(trip_id).departure_time), trip_id) for trip_id in trip_ids)
+    if after_key is not None:
+        keys = [key for key in keys if key > after_key]
+    routes = []
+    while keys and len(routes) < limit:
+        page_ids = [trip_id for _, trip_id in keys[:limit - len(routes)]]
+        keys = keys[len(page_ids):]
+        trips = await recurrence.load_trips(db, page_ids)
+        for trip_id in page_ids:
+            trip = trips.get(trip_id)
+            if trip is None:
+                continue
+            if not is_bookable(trip.available_seats, trip.status):
+                route_index.update_availability(trip_id, trip.available_seats, trip.status)
+                continue
+            routes.append(trip)
     return routes
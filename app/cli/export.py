@@ -0,0 +1,84 @@
+"""
+Extracto de rutas, reservas o pagos a un archivo, igual que `GET /admin/export/{entity}`
+(ver app/services/export.py). Pensado para los extractos nocturnos.
+
+Uso:
+    python -m app.cli.export bookings --format csv --gzip -o bookings.csv.gz
+    python -m app.cli.export payments --since 2026-10-01T00:00:00 -o payments.ndjson
+    python -m app.cli.export routes --watermark-file /var/lib/aventon/routes.watermark -o routes.ndjson
+
+Con `--watermark-file` se exporta desde la marca guardada en el archivo (si existe) y,
+al terminar bien, se guarda la nueva marca: cada ejecución exporta sólo lo nuevo.
+Sin `-o` el extracto se escribe en stdout. La marca usada se imprime en stderr.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from app.db import AsyncSessionLocal, ReadSessionLocal, async_engine, read_async_engine
+from app.services.export import EXPORTS, FORMATS, default_until, export_stream
+
+
+def read_watermark(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        value = f.read().strip()
+    return datetime.fromisoformat(value) if value else None
+
+
+def write_watermark(path: str, value: datetime) -> None:
+    # Escritura atómica: un extracto interrumpido no deja una marca a medias
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(value.isoformat() + "\n")
+    os.replace(tmp, path)
+
+
+async def run(args, out) -> int:
+    session_factory = ReadSessionLocal or AsyncSessionLocal
+    written = 0
+    try:
+        async with session_factory() as db:
+            async for chunk in export_stream(db, args.entity, args.format, args.since, args.until,
+                                             args.gzip, args.include_path):
+                out.write(chunk)
+                written += len(chunk)
+    finally:
+        await async_engine.dispose()
+        if read_async_engine is not None:
+            await read_async_engine.dispose()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entity", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="Marca de agua exclusiva (UTC)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Por defecto, ahora menos EXPORT_WATERMARK_LAG_SECONDS")
+    parser.add_argument("--watermark-file", default=None)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--include-path", action="store_true", help="Sólo rutas: el path como GeoJSON")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args()
+
+    if args.watermark_file and args.since is None:
+        args.since = read_watermark(args.watermark_file)
+    args.until = args.until or default_until()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        written = asyncio.run(run(args, out))
+    finally:
+        if args.output:
+            out.close()
+    if args.watermark_file:
+        write_watermark(args.watermark_file, args.until)
+    print(f"{args.entity}: {written} bytes, since={args.since} until={args.until.isoformat()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Importa rutas de un conductor desde un archivo NDJSON o GeoJSON, igual que
+`POST /routes/bulk` pero sin pasar por HTTP (ver app/services/route_import.py).
+
+Uso:
+    python -m app.cli.import_routes rutas.ndjson --driver-phone 3001234567
+    python -m app.cli.import_routes rutas.geojson --driver-id <uuid> --chunk-size 1000
+    cat rutas.ndjson | python -m app.cli.import_routes - --format ndjson --driver-phone 3001234567
+
+Imprime el reporte (JSON) y termina con código 1 si alguna fila falló.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+
+from sqlalchemy import select
+
+from app.db import AsyncSessionLocal, async_engine
+from app.models import models
+from app.services.route_import import FORMATS, import_routes
+
+READ_SIZE = 1 << 20
+
+
+def detect_format(path: str) -> str:
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if path.endswith((".geojson", ".json")):
+        return "geojson"
+    raise SystemExit("Cannot detect the format from the file name; pass --format")
+
+
+async def read_chunks(stream):
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def run(args) -> dict:
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        async with AsyncSessionLocal() as db:
+            condition = (models.User.id == uuid.UUID(args.driver_id) if args.driver_id
+                         else models.User.phone_number == args.driver_phone)
+            driver_id = await db.scalar(select(models.User.id).where(condition))
+            if driver_id is None:
+                raise SystemExit("Driver not found")
+            return await import_routes(db, driver_id, read_chunks(stream), args.format, args.chunk_size)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Archivo a importar, o - para stdin")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Por defecto, según la extensión")
+    driver = parser.add_mutually_exclusive_group(required=True)
+    driver.add_argument("--driver-id")
+    driver.add_argument("--driver-phone")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rutas por transacción (BULK_IMPORT_CHUNK_SIZE)")
+    args = parser.parse_args()
+    if args.format is None:
+        if args.path == "-":
+            parser.error("--format is required when reading from stdin")
+        args.format = detect_format(args.path)
+
+    report = asyncio.run(run(args))
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,6 +7,138 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
 
+    # Pool de conexiones (se aplica al motor asíncrono y al síncrono)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    # Réplica de lectura opcional para búsquedas y endpoints de solo lectura
+    READ_DATABASE_URL: Optional[str] = None
+    # Tras escribir, el usuario lee del primario durante este tiempo (retraso de replicación)
+    READ_AFTER_WRITE_SECONDS: float = 5.0
+
+    # Caché del usuario autenticado (get_current_user)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+    # Si es true, los datos del usuario viajan en el JWT y get_current_user no consulta la BD
+    AUTH_STATELESS_TOKENS: bool = False
+
+    # Contraseñas: costo de bcrypt y pool de procesos (0 workers = threadpool)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_POOL_QUEUE: int = 32
+
+    # Retención de asientos al reservar y barrido de retenciones vencidas
+    SEAT_HOLD_SECONDS: int = 600
+    SEAT_HOLD_SWEEP_SECONDS: float = 30.0
+
+    # Códigos OTP del registro por teléfono: almacén ("postgres" o "memory", sólo con un proceso), vigencia y barrido de vencidos
+    OTP_STORE: str = "postgres"
+    OTP_TTL_SECONDS: int = 300
+    OTP_MEMORY_SHARDS: int = 16
+    OTP_SWEEP_SECONDS: float = 60.0
+    OTP_SWEEP_BATCH_SIZE: int = 1000
+    # Límite de solicitudes y verificaciones OTP (token bucket): fichas por minuto y ráfaga, por teléfono y por IP
+    OTP_RATE_PHONE_PER_MINUTE: float = 3.0
+    OTP_RATE_PHONE_BURST: int = 5
+    OTP_RATE_IP_PER_MINUTE: float = 30.0
+    OTP_RATE_IP_BURST: int = 60
+
+    # Configuración del sistema en memoria: LISTEN/NOTIFY entre workers y recarga completa de respaldo
+    SYSTEM_CONFIG_LISTEN: bool = True
+    SYSTEM_CONFIG_RESYNC_SECONDS: float = 300.0
+
+    # Canal en vivo de asientos (WS /routes/live): agrupación por tick, ids por conexión y contrapresión
+    SEAT_FEED_ENABLED: bool = True
+    SEAT_FEED_TICK_SECONDS: float = 0.5
+    SEAT_FEED_MAX_IDS: int = 200
+    SEAT_FEED_MAX_PENDING: int = 500
+    SEAT_FEED_SEND_TIMEOUT_SECONDS: float = 10.0
+
+    # Rutas recurrentes: días de ocurrencias generadas por adelantado y cada cuánto se extiende la ventana
+    RECURRENCE_WINDOW_DAYS: int = 14
+    RECURRENCE_REFRESH_SECONDS: float = 3600.0
+
+    # Paradas generadas a lo largo del path cuando el conductor no envía ninguna (0 = no generar)
+    ROUTE_STOP_INTERVAL_M: float = 250.0
+
+    # Geocodificación inversa (ciudad de origen/destino): "gazetteer" (local, sin red) o un proveedor remoto ("nominatim")
+    GEOCODER_PROVIDER: str = "gazetteer"
+    GEOCODER_URL: str = "https://nominatim.openstreetmap.org"
+    GEOCODER_TIMEOUT_SECONDS: float = 2.0
+    # CSV city,country,lon,lat (por defecto app/data/gazetteer.csv) y distancia máxima a la ciudad más cercana
+    GEOCODER_GAZETTEER_PATH: Optional[str] = None
+    GEOCODER_MAX_DISTANCE_KM: float = 60.0
+    # Caché del proveedor remoto por celda geohash (precisión 6 ≈ 1,2 x 0,6 km)
+    GEOCODER_CACHE_SIZE: int = 50000
+    GEOCODER_CACHE_TTL_SECONDS: int = 86400
+    GEOCODER_FALLBACK_TTL_SECONDS: int = 60
+    GEOCODER_GEOHASH_PRECISION: int = 6
+
+    # Versiones simplificadas del path (Douglas-Peucker), en metros
+    PATH_MEDIUM_TOLERANCE_M: float = 5.0
+    PATH_COARSE_TOLERANCE_M: float = 25.0
+
+    # Caché del path serializado (GeoJSON/polilínea) por ruta y formato
+    PATH_CACHE_SIZE: int = 5000
+
+    # Índice espacial en memoria para /routes/search (ver app/services/route_index.py)
+    ROUTE_INDEX_ENABLED: bool = False
+    ROUTE_INDEX_CELL_DEGREES: float = 0.005
+
+    # Caché de /routes/search por corredor (ver app/services/search_cache.py); sólo sin el índice en memoria
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_SIZE: int = 5000
+    SEARCH_CACHE_TTL_SECONDS: int = 60
+    SEARCH_CACHE_GEOHASH_PRECISION: int = 7 # celdas de ~150 x 150 m
+    SEARCH_CACHE_TIME_BUCKET_SECONDS: int = 900
+    SEARCH_CACHE_MAX_RESULTS: int = 500
+
+    # Viajes con transbordo (GET /routes/journeys, ver app/services/journeys.py)
+    JOURNEY_PLANNER_ENABLED: bool = True
+    JOURNEY_TRANSFER_METERS: float = 300.0 # caminata máxima entre las dos rutas
+    JOURNEY_MIN_TRANSFER_SECONDS: int = 120
+    JOURNEY_MAX_WAIT_SECONDS: int = 1800
+    JOURNEY_MAX_ROUTES_PER_END: int = 30 # rutas más cercanas al origen y al destino que se combinan
+    JOURNEY_WINDOW_SECONDS: int = 21600 # ventana de salida del primer tramo sin departure_before
+    JOURNEY_SYNC_SECONDS: float = 60.0 # rutas creadas en otros workers
+    JOURNEY_MAX_RESULTS: int = 20
+
+    # Importación masiva (POST /routes/bulk): rutas por transacción
+    BULK_IMPORT_CHUNK_SIZE: int = 500
+
+    # Exportación (GET /admin/export): filas por lectura del cursor y margen de la marca de agua
+    EXPORT_BATCH_SIZE: int = 5000
+    EXPORT_WATERMARK_LAG_SECONDS: int = 300
+
+    # Tamaño máximo de página de /routes/search
+    ROUTE_SEARCH_MAX_PAGE_SIZE: int = 100
+    # Radio máximo (buffer_meters) de /routes/search, /routes/match y /routes/journeys
+    ROUTE_SEARCH_MAX_BUFFER_M: int = 5000
+
+    # Ranking de /routes/match: velocidad para convertir metros caminados en segundos
+    MATCH_WALKING_SPEED_MPS: float = 1.3
+    MATCH_MAX_RESULTS: int = 50
+
+    # Cálculo de la distancia de una reserva: "numpy" (en el proceso) o "postgis"
+    PRICING_BACKEND: str = "numpy"
+
+    # Cotizaciones (POST /bookings/quote)
+    QUOTE_CACHE_SIZE: int = 10000
+    QUOTE_CACHE_TTL_SECONDS: int = 300
+    QUOTE_TOKEN_TTL_SECONDS: int = 900
+    QUOTE_SNAP_DECIMALS: int = 5 # ~1 m
+    QUOTE_BATCH_MAX_PAIRS: int = 50
+
+    # Instrumentación: GET /metrics (Prometheus) y umbral para reportar consultas N+1.
+    # Apagada por defecto; con METRICS_TOKEN, /metrics exige "Authorization: Bearer <token>"
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: Optional[str] = None
+    N_PLUS_ONE_THRESHOLD: int = 10
+    # Modo depuración: cabecera Server-Timing en cada respuesta
+    DEBUG: bool = False
+
     class Config:
         env_file = ".env"
 
@@ -1,15 +1,83 @@
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from typing import Optional, Set
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
+from .services.cache import TTLCache
+
+def pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+def async_database_url(url: str) -> str:
+    """Misma BD que DATABASE_URL pero con el driver asyncpg."""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
 
-engine = create_engine(settings.DATABASE_URL)
+# Motor síncrono: arranque (índice en memoria), scripts y benchmarks
+engine = create_engine(settings.DATABASE_URL, **pool_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Motor asíncrono: lo usan los endpoints a través de get_db
+async_engine = create_async_engine(async_database_url(settings.DATABASE_URL), **pool_options())
+# expire_on_commit=False: tras el commit los objetos se siguen pudiendo serializar sin otra consulta
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Réplica de lectura opcional, con su propio pool. Sin READ_DATABASE_URL todo va al primario.
+read_async_engine = (
+    create_async_engine(async_database_url(settings.READ_DATABASE_URL), **pool_options())
+    if settings.READ_DATABASE_URL else None
+)
+ReadSessionLocal = (
+    async_sessionmaker(read_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if read_async_engine is not None else None
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# --- Read-your-writes ---
+# La réplica va con algo de retraso. Un usuario que acaba de escribir en el primario
+# sigue leyendo del primario durante READ_AFTER_WRITE_SECONDS para ver sus propios cambios.
+# El usuario de la sesión lo anota get_current_user en `session.info["user_id"]`.
+# `recent_writers` sólo sirve en este proceso; para los demás workers, la marca viaja
+# con el cliente: los escritores de la petición quedan en `request_writers` (ver
+# app/services/read_after_write.py).
+recent_writers = TTLCache(maxsize=100_000, ttl=settings.READ_AFTER_WRITE_SECONDS)
+request_writers: ContextVar[Optional[Set[str]]] = ContextVar("request_writers", default=None)
+
+def wrote_recently(user_id) -> bool:
+    return user_id is not None and recent_writers.get(str(user_id)) is not None
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("has_writes", False) and session.info.get("user_id") is not None:
+        user_id = str(session.info["user_id"])
+        recent_writers.set(user_id, True)
+        writers = request_writers.get()
+        if writers is not None:
+            writers.add(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("has_writes", None)
@@ -1,11 +1,93 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from app.api import auth, routes, users, admin, bookings
+from app.config import settings
+from app.db import AsyncSessionLocal, SessionLocal, async_database_url, async_engine
+from app.services import metrics
+from app.services.geolocation import close_geocoder, gazetteer
+from app.services.instrumentation import InstrumentationMiddleware
+from app.services.journeys import sync_transfer_graph
+from app.services.otp import sweep_expired_codes
+from app.services.passwords import password_pool
+from app.services.read_after_write import ReadAfterWriteMiddleware
+from app.services.seat_feed import seat_feed
+from app.services.seats import sweep_expired_holds
+from app.services.recurrence import refresh_recurrences
+from app.services.route_index import load_route_index
+from app.services.system_config import config_registry, listen_for_changes
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.ROUTE_INDEX_ENABLED:
+        # Llenar el índice espacial en memoria con las rutas activas
+        db = SessionLocal()
+        try:
+            load_route_index(db)
+        finally:
+            db.close()
+    # Cargar el gazetteer local (geocodificación inversa sin red) antes de la primera ruta
+    gazetteer.ensure_loaded()
+    # Configuración del sistema en memoria, recargada cuando otro worker la cambia
+    try:
+        async with AsyncSessionLocal() as db:
+            await config_registry.load(db)
+    except Exception:
+        # Se vuelve a intentar en la primera lectura (ensure_loaded) y al conectar el listener
+        logger.exception("Could not load system config at startup")
+    config_listener = (
+        asyncio.create_task(listen_for_changes(
+            AsyncSessionLocal, async_database_url(settings.DATABASE_URL), settings.SYSTEM_CONFIG_RESYNC_SECONDS
+        ))
+        if settings.SYSTEM_CONFIG_LISTEN else None
+    )
+    # Liberar periódicamente los asientos de reservas no pagadas a tiempo
+    sweeper = asyncio.create_task(sweep_expired_holds(AsyncSessionLocal, settings.SEAT_HOLD_SWEEP_SECONDS))
+    # Borrar los códigos OTP vencidos
+    otp_sweeper = asyncio.create_task(sweep_expired_codes(AsyncSessionLocal, settings.OTP_SWEEP_SECONDS))
+    # Mantener generadas las ocurrencias de las rutas recurrentes dentro de la ventana
+    recurrences = asyncio.create_task(refresh_recurrences(AsyncSessionLocal, settings.RECURRENCE_REFRESH_SECONDS))
+    # Repartir los cambios de asientos a los suscriptores de WS /routes/live, agrupados por tick
+    feed = asyncio.create_task(seat_feed.run(settings.SEAT_FEED_TICK_SECONDS)) if settings.SEAT_FEED_ENABLED else None
+    # Grafo de transbordos de /routes/journeys: se llena en segundo plano y recoge las rutas de otros workers
+    transfers = (
+        asyncio.create_task(sync_transfer_graph(AsyncSessionLocal, settings.JOURNEY_SYNC_SECONDS))
+        if settings.JOURNEY_PLANNER_ENABLED else None
+    )
+    yield
+    sweeper.cancel()
+    otp_sweeper.cancel()
+    recurrences.cancel()
+    if config_listener is not None:
+        config_listener.cancel()
+    if feed is not None:
+        feed.cancel()
+    if transfers is not None:
+        transfers.cancel()
+    password_pool.shutdown()
+    await close_geocoder()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Aventón API",
     description="Backend para la aplicación de carpooling Aventón.",
     version="0.1.0",
+    lifespan=lifespan,
 )
+if settings.METRICS_ENABLED or settings.DEBUG:
+    # Con DEBUG también mide, para la cabecera Server-Timing, aunque no exponga /metrics
+    app.add_middleware(InstrumentationMiddleware)
+if settings.READ_DATABASE_URL:
+    # Read-your-writes entre workers: la marca de la última escritura viaja con el cliente
+    app.add_middleware(ReadAfterWriteMiddleware)
+app.include_router(auth.router, prefix="/auth", tags=["Auth"])
+app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(routes.router, prefix="/routes", tags=["Routes"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(bookings.router, prefix="/bookings", tags=["Bookings"])
@@ -13,3 +95,15 @@ app.include_router(bookings.router, prefix="/bookings", tags=["Bookings"])
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "Bienvenido a la API de Aventón"}
+
+def read_metrics(authorization: Optional[str] = Header(None)):
+    # Formato de texto de Prometheus: latencia por endpoint, consultas, cachés.
+    # Con METRICS_TOKEN, sólo para quien lo envía (p. ej. `bearer_token` en el scrape de Prometheus)
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        (authorization or "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+if settings.METRICS_ENABLED:
+    app.add_api_route("/metrics", read_metrics, methods=["GET"], include_in_schema=False)
@@ -9,8 +9,11 @@ from sqlalchemy import (
     Boolean,
     DECIMAL,
     Enum,
+    Float,
     TEXT,
-    DateTime
+    DateTime,
+    Index,
+    UniqueConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
@@ -65,52 +68,110 @@ class Route(Base):
     
     price_per_km = Column(DECIMAL(10, 2), nullable=False) # COP por km
     
+    # Ruta recurrente: plantilla con el path; los viajes reservables son sus ocurrencias
     is_recurrent = Column(Boolean, default=False)
     recurrence_pattern = Column(JSONB, nullable=True)
+    # Hasta dónde se generaron ocurrencias (ver app/services/recurrence.py)
+    materialized_until = Column(TIMESTAMP, nullable=True)
     status = Column(Enum(RouteStatus), default=RouteStatus.active)
     path = Column(Geometry(geometry_type='LINESTRING', srid=4326), nullable=False)
+    # Versiones simplificadas del path (ver app/services/simplification.py)
+    path_medium = Column(Geometry(geometry_type='LINESTRING', srid=4326), nullable=True)
+    path_coarse = Column(Geometry(geometry_type='LINESTRING', srid=4326), nullable=True)
     
     start_city = Column(String, nullable=True)
     start_country = Column(String, nullable=True)
     end_city = Column(String, nullable=True)
     end_country = Column(String, nullable=True)
+    created_at = Column(TIMESTAMP, server_default="CURRENT_TIMESTAMP")
 
     driver = relationship("User", back_populates="driven_routes")
     vehicle = relationship("Vehicle", back_populates="routes")
-    stops = relationship("RouteStop", back_populates="route")
+    stops = relationship("RouteStop", back_populates="route", order_by="RouteStop.order")
     bookings = relationship("Booking", back_populates="route")
+    occurrences = relationship("RouteOccurrence", back_populates="route")
+
+    __table_args__ = (
+        # Búsqueda por ventana de salida y paginación por keyset (status, departure_time, id)
+        Index("idx_routes_status_departure", "status", "departure_time", "id"),
+        # Rutas recurrentes cuya ventana de ocurrencias hay que extender
+        Index("idx_routes_recurrent_materialized", "materialized_until", postgresql_where=is_recurrent.is_(True)),
+        # Exportación incremental por marca de agua (created_at, id)
+        Index("idx_routes_created", "created_at", "id"),
+    )
+
+class RouteOccurrence(Base):
+    """Un viaje concreto de una ruta recurrente: comparte el path de la ruta y tiene sus propios asientos."""
+    __tablename__ = "route_occurrences"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    route_id = Column(UUID(as_uuid=True), ForeignKey("routes.id"), nullable=False)
+    departure_time = Column(TIMESTAMP, nullable=False)
+    estimated_arrival_time = Column(TIMESTAMP, nullable=False)
+    available_seats = Column(Integer, nullable=False)
+    status = Column(Enum(RouteStatus), default=RouteStatus.active, nullable=False)
+
+    route = relationship("Route", back_populates="occurrences")
+    bookings = relationship("Booking", back_populates="occurrence")
+
+    __table_args__ = (
+        # Una ocurrencia por ruta y hora de salida: la expansión se puede repetir sin duplicar
+        # y las ocurrencias de una ruta en una ventana se leen por rango
+        UniqueConstraint("route_id", "departure_time", name="uq_route_occurrences_route_departure"),
+        # Búsqueda por ventana de salida y keyset, igual que en routes
+        Index("idx_route_occurrences_status_departure", "status", "departure_time", "id"),
+    )
 
 class RouteStop(Base):
     __tablename__ = "route_stops"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     route_id = Column(UUID(as_uuid=True), ForeignKey("routes.id"), nullable=False)
+    # GeoAlchemy2 crea el índice GiST (idx_route_stops_location) para las consultas KNN `<->`
     location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
     order = Column(Integer, nullable=False)
+    # Posición (0-1) sobre el path de la ruta, como ST_LineLocatePoint; ver app/services/stops.py
+    fraction = Column(Float, nullable=False)
 
     route = relationship("Route", back_populates="stops")
 
+    __table_args__ = (
+        Index("idx_route_stops_route_order", "route_id", "order"),
+    )
+
 class BookingStatus(str, enum.Enum):
     pending = "pending"
     confirmed = "confirmed"
     cancelled_by_passenger = "cancelled_by_passenger"
     completed = "completed"
+    expired = "expired" # La retención del asiento venció sin pago
 
 class Booking(Base):
     __tablename__ = "bookings"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     passenger_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     route_id = Column(UUID(as_uuid=True), ForeignKey("routes.id"), nullable=False)
+    # Sólo en rutas recurrentes: la ocurrencia reservada (los asientos son de la ocurrencia)
+    occurrence_id = Column(UUID(as_uuid=True), ForeignKey("route_occurrences.id"), nullable=True)
     pickup_point = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
     dropoff_point = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
     status = Column(Enum(BookingStatus), default=BookingStatus.pending, nullable=False)
     booked_at = Column(TIMESTAMP, server_default="CURRENT_TIMESTAMP")
+    # Mientras está pendiente, la reserva retiene un asiento hasta esta hora (UTC)
+    hold_expires_at = Column(DateTime, nullable=True)
     
     calculated_price = Column(DECIMAL(12, 2), nullable=False)
 
     passenger = relationship("User", back_populates="bookings")
     route = relationship("Route", back_populates="bookings")
+    occurrence = relationship("RouteOccurrence", back_populates="bookings")
     payment = relationship("Payment", back_populates="booking", uselist=False)
 
+    __table_args__ = (
+        # Barrido de retenciones vencidas
+        Index("idx_bookings_status_hold", "status", "hold_expires_at"),
+        # Exportación incremental por marca de agua (booked_at, id)
+        Index("idx_bookings_booked", "booked_at", "id"),
+    )
+
 class SystemConfig(Base):
     __tablename__ = "system_configs"
     key = Column(String, primary_key=True)
@@ -123,6 +184,11 @@ class PhoneVerification(Base):
     created_at = Column(TIMESTAMP, server_default="CURRENT_TIMESTAMP")
     expires_at = Column(DateTime, nullable=False)
 
+    __table_args__ = (
+        # Barrido de códigos vencidos (ver app/services/otp.py)
+        Index("idx_phone_verifications_expires", "expires_at"),
+    )
+
 class PaymentStatus(str, enum.Enum):
     pending = "pending"
     completed = "completed"
@@ -140,4 +206,9 @@ class Payment(Base):
     created_at = Column(TIMESTAMP, server_default="CURRENT_TIMESTAMP")
     updated_at = Column(TIMESTAMP, onupdate="CURRENT_TIMESTAMP")
 
-    booking = relationship("Booking", back_populates="payment")
\ No newline at end of file
+    booking = relationship("Booking", back_populates="payment")
+
+    __table_args__ = (
+        # Exportación incremental por marca de agua (created_at, id)
+        Index("idx_payments_created", "created_at", "id"),
+    )
\ No newline at end of file
@@ -1,10 +1,10 @@
-from pydantic import BaseModel, EmailStr, UUID4, field_serializer
+from pydantic import BaseModel, EmailStr, Field, UUID4, field_serializer, field_validator
 from typing import List, Optional, Any
-from datetime import datetime
-from shapely import wkb
-from shapely.geometry import mapping
+from datetime import date, datetime
 from uuid import UUID
 
+from app.services.geojson import serialize_path
+
 # User Schemas
 class UserBase(BaseModel):
     phone_number: str
@@ -75,6 +75,26 @@ class RouteStopBase(BaseModel):
     location: PointGeometry
     order: int
 
+class NearestStopResponse(BaseModel):
+    id: UUID4
+    order: int
+    location: PointGeometry
+    fraction: float # Posición (0-1) de la parada sobre el path
+    distance_meters: float # Distancia desde el punto del pasajero
+
+class RecurrencePattern(BaseModel):
+    weekdays: List[int] = Field(..., min_length=1) # 0 = lunes ... 6 = domingo
+    interval_weeks: int = Field(1, ge=1) # Cada cuántas semanas
+    until: Optional[date] = None # Última fecha con viaje
+    exceptions: List[date] = [] # Fechas sin viaje
+
+    @field_validator('weekdays')
+    @classmethod
+    def validate_weekdays(cls, weekdays: List[int]) -> List[int]:
+        if any(day < 0 or day > 6 for day in weekdays):
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return sorted(set(weekdays))
+
 class RouteBase(BaseModel):
     departure_time: datetime
     estimated_arrival_time: datetime
@@ -85,6 +105,10 @@ class RouteCreate(RouteBase):
     vehicle_id: UUID4
     stops: Optional[List[RouteStopBase]] = []
     path: LineStringGeometry
+    # Sin `stops`, se generan paradas cada `stop_interval_meters` (por defecto ROUTE_STOP_INTERVAL_M)
+    stop_interval_meters: Optional[float] = Field(None, gt=0)
+    # Si se envía, la ruta se repite y `departure_time` es la primera salida de la serie
+    recurrence: Optional[RecurrencePattern] = None
 
 class RouteResponse(RouteBase):
     id: UUID4
@@ -95,13 +119,81 @@ class RouteResponse(RouteBase):
     start_country: Optional[str] = None
     end_city: Optional[str] = None
     end_country: Optional[str] = None
+    is_recurrent: Optional[bool] = False
+    recurrence_pattern: Optional[dict] = None
+    # En resultados de búsqueda de rutas recurrentes: la ocurrencia (salida y asientos son los suyos)
+    occurrence_id: Optional[UUID4] = None
+    # En resultados de búsqueda: paradas más cercanas al origen y al destino del pasajero
+    pickup_stop: Optional[NearestStopResponse] = None
+    dropoff_stop: Optional[NearestStopResponse] = None
     path: Any
+    # Versiones simplificadas; no se serializan, se usan en `path` según el zoom pedido
+    path_medium: Any = Field(None, exclude=True)
+    path_coarse: Any = Field(None, exclude=True)
 
     @field_serializer('path')
     def serialize_path(self, path: Any, _info):
-        if hasattr(path, 'data'):
-            return mapping(wkb.loads(bytes(path.data)))
-        return None
+        # GeoJSON (o polilínea) desde el WKB, con caché por ruta; ver app/services/geojson.py
+        return serialize_path(path, self.id, {"path_medium": self.path_medium, "path_coarse": self.path_coarse})
+
+    class Config:
+        from_attributes = True
+
+class BulkRouteImportError(BaseModel):
+    row: int # Línea (NDJSON) o posición del Feature (GeoJSON), desde 1
+    ref: Optional[str] = None # `id` del Feature o campo `ref` de la fila
+    detail: str
+
+class BulkRouteImportResponse(BaseModel):
+    received: int
+    created: int
+    failed: int
+    errors: List[BulkRouteImportError]
+
+class RouteOccurrenceResponse(BaseModel):
+    id: UUID4
+    route_id: UUID4
+    departure_time: datetime
+    estimated_arrival_time: datetime
+    available_seats: int
+    status: str
+
+    class Config:
+        from_attributes = True
+
+class RouteMatchResponse(BaseModel):
+    route: RouteResponse
+    pickup_fraction: float # Posición (0-1) de la recogida sobre el path
+    dropoff_fraction: float
+    pickup_point: PointGeometry # Punto de recogida proyectado sobre el path
+    dropoff_point: PointGeometry
+    walk_to_pickup_meters: float
+    walk_from_dropoff_meters: float
+    departure_gap_seconds: float
+    score: float # Costo en segundos: caminata / velocidad + diferencia de hora de salida
+
+    class Config:
+        from_attributes = True
+
+class JourneyLegResponse(BaseModel):
+    route: RouteResponse # El viaje del tramo (ruta u ocurrencia)
+    pickup_fraction: float
+    dropoff_fraction: float
+    pickup_point: PointGeometry
+    dropoff_point: PointGeometry
+
+    class Config:
+        from_attributes = True
+
+class JourneyResponse(BaseModel):
+    legs: List[JourneyLegResponse] # Dos tramos: el segundo se toma en el punto de transbordo
+    walk_to_pickup_meters: float
+    transfer_walk_meters: float # Entre la bajada del primer tramo y la recogida del segundo
+    walk_from_dropoff_meters: float
+    transfer_wait_seconds: float
+    departure_gap_seconds: float
+    arrival_time: datetime # Llegada estimada al punto de bajada del segundo tramo
+    score: float # Costo en segundos: caminata total / velocidad + espera + diferencia de hora de salida
 
     class Config:
         from_attributes = True
@@ -113,7 +205,11 @@ class BookingBase(BaseModel):
     dropoff_point: PointGeometry
 
 class BookingCreate(BookingBase):
-    pass
+    quote_token: Optional[str] = None # Token de POST /bookings/quote para no recalcular el precio
+    occurrence_id: Optional[UUID4] = None # Obligatorio en rutas recurrentes
+    # Reservar entre dos paradas de la ruta (p. ej. las de la búsqueda): el precio sale de sus fracciones
+    pickup_stop_id: Optional[UUID4] = None
+    dropoff_stop_id: Optional[UUID4] = None
 
 class BookingResponse(BookingBase):
     id: UUID4
@@ -121,6 +217,32 @@ class BookingResponse(BookingBase):
     status: str
     booked_at: datetime
     calculated_price: float
+    occurrence_id: Optional[UUID4] = None
+    hold_expires_at: Optional[datetime] = None # El asiento queda retenido hasta esta hora (UTC) si no se paga
+
+    class Config:
+        from_attributes = True
+
+# Quote Schemas
+class QuoteRequest(BookingBase):
+    pass
+
+class QuotePair(BaseModel):
+    pickup_point: PointGeometry
+    dropoff_point: PointGeometry
+
+class BatchQuoteRequest(BaseModel):
+    route_id: UUID4
+    pairs: List[QuotePair]
+
+class QuoteResponse(BaseModel):
+    route_id: UUID4
+    pickup_point: PointGeometry # Puntos ajustados con los que se calculó el precio
+    dropoff_point: PointGeometry
+    distance_km: float
+    calculated_price: float
+    quote_token: str
+    expires_at: datetime
 
     class Config:
         from_attributes = True
@@ -0,0 +1,99 @@
+"""
+Serialización del path de las rutas en las respuestas.
+
+`RouteResponse.path` se decodifica directamente del WKB a listas de coordenadas
+(sin objetos de Shapely) y el resultado se guarda por ruta y formato; si el WKB
+de la ruta cambia, la entrada se recalcula.
+
+Formatos (parámetros `path_format`, `path_precision` y `zoom` de los endpoints de búsqueda):
+- `geojson`: {"type": "LineString", "coordinates": [[lon, lat], ...]}; con
+  `path_precision` las coordenadas se redondean a ese número de decimales.
+- `polyline`: string con el formato de polilínea codificada de Google
+  (lat/lon, precisión 5 por defecto; `path_precision=6` da "polyline6").
+- `zoom`: nivel de zoom del mapa; por debajo de 16 se devuelve una versión
+  simplificada del path (ver app/services/simplification.py).
+"""
+import enum
+from contextvars import ContextVar
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import Query
+
+from app.config import settings
+from app.services.instrumentation import timed
+from app.services.route_geometry import WKBCache, decode_linestring
+from app.services.simplification import level_for_zoom
+
+
+class PathFormat(str, enum.Enum):
+    geojson = "geojson"
+    polyline = "polyline"
+
+
+POLYLINE_DEFAULT_PRECISION = 5
+
+# Formato pedido en la petición en curso; lo fija la dependencia `path_format_params`
+_path_options: ContextVar[Tuple[PathFormat, Optional[int], Optional[int]]] = ContextVar(
+    "path_options", default=(PathFormat.geojson, None, None)
+)
+
+
+def encode_polyline(coords: np.ndarray, precision: int = POLYLINE_DEFAULT_PRECISION) -> str:
+    """Polilínea codificada de Google para un arreglo (n, 2) de [lon, lat]."""
+    if len(coords) == 0:
+        return ""
+    scaled = np.round(coords[:, ::-1] * (10 ** precision)).astype(np.int64)  # [lat, lon]
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chunks = []
+    for value in zigzag.tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_path(data: bytes, path_format: PathFormat = PathFormat.geojson, precision: Optional[int] = None):
+    coords = decode_linestring(data)
+    if path_format == PathFormat.polyline:
+        return encode_polyline(coords, POLYLINE_DEFAULT_PRECISION if precision is None else precision)
+    if precision is not None:
+        coords = np.round(coords, precision)
+    # Tuplas y no listas: las tuplas de floats salen del seguimiento del GC, y con
+    # cientos de miles de vértices vivos las listas hacen cada recolección mucho más cara.
+    return {"type": "LineString", "coordinates": list(zip(coords[:, 0].tolist(), coords[:, 1].tolist()))}
+
+
+path_cache = WKBCache(encode_path, maxsize=settings.PATH_CACHE_SIZE)
+
+
+def serialize_path(path, route_id=None, levels: Optional[Dict[str, object]] = None):
+    """
+    Path de una ruta (WKBElement) en el formato pedido en la petición en curso.
+    `levels` trae las versiones simplificadas (`path_medium`, `path_coarse`) para elegir según el zoom.
+    """
+    path_format, precision, zoom = _path_options.get()
+    level = level_for_zoom(zoom)
+    if level != "path" and levels and levels.get(level) is not None:
+        path = levels[level]
+    else:
+        level = "path"
+    if not hasattr(path, "data"):
+        return None
+    with timed("serialize_path"):
+        if route_id is None:
+            return encode_path(path.data, path_format, precision)
+        return path_cache.get((route_id, level, path_format, precision), path.data,
+                              partial(encode_path, path_format=path_format, precision=precision))
+
+
+async def path_format_params(
+    path_format: PathFormat = Query(PathFormat.geojson, description="geojson o polyline (polilínea codificada de Google)"),
+    path_precision: Optional[int] = Query(None, ge=0, le=10, description="Decimales de las coordenadas del path"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Zoom del mapa; con zoom bajo el path viene simplificado"),
+):
+    """Dependencia: fija el formato del path para la respuesta de esta petición."""
+    _path_options.set((path_format, path_precision, zoom))
@@ -1,17 +1,294 @@
-from typing import Dict, Any
+"""
+Geocodificación inversa: ciudad y país de un punto (se usa al crear rutas).
 
-def get_location_details(lon: float, lat: float) -> Dict[str, Any]:
+Dos partes:
+- `Gazetteer`: dataset local de ciudades (puntos; app/data/gazetteer.csv o
+  GEOCODER_GAZETTEER_PATH, columnas city,country,lon,lat) cargado en un índice
+  espacial (STRtree de Shapely). Responde sin red con la ciudad más cercana a menos
+  de GEOCODER_MAX_DISTANCE_KM. Es el proveedor por defecto.
+- Un proveedor remoto enchufable (GEOCODER_PROVIDER, p. ej. `nominatim`) detrás de
+  `CachedGeocoder`: caché LRU+TTL con clave geohash (todos los puntos de una celda
+  comparten respuesta) y las consultas simultáneas a una misma celda se agrupan en
+  una sola llamada. Si el proveedor falla, se responde con el gazetteer.
+
+Para agregar un proveedor: una clase con `async def reverse(lon, lat)` que devuelva
+{"city": ..., "country": ...} (o None), registrada con `register_provider`.
+"""
+import asyncio
+import csv
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+import shapely
+
+from app.config import settings
+from app.services import metrics
+from app.services.cache import TTLCache
+from app.services.route_geometry import geodesic_distance
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.csv")
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    """Geohash estándar del punto (celda de ~1,2 x 0,6 km con precisión 6)."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, interval = (lon, lon_range) if even else (lat, lat_range)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(code: str) -> Tuple[float, float]:
+    """(lat, lon) del centro de la celda `code`."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in code:
+        bits = _GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if bits >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def _location(city: Optional[str], country: Optional[str]) -> Dict[str, Any]:
+    return {"city": city, "country": country}
+
+
+class Gazetteer:
     """
-    Placeholder para un servicio de geocodificación inversa.
-    
-    En una aplicación real, esta función haría una llamada a una API externa
-    como Nominatim (OpenStreetMap), Google Maps, o Here Maps para obtener
-    detalles de una ubicación a partir de sus coordenadas.
-    
-    Para este proyecto, devolvemos un valor fijo para cumplir el requisito.
+    Ciudades en un STRtree. Las coordenadas se indexan como (lon * cos(lat), lat) para
+    que la ciudad "más cercana" lo sea en distancia y no en grados de longitud; la
+    distancia reportada y el corte por GEOCODER_MAX_DISTANCE_KM son geodésicos.
     """
-    # TODO: Reemplazar con una llamada a una API de geocodificación real.
-    return {
-        "city": "Cali",
-        "country": "Colombia"
-    }
+
+    def __init__(self, path: Optional[str] = None, max_distance_km: Optional[float] = None):
+        self.path = path
+        self.max_distance_km = settings.GEOCODER_MAX_DISTANCE_KM if max_distance_km is None else max_distance_km
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._tree: Optional[shapely.STRtree] = None
+        self._cities: List[str] = []
+        self._countries: List[str] = []
+        self._lon = self._lat = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    @staticmethod
+    def _projected(lon, lat) -> np.ndarray:
+        lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+        return shapely.points(lon * np.cos(np.radians(lat)), lat)
+
+    def load_places(self, places: Sequence[Sequence[Any]]) -> int:
+        """Carga [(ciudad, país, lon, lat), ...] y reconstruye el índice."""
+        cities = [str(p[0]) for p in places]
+        countries = [str(p[1]) for p in places]
+        lon = np.array([float(p[2]) for p in places], dtype=np.float64)
+        lat = np.array([float(p[3]) for p in places], dtype=np.float64)
+        tree = shapely.STRtree(self._projected(lon, lat))
+        with self._lock:
+            self._cities, self._countries, self._lon, self._lat, self._tree = cities, countries, lon, lat, tree
+        return len(cities)
+
+    def load(self, path: Optional[str] = None) -> int:
+        path = path or self.path or settings.GEOCODER_GAZETTEER_PATH or DEFAULT_GAZETTEER_PATH
+        with open(path, newline="", encoding="utf-8") as f:
+            places = [(row["city"], row["country"], row["lon"], row["lat"]) for row in csv.DictReader(f)]
+        count = self.load_places(places)
+        logger.info("Loaded %d places into the gazetteer from %s", count, path)
+        return count
+
+    def ensure_loaded(self) -> None:
+        """Carga el dataset si todavía no se cargó (al arrancar la app, o en el primer uso)."""
+        if self._tree is None:
+            with self._load_lock:
+                if self._tree is None:
+                    self.load()
+
+    def lookup_many(self, lons: Sequence[float], lats: Sequence[float]) -> List[Optional[Dict[str, Any]]]:
+        """Ciudad más cercana para N puntos en una sola consulta al índice (None si está muy lejos)."""
+        self.ensure_loaded()
+        lons, lats = np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+        if len(lons) == 0 or len(self) == 0:
+            return [None] * len(lons)
+        # query_nearest devuelve (índices de la consulta, índices del árbol); en empates, el primero
+        query_idx, place_idx = self._tree.query_nearest(self._projected(lons, lats), all_matches=False)
+        nearest = np.empty(len(lons), dtype=np.int64)
+        nearest[query_idx] = place_idx
+        distances_km = geodesic_distance(lons, lats, self._lon[nearest], self._lat[nearest]) / 1000.0
+        return [
+            _location(self._cities[i], self._countries[i]) if d <= self.max_distance_km else None
+            for i, d in zip(nearest.tolist(), distances_km.tolist())
+        ]
+
+    def lookup(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        return self.lookup_many([lon], [lat])[0]
+
+
+class GazetteerProvider:
+    """El gazetteer local como proveedor (sin red)."""
+
+    def __init__(self, gazetteer: Gazetteer):
+        self.gazetteer = gazetteer
+
+    async def reverse(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        return self.gazetteer.lookup(lon, lat)
+
+
+class NominatimProvider:
+    """Geocodificación inversa con la API de Nominatim (OpenStreetMap) u otra compatible."""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # La política de uso de Nominatim exige identificar la aplicación
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers={"User-Agent": "aventon-backend"})
+        return self._client
+
+    async def reverse(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        response = await self._get_client().get(
+            f"{self.url}/reverse", params={"format": "jsonv2", "lat": lat, "lon": lon, "zoom": 10}
+        )
+        response.raise_for_status()
+        address = response.json().get("address") or {}
+        city = address.get("city") or address.get("town") or address.get("village") or address.get("municipality")
+        if city is None and address.get("country") is None:
+            return None
+        return _location(city, address.get("country"))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_MISSING = object()
+
+
+class CachedGeocoder:
+    """
+    Proveedor remoto detrás de una caché LRU+TTL por celda geohash. Las consultas
+    simultáneas a una celda que no está en la caché esperan la misma llamada al
+    proveedor. Si el proveedor falla, se usa el gazetteer y esa respuesta se guarda
+    sólo por GEOCODER_FALLBACK_TTL_SECONDS, para volver a intentar pronto.
+    """
+
+    def __init__(self, provider, fallback: Gazetteer, cache: TTLCache, precision: int, timeout: float):
+        self.provider = provider
+        self.fallback = fallback
+        self.cache = cache
+        self.precision = precision
+        self.timeout = timeout
+        self.coalesced = 0
+        self.failures = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def reverse(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        key = geohash(lat, lon, self.precision)
+        cached = self.cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = self._inflight[key] = asyncio.ensure_future(self._resolve(key, lon, lat))
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: si quien espera se cancela, la llamada compartida sigue para los demás
+        return await asyncio.shield(pending)
+
+    async def _resolve(self, key: str, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        try:
+            location = await asyncio.wait_for(self.provider.reverse(lon, lat), self.timeout)
+        except Exception:
+            self.failures += 1
+            logger.warning("Reverse geocoding failed for %s; using the gazetteer", key, exc_info=True)
+            location = self.fallback.lookup(lon, lat)
+            self.cache.set(key, location, ttl=settings.GEOCODER_FALLBACK_TTL_SECONDS)
+            return location
+        self.cache.set(key, location)
+        return location
+
+
+_providers: Dict[str, Callable[[], Any]] = {
+    "nominatim": lambda: NominatimProvider(settings.GEOCODER_URL, settings.GEOCODER_TIMEOUT_SECONDS),
+}
+
+
+def register_provider(name: str, factory: Callable[[], Any]) -> None:
+    """Registra un proveedor remoto para usarlo con GEOCODER_PROVIDER=<name>."""
+    _providers[name] = factory
+
+
+gazetteer = Gazetteer()
+geocoder_cache = TTLCache(maxsize=settings.GEOCODER_CACHE_SIZE, ttl=settings.GEOCODER_CACHE_TTL_SECONDS)
+metrics.register_cache("geocoder_cache", geocoder_cache)
+_geocoder: Optional[CachedGeocoder] = None
+
+
+def get_geocoder() -> Optional[CachedGeocoder]:
+    """El geocodificador remoto configurado, o None si se usa sólo el gazetteer."""
+    global _geocoder
+    if settings.GEOCODER_PROVIDER == "gazetteer":
+        return None
+    if _geocoder is None:
+        if settings.GEOCODER_PROVIDER not in _providers:
+            raise ValueError(f"Unknown GEOCODER_PROVIDER: {settings.GEOCODER_PROVIDER}")
+        _geocoder = CachedGeocoder(
+            _providers[settings.GEOCODER_PROVIDER](), gazetteer, geocoder_cache,
+            settings.GEOCODER_GEOHASH_PRECISION, settings.GEOCODER_TIMEOUT_SECONDS,
+        )
+        metrics.register_counter("geocoder_coalesced_total", lambda: _geocoder.coalesced, "Consultas agrupadas con otra en curso")
+        metrics.register_counter("geocoder_failures_total", lambda: _geocoder.failures, "Fallos del proveedor remoto")
+    return _geocoder
+
+
+async def get_location_details(lon: float, lat: float) -> Dict[str, Any]:
+    """Ciudad y país del punto; {"city": None, "country": None} si no se encuentra."""
+    geocoder = get_geocoder()
+    location = await geocoder.reverse(lon, lat) if geocoder is not None else gazetteer.lookup(lon, lat)
+    return location or _location(None, None)
+
+
+async def get_locations_details(points: Sequence[Sequence[float]]) -> List[Dict[str, Any]]:
+    """`get_location_details` para muchos puntos (lon, lat): el gazetteer en una sola consulta al índice."""
+    geocoder = get_geocoder()
+    if geocoder is None:
+        locations = gazetteer.lookup_many([p[0] for p in points], [p[1] for p in points])
+    else:
+        locations = await asyncio.gather(*(geocoder.reverse(p[0], p[1]) for p in points))
+    return [location or _location(None, None) for location in locations]
+
+
+async def close_geocoder() -> None:
+    if _geocoder is not None and hasattr(_geocoder.provider, "close"):
+        await _geocoder.provider.close()
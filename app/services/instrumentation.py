@@ -0,0 +1,167 @@
+"""
+Instrumentación de las peticiones: dónde se va el tiempo por endpoint, por consulta SQL
+y por operación costosa (cálculo de precio, serialización del path).
+
+- `InstrumentationMiddleware` (ASGI) mide cada petición HTTP y la registra en
+  `http_request_duration_seconds`, etiquetada con la plantilla de la ruta
+  (`/routes/{route_id}`, no el id), el método y el código de respuesta.
+- Los eventos `before/after_cursor_execute` del `Engine` cuentan las consultas y su
+  tiempo. Dentro de una petición se acumulan en su `RequestStats`; si una misma
+  sentencia se repite N_PLUS_ONE_THRESHOLD veces o más se reporta como posible N+1
+  (log y `db_n_plus_one_total`).
+- `timed(nombre)` mide un bloque de código en `operation_duration_seconds`.
+
+Todo se expone en `GET /metrics` (formato Prometheus, ver app/services/metrics.py). Con
+DEBUG=true cada respuesta trae además la cabecera `Server-Timing` (app, db y operaciones),
+que el navegador muestra en la pestaña de red.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP", ("method", "route", "status")
+)
+http_request_queries = metrics.histogram(
+    "http_request_db_queries", "Consultas SQL por petición", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+http_request_db_duration = metrics.histogram(
+    "http_request_db_seconds", "Tiempo en consultas SQL por petición", ("method", "route")
+)
+db_query_duration = metrics.histogram("db_query_duration_seconds", "Duración de cada consulta SQL")
+db_n_plus_one = metrics.counter(
+    "db_n_plus_one_total", "Peticiones que repiten la misma consulta N_PLUS_ONE_THRESHOLD veces o más", ("method", "route")
+)
+operation_duration = metrics.histogram(
+    "operation_duration_seconds", "Duración de operaciones medidas con timed()", ("operation",)
+)
+
+
+class RequestStats:
+    """Consultas y tiempos acumulados durante una petición."""
+
+    __slots__ = ("queries", "db_seconds", "statements", "timings")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Dict[str, int] = {}
+        self.timings: Dict[str, float] = {}
+
+    def repeated_statement(self):
+        """(sentencia, veces) de la consulta más repetida, o (None, 0)."""
+        if not self.statements:
+            return None, 0
+        statement = max(self.statements, key=self.statements.get)
+        return statement, self.statements[statement]
+
+
+# Un objeto mutable en el contexto: lo comparten las tareas y los hilos que la petición lanza
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def timed(operation: str):
+    """Mide el bloque en `operation_duration_seconds` y en el Server-Timing de la petición."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        operation_duration.observe(elapsed, operation)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.timings[operation] = stats.timings.get(operation, 0.0) + elapsed
+
+
+# --- Consultas SQL ---
+# En la clase Engine: cubre el motor síncrono, el asíncrono (su sync_engine) y la réplica.
+# Una conexión ejecuta una sentencia a la vez, así que basta con una marca de inicio.
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_started_at", time.perf_counter())
+    db_query_duration.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        # Con los parámetros aparte, el texto es el mismo en cada vuelta de un N+1
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+# --- Middleware ---
+
+def _server_timing(stats: RequestStats, app_seconds: float) -> bytes:
+    entries = [f"app;dur={app_seconds * 1000:.1f}",
+               f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"']
+    entries.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats.timings.items())
+    return ", ".join(entries).encode("latin-1")
+
+
+class InstrumentationMiddleware:
+    """Middleware ASGI: latencia, consultas por petición, N+1 y Server-Timing (con DEBUG)."""
+
+    def __init__(self, app, server_timing: Optional[bool] = None, n_plus_one_threshold: Optional[int] = None):
+        self.app = app
+        self.server_timing = settings.DEBUG if server_timing is None else server_timing
+        self.n_plus_one_threshold = n_plus_one_threshold or settings.N_PLUS_ONE_THRESHOLD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(stats, time.perf_counter() - start)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            self._record(scope, stats, status, time.perf_counter() - start)
+
+    def _record(self, scope, stats: RequestStats, status: int, elapsed: float) -> None:
+        # El router deja la ruta elegida en el scope; sin ella (404) no se etiqueta por path
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        method = scope["method"]
+        http_request_duration.observe(elapsed, method, route, str(status))
+        http_request_queries.observe(stats.queries, method, route)
+        http_request_db_duration.observe(stats.db_seconds, method, route)
+        statement, runs = stats.repeated_statement()
+        if runs >= self.n_plus_one_threshold:
+            db_n_plus_one.inc(method, route)
+            logger.warning("Possible N+1 in %s %s: %d runs of %s", method, route, runs, " ".join(statement.split())[:300])
@@ -0,0 +1,589 @@
+"""
+Planificador de viajes con un transbordo (GET /routes/journeys).
+
+Cuando ninguna ruta pasa cerca del origen y luego del destino, se combinan dos: la
+primera recoge al pasajero cerca del origen, la segunda lo deja cerca del destino y
+entre ambas camina hasta JOURNEY_TRANSFER_METERS.
+
+Grafo de proximidad entre rutas (`TransferGraph`), en memoria y precalculado:
+- Nodos: las rutas activas. Sus segmentos viven también en un arreglo plano de numpy
+  con todos los de las demás, así que las pruebas de proximidad son vectorizadas.
+- Aristas: los pares de rutas que pasan a menos de JOURNEY_TRANSFER_METERS en algún
+  punto. Sólo se guardan los ids de las vecinas (unos bytes por par); el punto de
+  transbordo se calcula al planificar, para los pares candidatos, porque depende de
+  dónde recoge y deja al pasajero cada tramo.
+- `add` sólo calcula las aristas de la ruta nueva: filtra por bounding box los
+  segmentos existentes y mide la distancia exacta segmento-segmento a los que quedan.
+  Se llama al crear rutas (también en la importación).
+
+Cada worker tiene su copia: `sync_transfer_graph` la llena al arrancar y luego agrega
+las rutas creadas en otros workers y quita las que ya llegaron.
+
+Para planificar se cruzan las rutas cerca del origen con las vecinas de cada una que
+pasan cerca del destino; de cada par se toma el transbordo con menos caminata que
+queda después de la recogida en la primera y antes de la bajada en la segunda. Los
+horarios se comprueban con los viajes reservables de la BD: la hora de paso por una
+fracción se interpola entre la salida y la llegada estimada del viaje, y el segundo
+debe pasar por el transbordo entre JOURNEY_MIN_TRANSFER_SECONDS y
+JOURNEY_MAX_WAIT_SECONDS después de que el pasajero llegue caminando. Costo en
+segundos, como en /routes/match:
+
+    costo = caminata total / velocidad_caminando + espera del transbordo + |salida - salida deseada|
+"""
+import asyncio
+import heapq
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.services import metrics
+from app.services.pagination import as_utc
+from app.services.recurrence import bookable_trips, load_trips
+from app.services.route_index import METERS_PER_DEGREE, Coordinate, path_coordinates
+
+logger = logging.getLogger(__name__)
+
+# (fracción en la primera ruta, fracción en la segunda, caminata en metros,
+#  lon, lat del punto en la primera, lon, lat del punto en la segunda)
+Transfer = Tuple[float, float, float, float, float, float, float]
+# (fracción, distancia en metros, lon, lat del punto proyectado)
+Location = Tuple[float, float, float, float]
+
+# Margen al sincronizar: una ruta confirmada tarde puede tener un created_at anterior a la marca
+_SYNC_OVERLAP = timedelta(minutes=5)
+
+
+def _project(px, py, ax, ay, bx, by):
+    """(t, distancia) de los puntos p a los segmentos ab, en coordenadas planas; vectorizada."""
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length_sq > 0, ((px - ax) * dx + (py - ay) * dy) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return t, np.hypot(ax + t * dx - px, ay + t * dy - py)
+
+
+def segment_distance(ax, ay, bx, by, cx, cy, dx, dy) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Distancia mínima entre los segmentos ab y cd (coordenadas planas, vectorizada con
+    broadcasting) y la posición de los puntos más cercanos: s sobre ab y t sobre cd.
+    """
+    ax, ay, bx, by, cx, cy, dx, dy = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (ax, ay, bx, by, cx, cy, dx, dy))
+    )
+    # Sin cruce, el punto más cercano está en un extremo de alguno de los dos
+    t0, d0 = _project(ax, ay, cx, cy, dx, dy)
+    t1, d1 = _project(bx, by, cx, cy, dx, dy)
+    s0, d2 = _project(cx, cy, ax, ay, bx, by)
+    s1, d3 = _project(dx, dy, ax, ay, bx, by)
+    distances = np.stack([d0, d1, d2, d3])
+    best = np.argmin(distances, axis=0)
+    distance = np.take_along_axis(distances, best[None], axis=0)[0]
+    zeros, ones = np.zeros_like(t0), np.ones_like(t0)
+    s = np.take_along_axis(np.stack([zeros, ones, s0, s1]), best[None], axis=0)[0]
+    t = np.take_along_axis(np.stack([t0, t1, zeros, ones]), best[None], axis=0)[0]
+    # Los que se cruzan: distancia 0 en el punto de cruce
+    rx, ry, qx, qy = bx - ax, by - ay, dx - cx, dy - cy
+    denominator = rx * qy - ry * qx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s_cross = ((cx - ax) * qy - (cy - ay) * qx) / denominator
+        t_cross = ((cx - ax) * ry - (cy - ay) * rx) / denominator
+    crossing = (denominator != 0) & (s_cross >= 0) & (s_cross <= 1) & (t_cross >= 0) & (t_cross <= 1)
+    return np.where(crossing, 0.0, distance), np.where(crossing, s_cross, s), np.where(crossing, t_cross, t)
+
+
+def _margin(lat: float, meters: float) -> Tuple[float, float]:
+    """(dlon, dlat) en grados que cubren `meters` alrededor de `lat`."""
+    dlat = meters / METERS_PER_DEGREE
+    return dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 90.0))), 1e-6), dlat
+
+
+class GraphRoute:
+    __slots__ = ("id", "index", "offset", "segments", "starts", "ends", "departure_time", "arrival_time", "is_recurrent")
+
+    def __init__(self, route_id, index: int, coords: np.ndarray, departure_time: datetime, arrival_time: datetime,
+                 is_recurrent: bool):
+        self.id = route_id
+        self.index = index  # posición en `TransferGraph._ids`
+        self.offset = 0  # posición de su primer segmento en `TransferGraph._segments`
+        # (n, 4): lon, lat de inicio y fin de cada segmento
+        self.segments = np.hstack([coords[:-1], coords[1:]])
+        # Fracción del trazado al inicio y al final de cada segmento
+        kx = np.cos(np.radians((coords[:-1, 1] + coords[1:, 1]) / 2)) * METERS_PER_DEGREE
+        lengths = np.hypot(np.diff(coords[:, 0]) * kx, np.diff(coords[:, 1]) * METERS_PER_DEGREE)
+        cumulative = np.concatenate([[0.0], np.cumsum(lengths)])
+        fractions = cumulative / cumulative[-1] if cumulative[-1] > 0 else np.zeros_like(cumulative)
+        self.starts, self.ends = fractions[:-1], fractions[1:]
+        self.departure_time = departure_time
+        self.arrival_time = arrival_time
+        self.is_recurrent = is_recurrent
+
+
+class TransferGraph:
+    """Rutas y sus vecinas a distancia de transbordo, seguro para uso desde varios hilos."""
+
+    def __init__(self, transfer_meters: float):
+        self.transfer_meters = transfer_meters
+        self._routes: Dict[object, GraphRoute] = {}
+        # {ruta: ids de las rutas que pasan a menos de transfer_meters}
+        self._edges: Dict[object, Set[object]] = {}
+        # Todos los segmentos: (lon, lat, lon, lat), la ruta (índice en `_ids`) y las fracciones
+        # de inicio y fin de cada uno. Los de rutas quitadas quedan en NaN (ninguna comparación
+        # los acepta) hasta compactar.
+        self._ids: List[object] = []
+        self._reset_segments()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, route_id) -> bool:
+        return route_id in self._routes
+
+    @property
+    def pair_count(self) -> int:
+        return sum(len(neighbours) for neighbours in self._edges.values()) // 2
+
+    def neighbours(self, route_id) -> Set[object]:
+        return set(self._edges.get(route_id, ()))
+
+    # --- Mantenimiento ---
+
+    def add(self, route_id, coords: Sequence[Coordinate], departure_time: datetime, arrival_time: datetime,
+            is_recurrent: bool = False) -> int:
+        """Agrega una ruta y calcula sus vecinas. Devuelve cuántas tiene (0 si ya estaba)."""
+        coords = np.asarray([point[:2] for point in coords], dtype=np.float64)
+        if len(coords) < 2:
+            return 0
+        with self._lock:
+            if route_id in self._routes:
+                return 0
+            route = GraphRoute(route_id, len(self._ids), coords, as_utc(departure_time), as_utc(arrival_time), is_recurrent)
+            neighbours = self._nearby_routes(route.segments)
+            self._routes[route_id] = route
+            self._ids.append(route_id)
+            self._append_segments(route)
+            self._edges[route_id] = neighbours
+            for other_id in neighbours:
+                self._edges[other_id].add(route_id)
+            return len(neighbours)
+
+    def add_route(self, route) -> int:
+        """Agrega una instancia de `models.Route`."""
+        return self.add(route.id, path_coordinates(route.path), route.departure_time, route.estimated_arrival_time,
+                        bool(route.is_recurrent))
+
+    def _append_segments(self, route: GraphRoute) -> None:
+        count = len(route.segments)
+        if self._size + count > len(self._segments):
+            capacity = max(1024, 2 * len(self._segments), self._size + count)
+            segments, owners = np.full((capacity, 4), np.nan), np.full(capacity, -1, dtype=np.int64)
+            starts, ends = np.zeros(capacity), np.zeros(capacity)
+            segments[:self._size], owners[:self._size] = self._segments[:self._size], self._owners[:self._size]
+            starts[:self._size], ends[:self._size] = self._starts[:self._size], self._ends[:self._size]
+            self._segments, self._owners, self._starts, self._ends = segments, owners, starts, ends
+        route.offset = self._size
+        self._segments[self._size:self._size + count] = route.segments
+        self._owners[self._size:self._size + count] = route.index
+        self._starts[self._size:self._size + count] = route.starts
+        self._ends[self._size:self._size + count] = route.ends
+        self._size += count
+
+    def _nearby_routes(self, segments: np.ndarray) -> Set[object]:
+        """Ids de las rutas con algún segmento a menos de transfer_meters de `segments`."""
+        limit = self.transfer_meters
+        stored = self._segments[:self._size]
+        dlon, dlat = _margin(float(np.abs(segments[:, [1, 3]]).max()), limit)
+        min_lon, max_lon = np.minimum(stored[:, 0], stored[:, 2]), np.maximum(stored[:, 0], stored[:, 2])
+        min_lat, max_lat = np.minimum(stored[:, 1], stored[:, 3]), np.maximum(stored[:, 1], stored[:, 3])
+        # Filtro grueso con el bounding box de toda la ruta, luego segmento por segmento
+        candidates = np.nonzero(
+            (max_lon >= segments[:, [0, 2]].min() - dlon) & (min_lon <= segments[:, [0, 2]].max() + dlon)
+            & (max_lat >= segments[:, [1, 3]].min() - dlat) & (min_lat <= segments[:, [1, 3]].max() + dlat)
+        )[0]
+        found: Set[int] = set()
+        for ax, ay, bx, by in segments:
+            if not len(candidates):
+                break
+            near = candidates[
+                (max_lon[candidates] >= min(ax, bx) - dlon) & (min_lon[candidates] <= max(ax, bx) + dlon)
+                & (max_lat[candidates] >= min(ay, by) - dlat) & (min_lat[candidates] <= max(ay, by) + dlat)
+            ]
+            if not len(near):
+                continue
+            # Plano local en metros con origen en el inicio del segmento
+            kx = math.cos(math.radians(ay)) * METERS_PER_DEGREE
+            other = stored[near]
+            distance, _, _ = segment_distance(
+                0.0, 0.0, (bx - ax) * kx, (by - ay) * METERS_PER_DEGREE,
+                (other[:, 0] - ax) * kx, (other[:, 1] - ay) * METERS_PER_DEGREE,
+                (other[:, 2] - ax) * kx, (other[:, 3] - ay) * METERS_PER_DEGREE,
+            )
+            hits = np.unique(self._owners[near[distance <= limit]])
+            if len(hits):
+                found.update(hits.tolist())
+                # Una ruta ya encontrada no se vuelve a medir
+                candidates = candidates[~np.isin(self._owners[candidates], hits)]
+        return {self._ids[index] for index in found}
+
+    def remove(self, route_id) -> None:
+        with self._lock:
+            route = self._routes.pop(route_id, None)
+            if route is None:
+                return
+            self._segments[route.offset:route.offset + len(route.segments)] = np.nan
+            self._removed += len(route.segments)
+            for other_id in self._edges.pop(route_id, ()):
+                neighbours = self._edges.get(other_id)
+                if neighbours is not None:
+                    neighbours.discard(route_id)
+            if self._removed > self._size // 2:
+                self._compact()
+
+    def _reset_segments(self) -> None:
+        self._segments, self._owners = np.empty((0, 4)), np.empty(0, dtype=np.int64)
+        self._starts, self._ends = np.empty(0), np.empty(0)
+        self._size = self._removed = 0
+        self._ids = []
+
+    def _compact(self) -> None:
+        """Rehace los arreglos de segmentos sólo con las rutas que siguen en el grafo."""
+        self._reset_segments()
+        for route in self._routes.values():
+            route.index = len(self._ids)
+            self._ids.append(route.id)
+            self._append_segments(route)
+
+    def prune(self, before: datetime) -> int:
+        """Quita las rutas no recurrentes que llegaron antes de `before`. Devuelve cuántas."""
+        before = as_utc(before)
+        with self._lock:
+            finished = [route.id for route in self._routes.values() if not route.is_recurrent and route.arrival_time < before]
+            for route_id in finished:
+                self.remove(route_id)
+        return len(finished)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._edges.clear()
+            self._reset_segments()
+
+    # --- Consultas ---
+
+    def near(self, lon: float, lat: float, buffer_meters: float) -> Dict[object, Location]:
+        """{route_id: (fracción, distancia_m, lon, lat)} de las rutas a menos de `buffer_meters` del punto."""
+        dlon, dlat = _margin(lat, buffer_meters)
+        kx = math.cos(math.radians(lat)) * METERS_PER_DEGREE
+        with self._lock:
+            stored = self._segments[:self._size]
+            candidates = np.nonzero(
+                (np.maximum(stored[:, 0], stored[:, 2]) >= lon - dlon) & (np.minimum(stored[:, 0], stored[:, 2]) <= lon + dlon)
+                & (np.maximum(stored[:, 1], stored[:, 3]) >= lat - dlat) & (np.minimum(stored[:, 1], stored[:, 3]) <= lat + dlat)
+            )[0]
+            segments = stored[candidates]
+            t, distance = _project(
+                0.0, 0.0, (segments[:, 0] - lon) * kx, (segments[:, 1] - lat) * METERS_PER_DEGREE,
+                (segments[:, 2] - lon) * kx, (segments[:, 3] - lat) * METERS_PER_DEGREE,
+            )
+            inside = distance <= buffer_meters
+            candidates, segments, t, distance = candidates[inside], segments[inside], t[inside], distance[inside]
+            owners = self._owners[candidates]
+            # El segmento más cercano de cada ruta
+            order = np.lexsort((distance, owners))
+            _, first = np.unique(owners[order], return_index=True)
+            found: Dict[object, Location] = {}
+            fractions = self._starts[candidates] + t * (self._ends[candidates] - self._starts[candidates])
+            for k in order[first]:
+                ax, ay, bx, by = segments[k]
+                found[self._ids[owners[k]]] = (float(fractions[k]), float(distance[k]),
+                                   float(ax + t[k] * (bx - ax)), float(ay + t[k] * (by - ay)))
+            return found
+
+    def transfers(self, pairs: Sequence[Tuple[object, object, float, float]],
+                  transfer_meters: Optional[float] = None) -> List[Optional[Transfer]]:
+        """
+        Para cada (primera, segunda, fracción de recogida, fracción de bajada): el punto de
+        transbordo con menos caminata que queda después de la recogida en la primera ruta y
+        antes de la bajada en la segunda, o None. Vectorizado sobre todos los pares.
+        """
+        limit = self.transfer_meters if transfer_meters is None else transfer_meters
+        found: List[Optional[Transfer]] = [None] * len(pairs)
+        with self._lock:
+            # Combinaciones (segmento de la primera, segmento de la segunda) de cada par
+            firsts, seconds, owners = [], [], []
+            for p, (first_id, second_id, after_fraction, before_fraction) in enumerate(pairs):
+                first, second = self._routes[first_id], self._routes[second_id]
+                a = first.offset + np.nonzero(first.ends > after_fraction)[0]
+                b = second.offset + np.nonzero(second.starts < before_fraction)[0]
+                firsts.append(np.repeat(a, len(b)))
+                seconds.append(np.tile(b, len(a)))
+                owners.append(np.full(len(a) * len(b), p))
+            if not firsts:
+                return found
+            a_index, b_index, pair = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(owners)
+            a, c = self._segments[a_index], self._segments[b_index]
+            # Filtro grueso por bounding box ampliado con la caminata
+            dlon, dlat = _margin(float(np.abs(a[:, 1]).max()) if len(a) else 0.0, limit)
+            near = np.nonzero(
+                (np.maximum(a[:, 0], a[:, 2]) >= np.minimum(c[:, 0], c[:, 2]) - dlon)
+                & (np.minimum(a[:, 0], a[:, 2]) <= np.maximum(c[:, 0], c[:, 2]) + dlon)
+                & (np.maximum(a[:, 1], a[:, 3]) >= np.minimum(c[:, 1], c[:, 3]) - dlat)
+                & (np.minimum(a[:, 1], a[:, 3]) <= np.maximum(c[:, 1], c[:, 3]) + dlat)
+            )[0]
+            a_index, b_index, pair, a, c = a_index[near], b_index[near], pair[near], a[near], c[near]
+            # Plano local en metros con origen en el inicio de cada segmento de la primera ruta
+            kx = np.cos(np.radians(a[:, 1])) * METERS_PER_DEGREE
+            distance, s, t = segment_distance(
+                0.0, 0.0, (a[:, 2] - a[:, 0]) * kx, (a[:, 3] - a[:, 1]) * METERS_PER_DEGREE,
+                (c[:, 0] - a[:, 0]) * kx, (c[:, 1] - a[:, 1]) * METERS_PER_DEGREE,
+                (c[:, 2] - a[:, 0]) * kx, (c[:, 3] - a[:, 1]) * METERS_PER_DEGREE,
+            )
+            from_fraction = self._starts[a_index] + s * (self._ends[a_index] - self._starts[a_index])
+            to_fraction = self._starts[b_index] + t * (self._ends[b_index] - self._starts[b_index])
+            bounds = np.array([(after, before) for _, _, after, before in pairs], dtype=np.float64).reshape(-1, 2)
+            valid = np.nonzero((distance <= limit) & (from_fraction > bounds[pair, 0]) & (to_fraction < bounds[pair, 1]))[0]
+            # El de menos caminata de cada par
+            order = valid[np.lexsort((distance[valid], pair[valid]))]
+            _, first = np.unique(pair[order], return_index=True)
+            for k in order[first]:
+                found[pair[k]] = (
+                    float(from_fraction[k]), float(to_fraction[k]), float(distance[k]),
+                    float(a[k, 0] + s[k] * (a[k, 2] - a[k, 0])), float(a[k, 1] + s[k] * (a[k, 3] - a[k, 1])),
+                    float(c[k, 0] + t[k] * (c[k, 2] - c[k, 0])), float(c[k, 1] + t[k] * (c[k, 3] - c[k, 1])),
+                )
+        return found
+
+    def transfer(self, first_id, second_id, after_fraction: float, before_fraction: float,
+                 transfer_meters: Optional[float] = None) -> Optional[Transfer]:
+        """`transfers` para un solo par."""
+        return self.transfers([(first_id, second_id, after_fraction, before_fraction)], transfer_meters)[0]
+
+    def candidates(self, from_lon: float, from_lat: float, to_lon: float, to_lat: float, buffer_meters: float,
+                   transfer_meters: Optional[float] = None,
+                   routes_per_end: Optional[int] = None) -> List[Tuple[object, object, Location, Transfer, Location]]:
+        """
+        Pares (primera, segunda, recogida, transbordo, bajada) geométricamente válidos: la
+        primera pasa por el origen antes del transbordo y la segunda por el transbordo antes
+        del destino. Con `routes_per_end` sólo se combinan las rutas más cercanas (menos
+        caminata) al origen y al destino: en zonas densas los pares crecen con el cuadrado.
+        """
+        origins = self.near(from_lon, from_lat, buffer_meters)
+        if not origins:
+            return []
+        destinations = self.near(to_lon, to_lat, buffer_meters)
+        if routes_per_end is not None:
+            origins = dict(heapq.nsmallest(routes_per_end, origins.items(), key=lambda item: item[1][1]))
+            destinations = dict(heapq.nsmallest(routes_per_end, destinations.items(), key=lambda item: item[1][1]))
+        with self._lock:
+            pairs = [
+                (first_id, second_id, pickup[0], destinations[second_id][0])
+                for first_id, pickup in origins.items()
+                for second_id in self._edges.get(first_id, set()) & destinations.keys()
+            ]
+            transfers = self.transfers(pairs, transfer_meters)
+        return [
+            (first_id, second_id, origins[first_id], transfer, destinations[second_id])
+            for (first_id, second_id, _, _), transfer in zip(pairs, transfers)
+            if transfer is not None
+        ]
+
+
+transfer_graph = TransferGraph(settings.JOURNEY_TRANSFER_METERS)
+metrics.register_gauge("transfer_graph_routes", lambda: len(transfer_graph), "Rutas en el grafo de transbordos")
+metrics.register_gauge("transfer_graph_pairs", lambda: transfer_graph.pair_count, "Pares de rutas a distancia de transbordo")
+
+
+# --- Carga y sincronización ---
+
+async def load_transfer_graph(db: AsyncSession, graph: TransferGraph = transfer_graph,
+                              since: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Agrega al grafo las rutas activas o llenas (sin `since`: las que no han llegado o son
+    recurrentes; con `since`: las creadas desde entonces). Las llenas entran porque al
+    liberar un asiento vuelven a estar disponibles; `_bookable` filtra por viaje al buscar.
+    Devuelve la nueva marca de agua (created_at). El cálculo de transbordos corre en un
+    hilo para no bloquear el event loop.
+    """
+    query = select(
+        models.Route.id, models.Route.path, models.Route.departure_time, models.Route.estimated_arrival_time,
+        models.Route.is_recurrent, models.Route.created_at,
+    ).where(models.Route.status.in_([models.RouteStatus.active, models.RouteStatus.full]))
+    if since is None:
+        query = query.where(or_(models.Route.is_recurrent.is_(True), models.Route.estimated_arrival_time > datetime.utcnow()))
+    else:
+        query = query.where(models.Route.created_at > since - _SYNC_OVERLAP)
+    result = await db.stream(query.execution_options(yield_per=1000))
+    watermark = since
+    async for rows in result.partitions():
+        new = [row for row in rows if row.id not in graph]
+        await asyncio.to_thread(lambda: [
+            graph.add(row.id, path_coordinates(row.path), row.departure_time, row.estimated_arrival_time, bool(row.is_recurrent))
+            for row in new
+        ])
+        latest = max((row.created_at for row in rows if row.created_at is not None), default=None)
+        if latest is not None and (watermark is None or latest > watermark):
+            watermark = latest
+    return watermark
+
+
+async def sync_transfer_graph(session_factory, interval: float, graph: TransferGraph = transfer_graph):
+    """Tarea de fondo: llena el grafo al arrancar y luego cada `interval` segundos agrega las rutas nuevas y quita las que ya llegaron."""
+    since = None
+    while True:
+        try:
+            async with session_factory() as db:
+                since = await load_transfer_graph(db, graph, since)
+            graph.prune(datetime.utcnow())
+        except Exception:
+            logger.exception("Transfer graph sync failed")
+        await asyncio.sleep(interval)
+
+
+# --- Planificación ---
+
+def _point(lon: float, lat: float) -> dict:
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+class JourneyLeg:
+    __slots__ = ("route", "pickup_fraction", "dropoff_fraction", "pickup_point", "dropoff_point")
+
+    def __init__(self, route, pickup_fraction, dropoff_fraction, pickup_lon, pickup_lat, dropoff_lon, dropoff_lat):
+        self.route = route
+        self.pickup_fraction = float(pickup_fraction)
+        self.dropoff_fraction = float(dropoff_fraction)
+        self.pickup_point = _point(pickup_lon, pickup_lat)
+        self.dropoff_point = _point(dropoff_lon, dropoff_lat)
+
+
+class Journey:
+    __slots__ = (
+        "legs",
+        "walk_to_pickup_meters",
+        "transfer_walk_meters",
+        "walk_from_dropoff_meters",
+        "transfer_wait_seconds",
+        "departure_gap_seconds",
+        "arrival_time",
+        "score",
+    )
+
+    def __init__(self, legs: List[JourneyLeg], walk_to_pickup_meters, transfer_walk_meters, walk_from_dropoff_meters,
+                 transfer_wait_seconds, departure_gap_seconds, arrival_time: datetime, score: float):
+        self.legs = legs
+        self.walk_to_pickup_meters = float(walk_to_pickup_meters)
+        self.transfer_walk_meters = float(transfer_walk_meters)
+        self.walk_from_dropoff_meters = float(walk_from_dropoff_meters)
+        self.transfer_wait_seconds = float(transfer_wait_seconds)
+        self.departure_gap_seconds = float(departure_gap_seconds)
+        self.arrival_time = arrival_time
+        self.score = score
+
+
+def _at(departure: datetime, arrival: datetime, fraction: float) -> datetime:
+    """Hora estimada de paso por una fracción del trazado."""
+    return departure + (arrival - departure) * fraction
+
+
+async def _bookable(db: AsyncSession, route_ids, departure_before: datetime, departure_after: Optional[datetime] = None,
+                    running_after: Optional[datetime] = None) -> Dict[object, list]:
+    """{route_id: filas de viajes reservables} que salen antes de `departure_before` (y desde `departure_after`)."""
+    trips = bookable_trips()
+    query = select(
+        trips.c.route_id, trips.c.trip_id, trips.c.departure_time, trips.c.estimated_arrival_time,
+    ).where(
+        trips.c.route_id.in_(list(route_ids)),
+        trips.c.available_seats > 0,
+        trips.c.status == models.RouteStatus.active,
+        trips.c.departure_time < departure_before,
+    )
+    if departure_after is not None:
+        query = query.where(trips.c.departure_time >= departure_after)
+    if running_after is not None:
+        query = query.where(trips.c.estimated_arrival_time > running_after)
+    found: Dict[object, list] = {}
+    for row in (await db.execute(query)).all():
+        found.setdefault(row.route_id, []).append(row)
+    return found
+
+
+async def plan_journeys(
+    db: AsyncSession,
+    from_lon: float,
+    from_lat: float,
+    to_lon: float,
+    to_lat: float,
+    buffer_meters: float,
+    desired_departure: datetime,
+    limit: int,
+    departure_after: datetime,
+    departure_before: Optional[datetime] = None,
+    transfer_meters: Optional[float] = None,
+    graph: TransferGraph = transfer_graph,
+) -> List[Journey]:
+    """Devuelve los `limit` mejores viajes de dos tramos, ordenados por costo ascendente."""
+    candidates = graph.candidates(from_lon, from_lat, to_lon, to_lat, buffer_meters, transfer_meters,
+                                  settings.JOURNEY_MAX_ROUTES_PER_END)
+    if not candidates:
+        return []
+    speed = settings.MATCH_WALKING_SPEED_MPS
+    min_transfer, max_wait = settings.JOURNEY_MIN_TRANSFER_SECONDS, settings.JOURNEY_MAX_WAIT_SECONDS
+    departure_after = as_utc(departure_after)
+    if departure_before is None:
+        departure_before = departure_after + timedelta(seconds=settings.JOURNEY_WINDOW_SECONDS)
+    departure_before = as_utc(departure_before)
+
+    # Primer tramo: salidas en la ventana pedida (las columnas son UTC sin zona)
+    first_trips = await _bookable(db, {c[0] for c in candidates}, departure_before.replace(tzinfo=None),
+                                  departure_after=departure_after.replace(tzinfo=None))
+    if not first_trips:
+        return []
+    # Segundo tramo: cualquier viaje que siga en marcha cuando puede llegar el pasajero
+    first_rows = [row for rows in first_trips.values() for row in rows]
+    earliest = min(row.departure_time for row in first_rows)
+    latest = max(row.estimated_arrival_time for row in first_rows) + timedelta(seconds=max_wait)
+    second_trips = await _bookable(db, {c[1] for c in candidates if c[0] in first_trips}, latest, running_after=earliest)
+
+    desired = as_utc(desired_departure)
+    ranked = []
+    for first_id, second_id, pickup, transfer, dropoff in candidates:
+        seconds = second_trips.get(second_id)
+        if not seconds:
+            continue
+        walk_seconds = transfer[2] / speed
+        for first in first_trips.get(first_id, ()):
+            departure, arrival = as_utc(first.departure_time), as_utc(first.estimated_arrival_time)
+            at_transfer = _at(departure, arrival, transfer[0])
+            gap = abs((departure - desired).total_seconds())
+            for second in seconds:
+                second_departure, second_arrival = as_utc(second.departure_time), as_utc(second.estimated_arrival_time)
+                wait = (_at(second_departure, second_arrival, transfer[1]) - at_transfer).total_seconds() - walk_seconds
+                if not min_transfer <= wait <= max_wait:
+                    continue
+                walk = pickup[1] + transfer[2] + dropoff[1]
+                score = walk / speed + wait + gap
+                ranked.append((score, str(first.trip_id), str(second.trip_id), first.trip_id, second.trip_id, (
+                    pickup, transfer, dropoff, wait, gap, _at(second_departure, second_arrival, dropoff[0]),
+                )))
+
+    top = heapq.nsmallest(limit, ranked, key=lambda item: item[:3])
+    trips = await load_trips(db, list({trip_id for item in top for trip_id in item[3:5]}))
+    journeys = []
+    for score, _, _, first_id, second_id, (pickup, transfer, dropoff, wait, gap, arrival) in top:
+        if first_id not in trips or second_id not in trips:
+            continue
+        legs = [
+            JourneyLeg(trips[first_id], pickup[0], transfer[0], pickup[2], pickup[3], transfer[3], transfer[4]),
+            JourneyLeg(trips[second_id], transfer[1], dropoff[0], transfer[5], transfer[6], dropoff[2], dropoff[3]),
+        ]
+        journeys.append(Journey(legs, pickup[1], transfer[2], dropoff[1], wait, gap, arrival, score))
+    return journeys
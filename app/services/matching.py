@@ -0,0 +1,188 @@
+"""
+Emparejamiento pasajero-ruta con dirección y ranking.
+
+Una ruta sirve al pasajero sólo si pasa cerca del origen y después cerca del
+destino (fracción de recogida < fracción de bajada sobre el trazado). Las rutas
+válidas se ordenan por un costo generalizado en segundos:
+
+    costo = (caminata hasta la recogida + caminata desde la bajada) / velocidad_caminando
+            + |salida de la ruta - salida deseada|
+
+y se devuelven las K mejores con las fracciones y los puntos proyectados ya
+calculados, que son los que luego necesita el cálculo del precio.
+De las rutas recurrentes se emparejan sus ocurrencias (ver app/services/recurrence.py).
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from geoalchemy2 import Geography
+from sqlalchemy import cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.services.pagination import as_utc, naive_utc
+from app.services.proximity import dwithin_meters, make_point
+from app.services.recurrence import bookable_trips, load_trips, trip
+from app.services.route_index import route_index
+from app.services.search_cache import is_bookable
+
+
+class RouteMatch:
+    __slots__ = (
+        "route",
+        "pickup_fraction",
+        "dropoff_fraction",
+        "pickup_point",
+        "dropoff_point",
+        "walk_to_pickup_meters",
+        "walk_from_dropoff_meters",
+        "departure_gap_seconds",
+        "score",
+    )
+
+    def __init__(self, route, pickup_fraction, dropoff_fraction, pickup_lon, pickup_lat, dropoff_lon, dropoff_lat,
+                 walk_to_pickup_meters, walk_from_dropoff_meters, departure_gap_seconds):
+        self.route = route
+        self.pickup_fraction = float(pickup_fraction)
+        self.dropoff_fraction = float(dropoff_fraction)
+        self.pickup_point = {"type": "Point", "coordinates": [float(pickup_lon), float(pickup_lat)]}
+        self.dropoff_point = {"type": "Point", "coordinates": [float(dropoff_lon), float(dropoff_lat)]}
+        self.walk_to_pickup_meters = float(walk_to_pickup_meters)
+        self.walk_from_dropoff_meters = float(walk_from_dropoff_meters)
+        self.departure_gap_seconds = float(departure_gap_seconds)
+        self.score = match_score(self.walk_to_pickup_meters + self.walk_from_dropoff_meters, self.departure_gap_seconds)
+
+
+def match_score(walk_meters: float, departure_gap_seconds: float) -> float:
+    return walk_meters / settings.MATCH_WALKING_SPEED_MPS + departure_gap_seconds
+
+
+async def match_routes(
+    db: AsyncSession,
+    from_lon: float,
+    from_lat: float,
+    to_lon: float,
+    to_lat: float,
+    buffer_meters: float,
+    desired_departure: datetime,
+    limit: int,
+    departure_after: Optional[datetime] = None,
+    departure_before: Optional[datetime] = None,
+) -> List[RouteMatch]:
+    """Devuelve las `limit` mejores rutas, ordenadas por costo ascendente."""
+    if settings.ROUTE_INDEX_ENABLED:
+        return await _match_with_index(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure,
+                                 limit, departure_after, departure_before)
+    return await _match_with_sql(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure,
+                           limit, departure_after, departure_before)
+
+
+async def _match_with_sql(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure,
+                    limit, departure_after, departure_before) -> List[RouteMatch]:
+    origin = make_point(from_lon, from_lat)
+    destination = make_point(to_lon, to_lat)
+    path = models.Route.path
+    coarse_buffer = buffer_meters + settings.PATH_COARSE_TOLERANCE_M
+    geography = Geography(srid=4326)
+    trips = bookable_trips()
+    # Las columnas son TIMESTAMP sin zona horaria, en UTC
+    desired_departure = naive_utc(desired_departure)
+
+    # 1. Candidatas: mismos filtros que /routes/search, calculando las fracciones una sola vez
+    candidates = select(
+        models.Route.id.label("id"),
+        trips.c.occurrence_id,
+        trips.c.trip_id,
+        trips.c.departure_time,
+        trips.c.estimated_arrival_time,
+        trips.c.available_seats,
+        trips.c.status,
+        func.ST_LineLocatePoint(path, origin).label("pickup_fraction"),
+        func.ST_LineLocatePoint(path, destination).label("dropoff_fraction"),
+        func.ST_Distance(cast(path, geography), cast(origin, geography)).label("walk_to_pickup"),
+        func.ST_Distance(cast(path, geography), cast(destination, geography)).label("walk_from_dropoff"),
+        func.abs(func.extract("epoch", trips.c.departure_time - desired_departure)).label("departure_gap"),
+    ).join(trips, trips.c.route_id == models.Route.id).where(
+        trips.c.available_seats > 0,
+        trips.c.status == models.RouteStatus.active,
+        # Radios en metros, con el índice GiST de cada columna (ver app/services/proximity.py)
+        dwithin_meters(models.Route.path_coarse, from_lon, from_lat, coarse_buffer),
+        dwithin_meters(models.Route.path_coarse, to_lon, to_lat, coarse_buffer),
+        dwithin_meters(path, from_lon, from_lat, buffer_meters),
+        dwithin_meters(path, to_lon, to_lat, buffer_meters),
+    )
+    if departure_after is not None:
+        candidates = candidates.where(trips.c.departure_time >= naive_utc(departure_after))
+    if departure_before is not None:
+        candidates = candidates.where(trips.c.departure_time < naive_utc(departure_before))
+    candidates = candidates.subquery()
+
+    # 2. Dirección, ranking y top K en la misma consulta
+    score = (
+        (candidates.c.walk_to_pickup + candidates.c.walk_from_dropoff) / settings.MATCH_WALKING_SPEED_MPS
+        + candidates.c.departure_gap
+    )
+    pickup_on_path = func.ST_LineInterpolatePoint(path, candidates.c.pickup_fraction)
+    dropoff_on_path = func.ST_LineInterpolatePoint(path, candidates.c.dropoff_fraction)
+    rows = (await db.execute(select(
+        models.Route,
+        candidates.c.occurrence_id,
+        candidates.c.departure_time,
+        candidates.c.estimated_arrival_time,
+        candidates.c.available_seats,
+        candidates.c.status,
+        candidates.c.pickup_fraction,
+        candidates.c.dropoff_fraction,
+        func.ST_X(pickup_on_path),
+        func.ST_Y(pickup_on_path),
+        func.ST_X(dropoff_on_path),
+        func.ST_Y(dropoff_on_path),
+        candidates.c.walk_to_pickup,
+        candidates.c.walk_from_dropoff,
+        candidates.c.departure_gap,
+    ).join(
+        candidates, candidates.c.id == models.Route.id
+    ).where(
+        candidates.c.pickup_fraction < candidates.c.dropoff_fraction
+    ).order_by(score, candidates.c.trip_id).limit(limit))).all()
+
+    return [RouteMatch(trip(*row[:6]), *row[6:]) for row in rows]
+
+
+async def _match_with_index(db, from_lon, from_lat, to_lon, to_lat, buffer_meters, desired_departure,
+                      limit, departure_after, departure_before) -> List[RouteMatch]:
+    # `search` ya descarta las rutas que pasan por el destino antes que por el origen
+    trip_ids = route_index.search(
+        from_lon, from_lat, to_lon, to_lat, buffer_meters,
+        departure_after=departure_after, departure_before=departure_before
+    )
+    desired = as_utc(desired_departure)
+    ranked = []
+    for trip_id in trip_ids:
+        pickup_fraction, walk_to_pickup, pickup_lon, pickup_lat = route_index.locate(trip_id, from_lon, from_lat)
+        dropoff_fraction, walk_from_dropoff, dropoff_lon, dropoff_lat = route_index.locate(trip_id, to_lon, to_lat)
+        gap = abs((as_utc(route_index.get(trip_id).departure_time) - desired).total_seconds())
+        score = match_score(walk_to_pickup + walk_from_dropoff, gap)
+        ranked.append((score, str(trip_id), trip_id, (
+            pickup_fraction, dropoff_fraction, pickup_lon, pickup_lat, dropoff_lon, dropoff_lat,
+            walk_to_pickup, walk_from_dropoff, gap,
+        )))
+
+    # El índice puede ir atrasado respecto a la BD: se recomprueba cada fila y se siguen
+    # pidiendo candidatas, en orden de puntaje, hasta tener `limit` reservables
+    ranked.sort()
+    matches = []
+    while ranked and len(matches) < limit:
+        top = ranked[:limit - len(matches)]
+        ranked = ranked[len(top):]
+        trips = await load_trips(db, [t[2] for t in top])
+        for _, _, trip_id, values in top:
+            trip = trips.get(trip_id)
+            if trip is None:
+                continue
+            if not is_bookable(trip.available_seats, trip.status):
+                route_index.update_availability(trip_id, trip.available_seats, trip.status)
+                continue
+            matches.append(RouteMatch(trip, *values))
+    return matches
@@ -0,0 +1,177 @@
+"""
+Registro mínimo de métricas del proceso.
+
+Los módulos registran funciones que devuelven el valor actual de una métrica:
+`register_gauge` para valores que suben y bajan (p. ej. la tasa de aciertos de una
+caché) y `register_counter` para totales que sólo crecen (los `*_total`, p. ej. sus
+aciertos). Quien quiera reportarlas llama a `collect()`. Los contadores e histogramas con etiquetas (latencia por endpoint,
+consultas por petición, ver app/services/instrumentation.py) se crean con
+`counter()` e `histogram()`; `render()` devuelve todo en el formato de texto de
+Prometheus para `GET /metrics`.
+"""
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites (en segundos) por defecto de los histogramas de latencia
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nombre -> (función, descripción, tipo: "gauge" o "counter")
+_gauges: Dict[str, Tuple[Callable[[], float], str, str]] = {}
+_lock = threading.Lock()
+
+
+def register_gauge(name: str, callback: Callable[[], float], description: str = "") -> None:
+    with _lock:
+        _gauges[name] = (callback, description, "gauge")
+
+
+def register_counter(name: str, callback: Callable[[], float], description: str = "") -> None:
+    """Como `register_gauge`, para un total monótono: se exporta como counter (el nombre termina en `_total`)."""
+    with _lock:
+        _gauges[name] = (callback, description, "counter")
+
+
+def collect() -> Dict[str, float]:
+    with _lock:
+        gauges = dict(_gauges)
+    return {name: float(callback()) for name, (callback, _, _) in gauges.items()}
+
+
+def register_cache(prefix: str, cache) -> None:
+    """Registra tamaño, aciertos, fallos y tasa de aciertos de una `TTLCache`."""
+    register_gauge(f"{prefix}_size", lambda: len(cache), "Entradas en la caché")
+    register_counter(f"{prefix}_hits_total", lambda: cache.hits, "Aciertos de la caché")
+    register_counter(f"{prefix}_misses_total", lambda: cache.misses, "Fallos de la caché")
+    register_gauge(f"{prefix}_hit_ratio", lambda: cache.hit_ratio, "Tasa de aciertos de la caché")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    """Contador por combinación de etiquetas."""
+
+    __slots__ = ("name", "description", "label_names", "_values", "_lock")
+
+    def __init__(self, name: str, description: str = "", label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram:
+    """
+    Histograma por combinación de etiquetas. Guarda el conteo de cada intervalo (no
+    acumulado, para que observar sea una búsqueda binaria y una suma) y acumula al exportar.
+    """
+
+    __slots__ = ("name", "description", "label_names", "buckets", "_series", "_lock")
+
+    def __init__(self, name: str, description: str = "", label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteos por intervalo (el último es +Inf), suma, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def total(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        lines = []
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+_collectors: Dict[str, object] = {}
+
+
+def counter(name: str, description: str = "", label_names: Sequence[str] = ()) -> Counter:
+    with _lock:
+        return _collectors.setdefault(name, Counter(name, description, label_names))
+
+
+def histogram(name: str, description: str = "", label_names: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    with _lock:
+        return _collectors.setdefault(name, Histogram(name, description, label_names, buckets))
+
+
+def render() -> str:
+    """Todas las métricas en el formato de texto de Prometheus."""
+    with _lock:
+        collectors = sorted(_collectors.items())
+        gauges = sorted(_gauges.items())
+    lines = []
+    for name, collector in collectors:
+        kind = "counter" if isinstance(collector, Counter) else "histogram"
+        lines.append(f"# HELP {name} {_escape(collector.description)}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(collector.render())
+    for name, (callback, description, kind) in gauges:
+        lines.append(f"# HELP {name} {_escape(description)}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_number(float(callback()))}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,185 @@
+"""
+Códigos OTP del registro por teléfono (`/auth/otp/request` y `/auth/otp/verify`).
+
+El almacén se elige con OTP_STORE:
+- "postgres" (por defecto): tabla `phone_verifications`, con una sola sentencia por
+  operación (INSERT ... ON CONFLICT para emitir, DELETE ... RETURNING para consumir).
+  Cualquier worker verifica el código que emitió otro. Las filas vencidas se borran
+  por lotes (OTP_SWEEP_BATCH_SIZE) en una tarea de fondo, en vez de quedarse en la
+  tabla para siempre.
+- "memory": en el proceso, con expiración y un lock por shard (OTP_MEMORY_SHARDS),
+  así que las solicitudes no tocan la BD. El código vive en el worker que lo emitió:
+  sólo sirve para despliegues de un solo proceso (con varios workers, `/otp/verify`
+  suele llegar a otro y responde "Invalid OTP code").
+
+Antes de llegar al almacén, cada solicitud y cada verificación gasta una ficha del
+token bucket de su teléfono y del de su IP (ver app/services/rate_limit.py): las
+ráfagas abusivas se rechazan con 429 sin tocar la BD.
+"""
+import asyncio
+import hmac
+import logging
+import math
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.services import metrics
+from app.services.rate_limit import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+OTP_LENGTH = 6
+
+# Resultado de consumir un código
+VALID, INVALID, EXPIRED = "valid", "invalid", "expired"
+
+
+def generate_code() -> str:
+    return "".join(secrets.choice("0123456789") for _ in range(OTP_LENGTH))
+
+
+class MemoryOTPStore:
+    """Códigos en memoria: teléfono -> (código, vence). Un dict y un lock por shard."""
+
+    def __init__(self, shards: int = 16, clock: Callable[[], float] = time.monotonic):
+        self._shards = [({}, threading.Lock()) for _ in range(max(1, shards))]
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return sum(len(codes) for codes, _ in self._shards)
+
+    def _shard(self, phone_number: str):
+        return self._shards[hash(phone_number) % len(self._shards)]
+
+    async def issue(self, db: AsyncSession, phone_number: str, code: str, ttl: float) -> None:
+        codes, lock = self._shard(phone_number)
+        with lock:
+            codes[phone_number] = (code, self._clock() + ttl)
+
+    async def consume(self, db: AsyncSession, phone_number: str, code: str) -> str:
+        codes, lock = self._shard(phone_number)
+        with lock:
+            entry = codes.get(phone_number)
+            if entry is None or not hmac.compare_digest(entry[0], code):
+                return INVALID
+            del codes[phone_number]
+        return VALID if entry[1] > self._clock() else EXPIRED
+
+    async def sweep(self, session_factory=None) -> int:
+        removed = 0
+        now = self._clock()
+        for codes, lock in self._shards:
+            with lock:
+                expired = [phone for phone, (_, expires_at) in codes.items() if expires_at <= now]
+                for phone in expired:
+                    del codes[phone]
+            removed += len(expired)
+        return removed
+
+
+class PostgresOTPStore:
+    """Códigos en `phone_verifications`; `expires_at` en UTC sin zona, como el resto del esquema."""
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+
+    async def issue(self, db: AsyncSession, phone_number: str, code: str, ttl: float) -> None:
+        table = models.PhoneVerification.__table__
+        statement = insert(table).values(
+            phone_number=phone_number, otp_code=code, expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+        )
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.phone_number],
+            set_={"otp_code": statement.excluded.otp_code, "expires_at": statement.excluded.expires_at},
+        ))
+
+    async def consume(self, db: AsyncSession, phone_number: str, code: str) -> str:
+        # Sólo se borra si el código coincide: un intento fallido no invalida el código vigente
+        table = models.PhoneVerification.__table__
+        expires_at = await db.scalar(
+            delete(table).where(table.c.phone_number == phone_number, table.c.otp_code == code)
+            .returning(table.c.expires_at)
+        )
+        if expires_at is None:
+            return INVALID
+        return VALID if expires_at > datetime.utcnow() else EXPIRED
+
+    async def sweep(self, session_factory) -> int:
+        """Borra los códigos vencidos por lotes, un commit por lote."""
+        table = models.PhoneVerification.__table__
+        removed = 0
+        while True:
+            expired = (
+                select(table.c.phone_number)
+                .where(table.c.expires_at < datetime.utcnow())
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            async with session_factory() as db:
+                result = await db.execute(delete(table).where(table.c.phone_number.in_(expired.scalar_subquery())))
+                await db.commit()
+            removed += result.rowcount
+            if result.rowcount < self.batch_size:
+                return removed
+
+
+_stores: Dict[str, Callable[[], Any]] = {
+    "memory": lambda: MemoryOTPStore(settings.OTP_MEMORY_SHARDS),
+    "postgres": lambda: PostgresOTPStore(settings.OTP_SWEEP_BATCH_SIZE),
+}
+
+
+def register_store(name: str, factory: Callable[[], Any]) -> None:
+    """Registra un almacén para usarlo con OTP_STORE=<name>."""
+    _stores[name] = factory
+
+
+_store = None
+
+
+def get_otp_store():
+    global _store
+    if _store is None:
+        if settings.OTP_STORE not in _stores:
+            raise ValueError(f"Unknown OTP_STORE: {settings.OTP_STORE}")
+        _store = _stores[settings.OTP_STORE]()
+    return _store
+
+
+phone_limiter = TokenBucketLimiter(settings.OTP_RATE_PHONE_PER_MINUTE, settings.OTP_RATE_PHONE_BURST)
+ip_limiter = TokenBucketLimiter(settings.OTP_RATE_IP_PER_MINUTE, settings.OTP_RATE_IP_BURST)
+metrics.register_counter("otp_rate_limited_phone_total", lambda: phone_limiter.rejected, "Peticiones OTP rechazadas por teléfono")
+metrics.register_counter("otp_rate_limited_ip_total", lambda: ip_limiter.rejected, "Peticiones OTP rechazadas por IP")
+
+
+def check_rate_limit(phone_number: str, client_ip: Optional[str]) -> None:
+    """429 si el teléfono o la IP agotaron su cupo. Primero la IP: un flood de números distintos no gasta baldes de teléfono."""
+    wait = ip_limiter.acquire(client_ip or "unknown") or phone_limiter.acquire(phone_number)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many OTP requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+async def sweep_expired_codes(session_factory, interval: float):
+    """Tarea de fondo: borra los códigos vencidos cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await get_otp_store().sweep(session_factory)
+            if removed:
+                logger.info("Removed %d expired OTP codes", removed)
+        except Exception:
+            logger.exception("OTP sweep failed")
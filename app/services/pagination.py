@@ -0,0 +1,41 @@
+"""
+Cursores opacos para paginación por keyset.
+
+El cursor codifica la última clave de ordenamiento devuelta (fecha de salida e id)
+en base64 URL-safe; el cliente sólo debe reenviarlo tal cual.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def as_utc(value: datetime) -> datetime:
+    """Normaliza un datetime a UTC con zona horaria (los naive se asumen en UTC)."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Para filtrar o guardar en las columnas TIMESTAMP sin zona horaria (en UTC): asyncpg rechaza los aware."""
+    return as_utc(value).replace(tzinfo=None)
+
+
+def encode_cursor(departure_time: datetime, route_id: uuid.UUID) -> str:
+    payload = json.dumps({"t": as_utc(departure_time).isoformat(), "id": str(route_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, uuid.UUID]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return as_utc(datetime.fromisoformat(payload["t"])), uuid.UUID(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
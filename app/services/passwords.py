@@ -0,0 +1,94 @@
+"""
+Hash y verificación de contraseñas fuera del event loop y del threadpool.
+
+bcrypt tarda cientos de milisegundos por llamada a propósito. Hacerlo dentro del
+endpoint ocupa un worker del threadpool de FastAPI todo ese tiempo y, durante una
+ráfaga de logins, el resto de la API se queda sin workers. Aquí el trabajo va a
+un pool de procesos de tamaño fijo con una cola acotada: si hay más de
+PASSWORD_POOL_WORKERS + PASSWORD_POOL_QUEUE operaciones en curso se rechaza la
+petición con 503 en lugar de encolarla sin límite.
+
+Con PASSWORD_POOL_WORKERS=0 se usa el threadpool, como antes (útil en pruebas).
+"""
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+from app.config import settings
+
+# Los hashes con menos rondas que BCRYPT_ROUNDS quedan marcados como obsoletos
+# y se rehashean en el siguiente login correcto.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt solo usa los primeros 72 bytes
+MAX_PASSWORD_BYTES = 72
+
+
+class PasswordPool:
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_size))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    async def run(self, fn, *args):
+        if self.workers <= 0:
+            return await run_in_threadpool(fn, *args)
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_pool = PasswordPool(settings.PASSWORD_POOL_WORKERS, settings.PASSWORD_POOL_QUEUE)
+
+
+def _truncate(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+# Estas funciones corren en los procesos del pool; deben ser de nivel de módulo.
+def _hash(password: str) -> str:
+    return pwd_context.hash(_truncate(password))
+
+
+def _verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(_truncate(password), password_hash)
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Devuelve (válida, nuevo_hash); nuevo_hash no es None si el hash guardado está obsoleto."""
+    return await password_pool.run(_verify_and_update, password, password_hash)
@@ -0,0 +1,75 @@
+"""
+Distancia y precio de un viaje sobre el path de una ruta.
+
+1. Proyectar los puntos de subida/bajada del pasajero sobre la línea de la ruta
+2. Crear una sub-línea (un recorte) del path de la ruta entre esos dos puntos
+3. Calcular la longitud de esa sub-línea en metros y convertir a km
+4. Multiplicar por el precio/km de la ruta
+
+Por defecto se calcula en el proceso (app/services/route_geometry.py), con el
+mismo resultado que la consulta PostGIS; PRICING_BACKEND=postgis usa la consulta.
+"""
+from typing import List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.services.instrumentation import timed
+from app.services.route_geometry import get_route_geometry, price_pairs
+
+# Esta es una consulta SQL compleja que usa funciones de PostGIS
+ROUTE_DISTANCE_SQL = text("""
+    WITH
+    line AS (SELECT path FROM routes WHERE id = :route_id),
+    start_point AS (SELECT ST_SetSRID(ST_MakePoint(:start_lon, :start_lat), 4326) as geom),
+    end_point AS (SELECT ST_SetSRID(ST_MakePoint(:end_lon, :end_lat), 4326) as geom),
+    
+    start_fraction AS (SELECT ST_LineLocatePoint(line.path, start_point.geom) as fraction FROM line, start_point),
+    end_fraction AS (SELECT ST_LineLocatePoint(line.path, end_point.geom) as fraction FROM line, end_point),
+
+    subline AS (
+        SELECT ST_LineSubstring(line.path, LEAST(start_fraction.fraction, end_fraction.fraction), GREATEST(start_fraction.fraction, end_fraction.fraction)) as segment
+        FROM line, start_fraction, end_fraction
+    )
+
+    SELECT ST_Length(segment::geography) / 1000.0 as distance_km FROM subline;
+""")
+
+
+async def route_distances_km(db: AsyncSession, route, pickups: Sequence[Sequence[float]], dropoffs: Sequence[Sequence[float]]) -> List[Optional[float]]:
+    """Distancias en km sobre el path de la ruta para N pares recogida/bajada."""
+    if settings.PRICING_BACKEND == "postgis":
+        distances = []
+        with timed("pricing_postgis"):
+            for pickup, dropoff in zip(pickups, dropoffs):
+                result = (await db.execute(ROUTE_DISTANCE_SQL, {
+                    "route_id": str(route.id),
+                    "start_lon": pickup[0],
+                    "start_lat": pickup[1],
+                    "end_lon": dropoff[0],
+                    "end_lat": dropoff[1],
+                })).first()
+                distances.append(None if not result or result.distance_km is None else float(result.distance_km))
+        return distances
+
+    with timed("pricing_numpy"):
+        distances_km, _ = price_pairs(route, [p[:2] for p in pickups], [d[:2] for d in dropoffs])
+    return [float(km) for km in distances_km]
+
+
+async def route_distance_km(db: AsyncSession, route, pickup: Sequence[float], dropoff: Sequence[float]) -> Optional[float]:
+    """Distancia en km sobre el path de la ruta entre la recogida y la bajada."""
+    return (await route_distances_km(db, route, [pickup], [dropoff]))[0]
+
+
+def stop_distance_km(route, pickup_fraction: float, dropoff_fraction: float) -> float:
+    """
+    Distancia en km entre dos paradas de la ruta. Sus fracciones ya están guardadas
+    (ver app/services/stops.py), así que no hay nada que proyectar.
+    """
+    return float(get_route_geometry(route).length_between([pickup_fraction], [dropoff_fraction])[0]) / 1000.0
+
+
+def trip_price(distance_km: float, route) -> float:
+    return float(distance_km) * float(route.price_per_km)
@@ -0,0 +1,50 @@
+"""
+Proximidad en metros sobre las columnas geometry SRID 4326 sin perder su índice GiST.
+
+`ST_DWithin(geometry, geometry, r)` mide `r` en las unidades del SRID (grados), y con
+`::geography` mide en metros pero ya no puede usar el índice de la columna geometry
+(`idx_routes_path`, `idx_routes_path_coarse`). `dwithin_meters` combina las dos cosas:
+
+1. Prefiltro por bounding box con el índice: `columna && ST_Expand(punto, dx, dy)`, con
+   dx/dy en grados calculados por exceso a partir de los metros y la latitud del punto
+   (un trazado a menos de `r` del punto tiene algún punto dentro de esa caja).
+2. Refinamiento exacto sobre el elipsoide: `ST_DWithin(columna::geography, punto::geography, r)`,
+   sólo para las filas que pasaron el prefiltro.
+"""
+import math
+from typing import Tuple
+
+from geoalchemy2 import Geography
+from sqlalchemy import and_, cast, func
+
+# Metros por grado en WGS84: el de latitud es mínimo en el ecuador; el de longitud es
+# ~111 319,5 * cos(lat) como mínimo. Con un 1 % de margen para el redondeo.
+MIN_METERS_PER_DEGREE_LAT = 110_574.0
+METERS_PER_DEGREE_LON_EQUATOR = 111_319.5
+SAFETY = 1.01
+
+_GEOGRAPHY = Geography(srid=4326)
+
+
+def expand_degrees(lat: float, meters: float) -> Tuple[float, float]:
+    """(dx, dy) en grados que cubren `meters` alrededor de un punto en `lat`, por exceso."""
+    dy = meters * SAFETY / MIN_METERS_PER_DEGREE_LAT
+    # La caja es más ancha (en grados) en su borde más alejado del ecuador
+    cos_lat = math.cos(math.radians(min(abs(lat) + dy, 90.0)))
+    if cos_lat < 1e-9:
+        return 180.0, dy
+    return min(meters * SAFETY / (METERS_PER_DEGREE_LON_EQUATOR * cos_lat), 180.0), dy
+
+
+def make_point(lon: float, lat: float):
+    return func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+
+
+def dwithin_meters(column, lon: float, lat: float, meters: float):
+    """`column` (geometry SRID 4326) a `meters` metros o menos del punto (lon, lat), usando el índice de `column`."""
+    point = make_point(lon, lat)
+    dx, dy = expand_degrees(lat, meters)
+    return and_(
+        column.op("&&")(func.ST_Expand(point, dx, dy)),
+        func.ST_DWithin(cast(column, _GEOGRAPHY), cast(point, _GEOGRAPHY), meters),
+    )
@@ -0,0 +1,111 @@
+"""
+Cotizaciones de precio sin escribir en la BD.
+
+Los puntos de recogida/bajada se ajustan (snap) a una rejilla de
+QUOTE_SNAP_DECIMALS decimales para que intentos casi idénticos compartan la
+misma entrada de la caché. La clave incluye el precio por km de la ruta, así que
+un cambio de tarifa invalida las cotizaciones viejas sin tener que purgarlas.
+
+Cada cotización lleva un token firmado (JWT) con la ruta, los puntos ajustados,
+la tarifa y el precio. `create_booking` lo acepta para no volver a calcular el
+precio, y al ser autocontenido sirve aunque la reserva llegue a otro worker.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.services import metrics
+from app.services.cache import TTLCache
+from app.services.pricing import route_distances_km, trip_price
+
+Point = Tuple[float, float]
+
+quote_cache = TTLCache(maxsize=settings.QUOTE_CACHE_SIZE, ttl=settings.QUOTE_CACHE_TTL_SECONDS)
+metrics.register_cache("quote_cache", quote_cache)
+
+
+class Quote:
+    __slots__ = ("route_id", "pickup", "dropoff", "price_per_km", "distance_km", "calculated_price",
+                 "quote_token", "expires_at")
+
+    def __init__(self, route_id, pickup: Point, dropoff: Point, price_per_km: str, distance_km: float, calculated_price: float):
+        self.route_id = route_id
+        self.pickup = pickup
+        self.dropoff = dropoff
+        self.price_per_km = price_per_km
+        self.distance_km = distance_km
+        self.calculated_price = calculated_price
+        self.expires_at = datetime.utcnow() + timedelta(seconds=settings.QUOTE_TOKEN_TTL_SECONDS)
+        self.quote_token = jwt.encode({
+            "typ": "quote",
+            "route": str(route_id),
+            "pickup": list(pickup),
+            "dropoff": list(dropoff),
+            "ppk": price_per_km,
+            "km": distance_km,
+            "price": calculated_price,
+            "exp": self.expires_at,
+        }, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+    @property
+    def pickup_point(self):
+        return {"type": "Point", "coordinates": list(self.pickup)}
+
+    @property
+    def dropoff_point(self):
+        return {"type": "Point", "coordinates": list(self.dropoff)}
+
+
+def snap(coordinates: Sequence[float]) -> Point:
+    return (round(float(coordinates[0]), settings.QUOTE_SNAP_DECIMALS),
+            round(float(coordinates[1]), settings.QUOTE_SNAP_DECIMALS))
+
+
+def _cache_key(route, pickup: Point, dropoff: Point):
+    # La tarifa hace de "versión" del precio
+    return (route.id, pickup, dropoff, str(route.price_per_km))
+
+
+async def quote_pairs(db: AsyncSession, route, pairs: Sequence[Tuple[Sequence[float], Sequence[float]]]) -> List[Optional[Quote]]:
+    """
+    Cotiza N pares recogida/bajada sobre una ruta. Los pares que no están en la
+    caché se calculan juntos en una sola llamada al motor de precios.
+    Devuelve None para los pares cuya distancia no se pudo calcular.
+    """
+    snapped = [(snap(pickup), snap(dropoff)) for pickup, dropoff in pairs]
+    quotes: List[Optional[Quote]] = [quote_cache.get(_cache_key(route, p, d)) for p, d in snapped]
+
+    missing = [i for i, q in enumerate(quotes) if q is None]
+    if missing:
+        distances = await route_distances_km(db, route, [snapped[i][0] for i in missing], [snapped[i][1] for i in missing])
+        for i, distance_km in zip(missing, distances):
+            if distance_km is None:
+                continue
+            pickup, dropoff = snapped[i]
+            quote = Quote(route.id, pickup, dropoff, str(route.price_per_km), distance_km, trip_price(distance_km, route))
+            quote_cache.set(_cache_key(route, pickup, dropoff), quote)
+            quotes[i] = quote
+    return quotes
+
+
+def redeem_quote_token(token: str, route, pickup: Sequence[float], dropoff: Sequence[float]) -> Optional[float]:
+    """
+    Precio de una cotización previa si el token es válido para esta ruta, estos
+    puntos y la tarifa actual de la ruta; None en cualquier otro caso.
+    """
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        return None
+    if (
+        claims.get("typ") != "quote"
+        or claims.get("route") != str(route.id)
+        or tuple(claims.get("pickup", ())) != snap(pickup)
+        or tuple(claims.get("dropoff", ())) != snap(dropoff)
+        or claims.get("ppk") != str(route.price_per_km)
+    ):
+        return None
+    return float(claims["price"])
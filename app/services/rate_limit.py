@@ -0,0 +1,51 @@
+"""
+Límite de frecuencia por clave (teléfono, IP...) con token buckets en memoria.
+
+Cada clave tiene un balde de `burst` fichas que se rellena a `per_minute` fichas por
+minuto; cada petición gasta una y, si no queda ninguna, se rechaza indicando cuánto
+esperar. Los baldes se guardan en un LRU acotado: uno desalojado equivale a uno lleno,
+así que la memoria no crece con el número de claves distintas.
+
+Como las demás cachés, el estado es por proceso: con N workers el límite efectivo es
+hasta N veces el configurado.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class TokenBucketLimiter:
+    __slots__ = ("rate", "burst", "maxsize", "rejected", "_clock", "_buckets", "_lock")
+
+    def __init__(self, per_minute: float, burst: int, maxsize: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.maxsize = maxsize
+        self.rejected = 0
+        self._clock = clock
+        # clave -> (fichas, última actualización)
+        self._buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: Hashable) -> float:
+        """Gasta una ficha de `key`. Devuelve 0 si se permite o los segundos a esperar si no."""
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                wait = (1.0 - tokens) / self.rate if self.rate > 0 else float("inf")
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
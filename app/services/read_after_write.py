@@ -0,0 +1,88 @@
+"""
+Read-your-writes entre workers, con la réplica de lectura (READ_DATABASE_URL).
+
+El registro de escritores recientes de app/db.py es por proceso: con varios workers, la
+siguiente lectura suele llegar a uno que no vio la escritura e iría a la réplica atrasada.
+Por eso la marca viaja con el cliente:
+
+- `ReadAfterWriteMiddleware` (ASGI) abre un registro por petición (`request_writers`);
+  el evento `after_commit` anota ahí al usuario que escribió.
+- Si alguien escribió, la respuesta trae la marca firmada (HMAC con JWT_SECRET_KEY):
+  `usuario.vence.firma`, con vencimiento en READ_AFTER_WRITE_SECONDS. Se envía en la
+  cookie `aventon_rw` (los navegadores y los clientes con cookies la reenvían solos) y
+  en la cabecera `X-Read-After-Write` (los demás clientes la reenvían tal cual).
+- `get_read_db` usa el primario mientras la marca del usuario siga vigente, en
+  cualquier worker. La firma impide alargarla o usar la de otro usuario.
+"""
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+from app.config import settings
+from app.db import request_writers
+
+COOKIE = "aventon_rw"
+HEADER = "x-read-after-write"
+
+
+def _signature(user_id: str, expires: int) -> str:
+    digest = hmac.new(settings.JWT_SECRET_KEY.encode(), f"{user_id}.{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def make_marker(user_id, now: Optional[float] = None) -> str:
+    expires = int((now if now is not None else time.time()) + settings.READ_AFTER_WRITE_SECONDS) + 1
+    return f"{user_id}.{expires}.{_signature(str(user_id), expires)}"
+
+
+def valid_marker(marker: Optional[str], user_id, now: Optional[float] = None) -> bool:
+    """True si la marca es del usuario, está bien firmada y no ha vencido."""
+    if not marker:
+        return False
+    try:
+        marker_user, expires, signature = marker.rsplit(".", 2)
+        expires = int(expires)
+    except ValueError:
+        return False
+    if marker_user != str(user_id) or not hmac.compare_digest(signature, _signature(marker_user, expires)):
+        return False
+    return (now if now is not None else time.time()) < expires
+
+
+def marker_from(request) -> Optional[str]:
+    return request.headers.get(HEADER) or request.cookies.get(COOKIE)
+
+
+class ReadAfterWriteMiddleware:
+    """Middleware ASGI: agrega la marca a las respuestas de las peticiones que escribieron."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        writers = set()
+        token = request_writers.set(writers)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writers:
+                # Normalmente uno: el usuario autenticado de la petición
+                marker = make_marker(next(iter(writers)))
+                headers = list(message.get("headers", []))
+                headers.append((HEADER.encode(), marker.encode()))
+                headers.append((b"set-cookie", (
+                    f"{COOKIE}={marker}; Max-Age={int(settings.READ_AFTER_WRITE_SECONDS) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                ).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_writers.reset(token)
@@ -0,0 +1,253 @@
+"""
+Rutas recurrentes.
+
+Una ruta con `is_recurrent` es una plantilla: guarda el path una sola vez y su
+`recurrence_pattern` dice qué días se repite. Lo que se busca y se reserva son sus
+ocurrencias (`route_occurrences`), cada una con su hora de salida y sus propios asientos.
+
+Las ocurrencias se generan por adelantado sólo dentro de una ventana móvil de
+RECURRENCE_WINDOW_DAYS días. `Route.materialized_until` marca hasta dónde se
+generaron, así que cada extensión genera sólo el tramo nuevo; y como hay una única
+ocurrencia por (ruta, salida), repetir una expansión no duplica nada.
+
+Formato de `recurrence_pattern` (ver `schemas.RecurrencePattern`):
+
+    {"weekdays": [0, 1, 2, 3, 4],   # 0 = lunes ... 6 = domingo
+     "interval_weeks": 1,           # cada cuántas semanas, contando desde la primera salida
+     "until": "2026-12-31",         # opcional: última fecha con viaje
+     "exceptions": ["2026-12-25"]}  # opcional: fechas sin viaje
+
+La hora de salida y la duración del viaje son las de la ruta; `Route.departure_time`
+es la primera salida de la serie. Las horas se guardan en UTC (Colombia no cambia de hora).
+"""
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import cast, null, or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.services.pagination import as_utc, naive_utc
+from app.services.route_index import route_index
+from app.services.search_cache import search_cache
+
+logger = logging.getLogger(__name__)
+
+Route = models.Route
+RouteOccurrence = models.RouteOccurrence
+
+# Ocurrencias por INSERT multi-fila
+INSERT_BATCH_SIZE = 1000
+
+
+def _dates(values: Optional[Iterable]) -> set:
+    return {v if isinstance(v, date) else date.fromisoformat(v) for v in values or ()}
+
+
+def occurrence_departures(first_departure: datetime, pattern: dict, start: datetime, end: datetime) -> Iterator[datetime]:
+    """Salidas de la serie dentro de [start, end), en orden."""
+    first_departure, start, end = naive_utc(first_departure), naive_utc(start), naive_utc(end)
+    weekdays = set(pattern.get("weekdays") or ())
+    interval = max(1, int(pattern.get("interval_weeks") or 1))
+    until = _dates([pattern["until"]]).pop() if pattern.get("until") else None
+    exceptions = _dates(pattern.get("exceptions"))
+    first_week = first_departure.date() - timedelta(days=first_departure.weekday())
+
+    day = max(start, first_departure).date()
+    while True:
+        departure = datetime.combine(day, first_departure.time())
+        if departure >= end or (until is not None and day > until):
+            return
+        if (departure >= start and departure >= first_departure
+                and day.weekday() in weekdays
+                and ((day - first_week).days // 7) % interval == 0
+                and day not in exceptions):
+            yield departure
+        day += timedelta(days=1)
+
+
+def window_end(now: Optional[datetime] = None) -> datetime:
+    return naive_utc(now or datetime.utcnow()) + timedelta(days=settings.RECURRENCE_WINDOW_DAYS)
+
+
+def occurrence_rows(route, until: datetime) -> List[dict]:
+    """Filas de las ocurrencias que faltan entre `materialized_until` (o la primera salida) y `until`."""
+    start = route.materialized_until or route.departure_time
+    duration = naive_utc(route.estimated_arrival_time) - naive_utc(route.departure_time)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "route_id": route.id,
+            "departure_time": departure,
+            "estimated_arrival_time": departure + duration,
+            "available_seats": route.available_seats,
+            "status": models.RouteStatus.active,
+        }
+        for departure in occurrence_departures(route.departure_time, route.recurrence_pattern or {}, start, until)
+    ]
+
+
+async def insert_occurrences(db: AsyncSession, rows: Sequence[dict]) -> list:
+    """INSERT multi-fila; las que ya existían (otra expansión concurrente) se omiten. Devuelve las insertadas."""
+    inserted = []
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        stmt = (
+            insert(RouteOccurrence)
+            .values(list(rows[i:i + INSERT_BATCH_SIZE]))
+            .on_conflict_do_nothing(index_elements=["route_id", "departure_time"])
+            .returning(RouteOccurrence.id, RouteOccurrence.route_id, RouteOccurrence.departure_time,
+                       RouteOccurrence.available_seats, RouteOccurrence.status)
+        )
+        inserted.extend((await db.execute(stmt)).all())
+    return inserted
+
+
+async def materialize(db: AsyncSession, route: models.Route, until: Optional[datetime] = None) -> list:
+    """Genera las ocurrencias de una ruta hasta `until` (por defecto, el fin de la ventana). No hace commit."""
+    until = until or window_end()
+    if route.materialized_until is not None and route.materialized_until >= until:
+        return []
+    inserted = await insert_occurrences(db, occurrence_rows(route, until))
+    route.materialized_until = until
+    return inserted
+
+
+async def extend_window(db: AsyncSession, now: Optional[datetime] = None) -> list:
+    """
+    Extiende la ventana de todas las rutas recurrentes activas hasta `now` + RECURRENCE_WINDOW_DAYS.
+    Devuelve las ocurrencias insertadas. No hace commit.
+    """
+    until = window_end(now)
+    routes = (await db.execute(
+        select(Route.id, Route.departure_time, Route.estimated_arrival_time, Route.available_seats,
+               Route.recurrence_pattern, Route.materialized_until)
+        .where(
+            Route.is_recurrent.is_(True),
+            Route.status == models.RouteStatus.active,
+            or_(Route.materialized_until.is_(None), Route.materialized_until < until),
+        )
+    )).all()
+    if not routes:
+        return []
+    rows = [row for route in routes for row in occurrence_rows(route, until)]
+    inserted = await insert_occurrences(db, rows)
+    await db.execute(
+        update(Route)
+        .where(Route.id.in_([route.id for route in routes]))
+        .values(materialized_until=until)
+        .execution_options(synchronize_session=False)
+    )
+    return inserted
+
+
+def index_occurrences(rows: Iterable) -> None:
+    """Agrega al índice en memoria las ocurrencias ya confirmadas."""
+    if settings.ROUTE_INDEX_ENABLED:
+        for row in rows:
+            route_index.upsert_occurrence(row.id, row.route_id, row.departure_time, row.available_seats, row.status)
+
+
+async def refresh_recurrences(session_factory, interval: float):
+    """Tarea de fondo: extiende la ventana de ocurrencias al arrancar y luego cada `interval` segundos."""
+    while True:
+        try:
+            async with session_factory() as db:
+                inserted = await extend_window(db)
+                await db.commit()
+            index_occurrences(inserted)
+            if inserted:
+                if settings.SEARCH_CACHE_ENABLED:
+                    search_cache.invalidate_routes({row.route_id for row in inserted})
+                logger.info("Materialized %d route occurrences", len(inserted))
+        except Exception:
+            logger.exception("Route occurrence refresh failed")
+        await asyncio.sleep(interval)
+
+
+# --- Viajes: rutas sueltas y ocurrencias ---
+
+def bookable_trips():
+    """
+    Subconsulta con todos los viajes reservables: las rutas no recurrentes y las
+    ocurrencias de las recurrentes. `trip_id` es el id de la ruta o de la ocurrencia
+    y es la segunda clave del keyset (departure_time, trip_id).
+    Postgres empuja los filtros de salida/estado a cada rama y usa su índice.
+    """
+    return union_all(
+        select(
+            Route.id.label("route_id"),
+            cast(null(), UUID(as_uuid=True)).label("occurrence_id"),
+            Route.id.label("trip_id"),
+            Route.departure_time.label("departure_time"),
+            Route.estimated_arrival_time.label("estimated_arrival_time"),
+            Route.available_seats.label("available_seats"),
+            Route.status.label("status"),
+        ).where(Route.is_recurrent.is_not(True)),
+        select(
+            RouteOccurrence.route_id,
+            RouteOccurrence.id,
+            RouteOccurrence.id,
+            RouteOccurrence.departure_time,
+            RouteOccurrence.estimated_arrival_time,
+            RouteOccurrence.available_seats,
+            RouteOccurrence.status,
+        ),
+    ).subquery("trips")
+
+
+class OccurrenceView:
+    """
+    Una ocurrencia vista como ruta, para las respuestas: los datos de la ruta (path,
+    conductor, ciudades...) con la salida, los asientos y el estado de la ocurrencia.
+    `id` sigue siendo el de la ruta, así el path serializado se comparte entre ocurrencias.
+    """
+
+    def __init__(self, route, occurrence_id, departure_time, estimated_arrival_time, available_seats, status):
+        self.route = route
+        self.occurrence_id = occurrence_id
+        self.departure_time = departure_time
+        self.estimated_arrival_time = estimated_arrival_time
+        self.available_seats = available_seats
+        self.status = status
+
+    def __getattr__(self, name):
+        return getattr(self.route, name)
+
+    @classmethod
+    def of(cls, route, occurrence: models.RouteOccurrence) -> "OccurrenceView":
+        return cls(route, occurrence.id, occurrence.departure_time, occurrence.estimated_arrival_time,
+                   occurrence.available_seats, occurrence.status)
+
+
+def trip(route, occurrence_id, departure_time, estimated_arrival_time, available_seats, status):
+    """La ruta si el viaje es una ruta suelta, o la vista de la ocurrencia."""
+    if occurrence_id is None:
+        return route
+    return OccurrenceView(route, occurrence_id, departure_time, estimated_arrival_time, available_seats, status)
+
+
+def trip_key(item):
+    """Clave de orden y de cursor de un viaje: (salida, id de la ocurrencia o de la ruta)."""
+    return as_utc(item.departure_time), getattr(item, "occurrence_id", None) or item.id
+
+
+async def load_trips(db: AsyncSession, trip_ids: Sequence) -> Dict[object, object]:
+    """Carga rutas sueltas y ocurrencias por id. Devuelve {trip_id: Route u OccurrenceView}."""
+    if not trip_ids:
+        return {}
+    trips = {r.id: r for r in await db.scalars(select(Route).where(Route.id.in_(trip_ids)))}
+    missing = [trip_id for trip_id in trip_ids if trip_id not in trips]
+    if missing:
+        rows = await db.execute(
+            select(RouteOccurrence, Route)
+            .join(Route, RouteOccurrence.route_id == Route.id)
+            .where(RouteOccurrence.id.in_(missing))
+        )
+        for occurrence, route in rows:
+            trips[occurrence.id] = OccurrenceView.of(route, occurrence)
+    return trips
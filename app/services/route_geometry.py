@@ -0,0 +1,293 @@
+"""
+Geometría de rutas en el proceso, vectorizada con NumPy.
+
+Reproduce el cálculo de distancia que `create_booking` hacía en PostGIS:
+
+    ST_Length(ST_LineSubstring(path, LEAST(f1, f2), GREATEST(f1, f2))::geography)
+
+con f = ST_LineLocatePoint(path, punto). Igual que PostGIS:
+- La proyección y las fracciones son planas, sobre lon/lat en grados.
+- La longitud es geodésica sobre el elipsoide WGS84 (no haversine: la esfera se
+  desvía del elipsoide varios metros por kilómetro, muy por encima de centímetros).
+
+El path de cada ruta se decodifica una sola vez y se guardan las longitudes
+acumuladas (planas y geodésicas) de sus segmentos; ver `get_route_geometry`.
+"""
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+import numpy as np
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Tipos WKB de LineString: 2 (OGC/EWKB) y 1002/2002/3002 (ISO con Z/M/ZM)
+_WKB_LINESTRING = 2
+_EWKB_Z = 0x80000000
+_EWKB_M = 0x40000000
+_EWKB_SRID = 0x20000000
+
+
+def wkb_bytes(data) -> bytes:
+    """Bytes WKB a partir de lo que entregue el driver (bytes, memoryview o hex)."""
+    if isinstance(data, str):
+        return bytes.fromhex(data)
+    return bytes(data)
+
+
+def decode_linestring(data: bytes) -> np.ndarray:
+    """
+    Decodifica un LineString WKB/EWKB a un arreglo (n, 2) de [lon, lat] sin
+    construir objetos de Shapely. Las dimensiones Z/M se descartan.
+    """
+    data = wkb_bytes(data)
+    endian = "<" if data[0] == 1 else ">"
+    (geom_type,) = struct.unpack_from(endian + "I", data, 1)
+    offset = 5
+    ndims = 2
+    if geom_type & _EWKB_SRID:
+        offset += 4
+    if geom_type & _EWKB_Z:
+        ndims += 1
+    if geom_type & _EWKB_M:
+        ndims += 1
+    base_type = geom_type & 0x0FFFFFFF
+    if base_type >= 1000:
+        ndims += {1: 1, 2: 1, 3: 2}[base_type // 1000]
+        base_type %= 1000
+    if base_type != _WKB_LINESTRING:
+        raise ValueError(f"Expected a WKB LineString, got type {geom_type}")
+    (npoints,) = struct.unpack_from(endian + "I", data, offset)
+    offset += 4
+    coords = np.frombuffer(data, dtype=np.dtype("float64").newbyteorder(endian), count=npoints * ndims, offset=offset)
+    return coords.reshape(npoints, ndims)[:, :2].astype(np.float64)
+
+
+# Por debajo de este tamaño (en grados) un segmento se mide con la aproximación
+# local del elipsoide, con error < 0.2 mm; los más largos van por Vincenty.
+_SHORT_SEGMENT_DEGREES = 0.05
+_WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+
+def geodesic_distance(lon1, lat1, lon2, lat2) -> np.ndarray:
+    """
+    Distancia geodésica en metros sobre WGS84, vectorizada sobre arreglos de grados.
+
+    Los segmentos cortos (el caso normal de un trazado GPS) usan los radios de
+    curvatura del elipsoide en la latitud media; los largos, la fórmula inversa
+    de Vincenty. En ambos casos el error es submilimétrico.
+    """
+    lon1, lat1, lon2, lat2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (lon1, lat1, lon2, lat2)))
+    phi = np.radians((lat1 + lat2) / 2)
+    sin_phi = np.sin(phi)
+    w = np.sqrt(1 - _WGS84_E2 * sin_phi ** 2)
+    meridional = WGS84_A * (1 - _WGS84_E2) / w ** 3
+    prime_vertical = WGS84_A / w
+    distance = np.hypot(
+        meridional * np.radians(lat2 - lat1),
+        prime_vertical * np.cos(phi) * np.radians(lon2 - lon1),
+    )
+
+    long_segments = (np.abs(lat2 - lat1) > _SHORT_SEGMENT_DEGREES) | (np.abs(lon2 - lon1) > _SHORT_SEGMENT_DEGREES)
+    if np.any(long_segments):
+        distance = np.array(distance)
+        distance[long_segments] = _vincenty(lon1[long_segments], lat1[long_segments],
+                                            lon2[long_segments], lat2[long_segments])
+    return distance
+
+
+def _vincenty(lon1, lat1, lon2, lat2) -> np.ndarray:
+    """Fórmula inversa de Vincenty (no converge sólo para puntos casi antípodas)."""
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(200):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            if lam.size == 0 or np.max(np.abs(lam - lam_prev)) < 1e-12:
+                break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    return WGS84_B * A * (sigma - delta_sigma)
+
+
+class RouteGeometry:
+    """Path de una ruta con sus longitudes acumuladas precalculadas."""
+
+    __slots__ = ("coords", "starts", "deltas", "planar_lengths", "inverse_lengths", "inverse_lengths_sq",
+                 "planar_cumulative", "planar_total", "geodesic_cumulative")
+
+    def __init__(self, coords: np.ndarray):
+        coords = np.asarray(coords, dtype=np.float64)
+        if coords.ndim != 2 or coords.shape[0] < 2:
+            raise ValueError("A route path needs at least two points")
+        self.coords = coords
+        self.starts = coords[:-1]
+        self.deltas = coords[1:] - coords[:-1]
+        self.planar_lengths = np.hypot(self.deltas[:, 0], self.deltas[:, 1])
+        # Inversos precalculados; los segmentos de longitud cero quedan en 0 (t = 0)
+        nonzero = self.planar_lengths > 0
+        self.inverse_lengths = np.divide(1.0, self.planar_lengths, out=np.zeros_like(self.planar_lengths), where=nonzero)
+        self.inverse_lengths_sq = self.inverse_lengths ** 2
+        self.planar_cumulative = np.concatenate(([0.0], np.cumsum(self.planar_lengths)))
+        self.planar_total = float(self.planar_cumulative[-1])
+        geodesic = geodesic_distance(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+        self.geodesic_cumulative = np.concatenate(([0.0], np.cumsum(geodesic)))
+
+    @classmethod
+    def from_wkb(cls, data: bytes) -> "RouteGeometry":
+        return cls(decode_linestring(data))
+
+    @property
+    def length_meters(self) -> float:
+        return float(self.geodesic_cumulative[-1])
+
+    def locate(self, points) -> np.ndarray:
+        """
+        Fracción (0-1) del punto más cercano sobre el path para cada punto (N, 2),
+        con la misma semántica que ST_LineLocatePoint (plano, primer segmento
+        más cercano en caso de empate).
+        """
+        segment, t = self._project(points)
+        if self.planar_total == 0:
+            return np.zeros(len(segment))
+        return (self.planar_cumulative[segment] + t * self.planar_lengths[segment]) / self.planar_total
+
+    def _project(self, points) -> Tuple[np.ndarray, np.ndarray]:
+        """Segmento y parámetro t del punto más cercano para cada punto (N, 2)."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        # (N, M): proyección de cada punto sobre cada segmento
+        rel = points[:, None, :] - self.starts[None, :, :]
+        t = (rel * self.deltas[None, :, :]).sum(axis=2) * self.inverse_lengths_sq
+        t = np.minimum(np.maximum(t, 0.0), 1.0)
+        closest = self.starts[None, :, :] + t[..., None] * self.deltas[None, :, :]
+        dist_sq = ((points[:, None, :] - closest) ** 2).sum(axis=2)
+        segment = np.argmin(dist_sq, axis=1)
+        return segment, t[np.arange(len(points)), segment]
+
+    def _at(self, fractions) -> Tuple[np.ndarray, np.ndarray]:
+        """Segmento y punto [lon, lat] que corresponden a cada fracción plana."""
+        target = np.minimum(np.maximum(np.asarray(fractions, dtype=np.float64), 0.0), 1.0) * self.planar_total
+        segment = np.minimum(np.searchsorted(self.planar_cumulative, target, side="right") - 1, len(self.starts) - 1)
+        t = (target - self.planar_cumulative[segment]) * self.inverse_lengths[segment]
+        t = np.minimum(np.maximum(t, 0.0), 1.0)
+        return segment, self.starts[segment] + t[:, None] * self.deltas[segment]
+
+    def interpolate(self, fractions) -> np.ndarray:
+        """Puntos [lon, lat] sobre el path para cada fracción, como ST_LineInterpolatePoint."""
+        return self._at(fractions)[1]
+
+    def length_between(self, from_fractions, to_fractions) -> np.ndarray:
+        """
+        Longitud geodésica en metros del tramo entre dos fracciones (en cualquier
+        orden), como ST_Length(ST_LineSubstring(...)::geography).
+        """
+        a = np.minimum(from_fractions, to_fractions)
+        b = np.maximum(from_fractions, to_fractions)
+        seg_a, point_a = self._at(a)
+        seg_b, point_b = self._at(b)
+        same = seg_a == seg_b
+
+        # Mismo segmento: distancia directa entre los dos puntos.
+        # Distintos segmentos: resto del primero + segmentos completos + inicio del último.
+        next_vertex = self.coords[np.minimum(seg_a + 1, len(self.coords) - 1)]
+        last_vertex = self.coords[seg_b]
+        starts = np.concatenate((point_a, point_a, last_vertex))
+        ends = np.concatenate((point_b, next_vertex, point_b))
+        distances = geodesic_distance(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+        n = len(seg_a)
+        direct, head, tail = distances[:n], distances[n:2 * n], distances[2 * n:]
+        middle = self.geodesic_cumulative[seg_b] - self.geodesic_cumulative[np.minimum(seg_a + 1, seg_b)]
+        return np.where(same, direct, head + middle + tail)
+
+    def distances_km(self, pickups, dropoffs) -> np.ndarray:
+        """Distancia sobre la ruta, en km, para N pares recogida/bajada (N, 2)."""
+        return self.length_between(self.locate(pickups), self.locate(dropoffs)) / 1000.0
+
+
+class WKBCache:
+    """
+    LRU de valores derivados del WKB de una ruta (geometría, GeoJSON...) por clave.
+    La entrada se invalida sola si el WKB cambia: se guarda junto al valor y se compara.
+    """
+
+    def __init__(self, build: Callable[[bytes], Any], maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._build = build
+        self._entries: "OrderedDict[object, Tuple[bytes, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, data: bytes, build: Callable[[bytes], Any] = None):
+        data = wkb_bytes(data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == data:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = (build or self._build)(data)
+        with self._lock:
+            self._entries[key] = (data, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RouteGeometryCache(WKBCache):
+    """LRU de `RouteGeometry` por id de ruta; se invalida solo si cambia el WKB."""
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__(RouteGeometry.from_wkb, maxsize)
+
+
+route_geometry_cache = RouteGeometryCache()
+
+
+def get_route_geometry(route) -> RouteGeometry:
+    """`RouteGeometry` de una instancia de `models.Route`, reutilizando la caché."""
+    return route_geometry_cache.get(route.id, route.path.data)
+
+
+def price_pairs(route, pickups, dropoffs) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Precio de N pares recogida/bajada sobre una misma ruta en una sola llamada.
+    Devuelve (distancias_km, precios).
+    """
+    distances_km = get_route_geometry(route).distances_km(pickups, dropoffs)
+    return distances_km, distances_km * float(route.price_per_km)
@@ -0,0 +1,351 @@
+"""
+Importación masiva de rutas (`POST /routes/bulk` y `python -m app.cli.import_routes`).
+
+Formatos de entrada, leídos en streaming (nunca se carga el documento completo):
+- NDJSON: una ruta por línea, con los campos de `POST /routes/` o como Feature GeoJSON.
+- GeoJSON FeatureCollection: `geometry` es el path y `properties` el resto de campos.
+El `id` del Feature (o un campo `ref`) se devuelve en el reporte para identificar la fila.
+
+Cada fila se valida con `schemas.RouteCreate` al llegar. Las válidas se acumulan en
+lotes de BULK_IMPORT_CHUNK_SIZE y cada lote se escribe en su propia transacción con
+INSERT multi-fila (rutas, paradas y ocurrencias de las recurrentes). Los vehículos del
+conductor y el precio por defecto se resuelven una vez por importación, y la ciudad de
+origen y destino de todo un lote en una sola consulta al geocodificador.
+
+El resultado es un reporte por fila: una fila inválida no impide crear las demás. Si
+un lote falla al escribirse se reintenta fila por fila para aislar la que falla.
+"""
+import asyncio
+import codecs
+import json
+import logging
+import uuid
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+from shapely.errors import ShapelyError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.schemas import schemas
+from app.services import recurrence
+from app.services.geolocation import get_locations_details
+from app.services.journeys import transfer_graph
+from app.services.pagination import naive_utc
+from app.services.route_index import route_index
+from app.services.search_cache import search_cache
+from app.services.simplification import path_levels
+from app.services.stops import route_stop_points, stop_rows
+from app.services.system_config import DEFAULT_PRICE_PER_KM, config_registry
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "geojson")
+
+# Filas de route_stops por INSERT multi-fila
+STOP_INSERT_BATCH_SIZE = 5000
+
+# (número de fila, objeto JSON o None, error de lectura o None)
+Record = Tuple[int, Any, Optional[str]]
+
+
+# --- Lectura en streaming ---
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """Un registro por línea no vacía; el número de fila es el de la línea."""
+    buffer, line_number = b"", 0
+
+    def parse(line: bytes):
+        try:
+            return line_number, json.loads(line), None
+        except ValueError as exc:
+            return line_number, None, f"Invalid JSON: {exc}"
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield parse(line)
+    if buffer.strip():
+        line_number += 1
+        yield parse(buffer)
+
+
+class _NeedMore(Exception):
+    pass
+
+
+_WHITESPACE = " \t\r\n"
+
+
+async def iter_feature_collection(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    Los Features de un FeatureCollection, uno a uno, a medida que llegan los bytes.
+    Las demás claves del documento se leen y se descartan. Un documento mal formado
+    termina la lectura con un registro de error (no se puede seguir después de él).
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = chunks.__aiter__()
+    buf, pos, final = "", 0, False
+    state, row = "start", 0
+
+    def skip_ws(at: int) -> int:
+        while at < len(buf) and buf[at] in _WHITESPACE:
+            at += 1
+        if at >= len(buf):
+            raise _NeedMore
+        return at
+
+    def expect(at: int, chars: str) -> Tuple[str, int]:
+        at = skip_ws(at)
+        if buf[at] not in chars:
+            raise ValueError(f"Expected one of {chars!r} at character {at}")
+        return buf[at], at + 1
+
+    def value(at: int) -> Tuple[Any, int]:
+        at = skip_ws(at)
+        try:
+            parsed, end = decoder.raw_decode(buf, at)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            raise _NeedMore
+        # Un número al final del buffer puede seguir en el próximo bloque
+        if end == len(buf) and not final:
+            raise _NeedMore
+        return parsed, end
+
+    while state != "done":
+        try:
+            if state == "start":
+                _, pos = expect(pos, "{")
+                state = "key"
+            elif state == "key":
+                at = skip_ws(pos)
+                if buf[at] == "}":
+                    pos, state = at + 1, "done"
+                    continue
+                key, at = value(at)
+                _, at = expect(at, ":")
+                if key == "features":
+                    _, at = expect(at, "[")
+                    state = "first_feature"
+                else:
+                    state = "skip_value"
+                pos = at
+            elif state == "skip_value":
+                _, pos = value(pos)
+                state = "after_value"
+            elif state == "after_value":
+                char, pos = expect(pos, ",}")
+                state = "key" if char == "," else "done"
+            elif state == "first_feature":
+                at = skip_ws(pos)
+                if buf[at] == "]":
+                    pos, state = at + 1, "after_value"
+                else:
+                    state = "feature"
+            elif state == "feature":
+                feature, pos = value(pos)
+                row += 1
+                state = "after_feature"
+                yield row, feature, None
+            elif state == "after_feature":
+                char, pos = expect(pos, ",]")
+                state = "feature" if char == "," else "after_value"
+        except _NeedMore:
+            if final:
+                yield row + 1, None, "Unexpected end of GeoJSON document"
+                return
+            # Descartar lo ya leído antes de agregar el siguiente bloque
+            buf, pos = buf[pos:], 0
+            try:
+                buf += text.decode(await chunks.__anext__())
+            except StopAsyncIteration:
+                buf += text.decode(b"", final=True)
+                final = True
+        except (ValueError, json.JSONDecodeError) as exc:
+            yield row + 1, None, f"Invalid GeoJSON: {exc}"
+            return
+
+
+def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Record]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    return iter_ndjson(chunks) if fmt == "ndjson" else iter_feature_collection(chunks)
+
+
+def route_payload(obj: Any) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Los campos de `RouteCreate` de un registro (objeto plano o Feature) y su referencia."""
+    if not isinstance(obj, dict):
+        raise ValueError("Expected a JSON object")
+    if obj.get("type") == "Feature":
+        properties = dict(obj.get("properties") or {})
+        ref = obj.get("id", properties.get("ref"))
+        return {**properties, "path": obj.get("geometry")}, None if ref is None else str(ref)
+    ref = obj.get("ref")
+    return obj, None if ref is None else str(ref)
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+
+
+class ImportReport:
+    def __init__(self):
+        self.received = 0
+        self.created = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def fail(self, row: int, ref: Optional[str], detail: str) -> None:
+        self.errors.append({"row": row, "ref": ref, "detail": detail})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"received": self.received, "created": self.created, "failed": len(self.errors), "errors": self.errors}
+
+
+class RouteImporter:
+    """Importa las rutas de un conductor. Usa la sesión `db` con un commit por lote."""
+
+    def __init__(self, db: AsyncSession, driver_id, chunk_size: Optional[int] = None):
+        self.db = db
+        self.driver_id = driver_id
+        self.chunk_size = chunk_size or settings.BULK_IMPORT_CHUNK_SIZE
+        self.report = ImportReport()
+        self.vehicle_ids: set = set()
+        self.default_price: Optional[float] = None
+
+    async def _resolve(self) -> None:
+        # Una sola vez por importación: vehículos del conductor y precio por defecto
+        self.vehicle_ids = set(await self.db.scalars(
+            select(models.Vehicle.id).where(models.Vehicle.owner_id == self.driver_id)
+        ))
+        await config_registry.ensure_loaded(self.db)
+        self.default_price = config_registry.get(DEFAULT_PRICE_PER_KM, None)
+
+    def prepare(self, row: int, obj: Any) -> Optional[SimpleNamespace]:
+        """Valida un registro y calcula lo que no depende de la BD. None (y error en el reporte) si no es válido."""
+        ref = None
+        try:
+            data, ref = route_payload(obj)
+            route = schemas.RouteCreate.model_validate(data)
+            if len(route.path.coordinates) < 2 or any(len(c) < 2 for c in route.path.coordinates):
+                raise ValueError("path must have at least two [lon, lat] positions")
+            # Un solo arreglo para el path simplificado y las paradas
+            coords = np.asarray([c[:2] for c in route.path.coordinates], dtype=np.float64)
+            if route.vehicle_id not in self.vehicle_ids:
+                raise ValueError("Vehicle not found or does not belong to the current user")
+            price_per_km = route.price_per_km if route.price_per_km is not None else self.default_price
+            if price_per_km is None:
+                raise ValueError("Default price per km is not configured")
+            locations = [stop.location.coordinates for stop in sorted(route.stops or [], key=lambda stop: stop.order)]
+            stops = route_stop_points(coords, locations, route.stop_interval_meters)
+            values = {
+                "id": uuid.uuid4(),
+                "driver_id": self.driver_id,
+                "vehicle_id": route.vehicle_id,
+                "departure_time": naive_utc(route.departure_time),
+                "estimated_arrival_time": naive_utc(route.estimated_arrival_time),
+                "available_seats": route.available_seats,
+                "price_per_km": price_per_km,
+                **path_levels(coords),
+                "is_recurrent": route.recurrence is not None,
+                "recurrence_pattern": route.recurrence.model_dump(mode="json") if route.recurrence else None,
+                "materialized_until": None,
+                "status": models.RouteStatus.active,
+            }
+        except ValidationError as exc:
+            self.report.fail(row, ref, _validation_detail(exc))
+            return None
+        except (TypeError, ValueError, ShapelyError) as exc:
+            self.report.fail(row, ref, str(exc))
+            return None
+        return SimpleNamespace(row=row, ref=ref, values=values, coords=coords, stops=stops)
+
+    async def _write(self, items: List[SimpleNamespace]) -> None:
+        """Un lote en una transacción. Si falla, se reintenta fila por fila."""
+        until = recurrence.window_end()
+        routes, stops, occurrences = [], [], []
+        for item in items:
+            values = dict(item.values)
+            if values["is_recurrent"]:
+                occurrences.extend(recurrence.occurrence_rows(SimpleNamespace(**values), until))
+                values["materialized_until"] = until
+            routes.append(values)
+            stops.extend(stop_rows(values["id"], item.stops))
+        try:
+            await self.db.execute(insert(models.Route), routes)
+            for i in range(0, len(stops), STOP_INSERT_BATCH_SIZE):
+                await self.db.execute(insert(models.RouteStop), stops[i:i + STOP_INSERT_BATCH_SIZE])
+            inserted = await recurrence.insert_occurrences(self.db, occurrences)
+            await self.db.commit()
+        except SQLAlchemyError as exc:
+            await self.db.rollback()
+            if len(items) == 1:
+                self.report.fail(items[0].row, items[0].ref, f"Database error: {exc.__class__.__name__}")
+                logger.warning("Bulk import row %d failed", items[0].row, exc_info=True)
+                return
+            for item in items:
+                await self._write([item])
+            return
+        self.report.created += len(items)
+        if settings.ROUTE_INDEX_ENABLED:
+            for item in items:
+                values = item.values
+                route_index.upsert(values["id"], item.coords.tolist(), values["available_seats"], True,
+                                   values["departure_time"], values["is_recurrent"])
+            recurrence.index_occurrences(inserted)
+        elif settings.SEARCH_CACHE_ENABLED:
+            departures: Dict[Any, list] = {}
+            for row in inserted:
+                departures.setdefault(row.route_id, []).append(row.departure_time)
+            for item in items:
+                values = item.values
+                search_cache.route_added(item.coords, departures.get(values["id"]) or [values["departure_time"]])
+        if settings.JOURNEY_PLANNER_ENABLED:
+            await asyncio.to_thread(lambda: [
+                transfer_graph.add(item.values["id"], item.coords, item.values["departure_time"],
+                                   item.values["estimated_arrival_time"], item.values["is_recurrent"])
+                for item in items
+            ])
+
+    async def _flush(self, items: List[SimpleNamespace]) -> None:
+        # Ciudad y país de origen y destino de todo el lote en una consulta
+        points = [point for item in items for point in (item.coords[0], item.coords[-1])]
+        locations = await get_locations_details(points)
+        for item, start, end in zip(items, locations[::2], locations[1::2]):
+            item.values.update(start_city=start["city"], start_country=start["country"],
+                               end_city=end["city"], end_country=end["country"])
+        await self._write(items)
+
+    async def run(self, records: AsyncIterator[Record]) -> Dict[str, Any]:
+        await self._resolve()
+        pending: List[SimpleNamespace] = []
+        async for row, obj, error in records:
+            self.report.received += 1
+            if error is not None:
+                self.report.fail(row, None, error)
+                continue
+            item = self.prepare(row, obj)
+            if item is not None:
+                pending.append(item)
+            if len(pending) >= self.chunk_size:
+                await self._flush(pending)
+                pending = []
+        if pending:
+            await self._flush(pending)
+        return self.report.as_dict()
+
+
+async def import_routes(db: AsyncSession, driver_id, chunks: AsyncIterator[bytes], fmt: str,
+                        chunk_size: Optional[int] = None) -> Dict[str, Any]:
+    """Importa las rutas de `chunks` (bytes en formato `fmt`) para el conductor. Devuelve el reporte."""
+    return await RouteImporter(db, driver_id, chunk_size).run(iter_records(chunks, fmt))
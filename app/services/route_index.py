@@ -0,0 +1,387 @@
+"""
+Índice espacial en memoria para la búsqueda de rutas.
+
+Mantiene una rejilla (grid) regular en grados sobre los segmentos de las rutas
+activas. Cada celda guarda, por ruta, los índices de los segmentos cuyo
+bounding box la toca. Una consulta de proximidad sólo revisa las celdas que
+cubren el radio de búsqueda y luego calcula la distancia exacta en metros
+punto-segmento, así que no es necesario ir a PostGIS para filtrar.
+
+El índice vive en el proceso: se llena al arrancar la aplicación y se
+actualiza desde los endpoints que crean rutas o cambian sus asientos/estado.
+Con varios workers, cada uno tiene su propia copia.
+
+Las rutas recurrentes se indexan una sola vez (su geometría) y guardan sus
+ocurrencias ordenadas por salida; la búsqueda devuelve los ids de las
+ocurrencias que caen en la ventana pedida, no el de la ruta.
+"""
+import bisect
+import math
+from array import array
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from shapely import wkb
+
+from app.config import settings
+from app.services.pagination import as_utc
+
+# Radio medio de la Tierra en metros
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+Coordinate = Tuple[float, float]  # (lon, lat)
+Cell = Tuple[int, int]
+
+
+class IndexedRoute:
+    __slots__ = ("id", "coords", "available_seats", "is_active", "departure_time", "is_recurrent", "occurrences")
+
+    def __init__(self, route_id, coords: array, available_seats: int, is_active: bool, departure_time: Optional[datetime],
+                 is_recurrent: bool = False):
+        self.id = route_id
+        self.coords = coords  # [lon0, lat0, lon1, lat1, ...] para ahorrar memoria
+        self.available_seats = available_seats
+        self.is_active = is_active
+        self.departure_time = departure_time
+        self.is_recurrent = is_recurrent
+        # Sólo rutas recurrentes: [(salida UTC, id de la ocurrencia)] ordenada
+        self.occurrences: List[Tuple[datetime, object]] = []
+
+    @property
+    def is_searchable(self) -> bool:
+        return self.is_active and self.available_seats > 0
+
+
+class IndexedOccurrence:
+    __slots__ = ("id", "route_id", "available_seats", "is_active", "departure_time")
+
+    def __init__(self, occurrence_id, route_id, available_seats: int, is_active: bool, departure_time: datetime):
+        self.id = occurrence_id
+        self.route_id = route_id
+        self.available_seats = available_seats
+        self.is_active = is_active
+        self.departure_time = departure_time
+
+    @property
+    def is_searchable(self) -> bool:
+        return self.is_active and self.available_seats > 0
+
+
+def path_coordinates(path) -> List[Coordinate]:
+    """Extrae las coordenadas (lon, lat) de un WKBElement de GeoAlchemy2."""
+    return [(float(x), float(y)) for x, y in wkb.loads(bytes(path.data)).coords]
+
+
+def point_segment_distance_m(lon: float, lat: float, ax: float, ay: float, bx: float, by: float) -> float:
+    """
+    Distancia en metros entre un punto y el segmento (a, b), usando una
+    proyección equirectangular local centrada en el punto (suficiente para
+    radios de búsqueda de unos pocos kilómetros).
+    """
+    kx = math.cos(math.radians(lat)) * METERS_PER_DEGREE
+    ky = METERS_PER_DEGREE
+    ax, ay = (ax - lon) * kx, (ay - lat) * ky
+    bx, by = (bx - lon) * kx, (by - lat) * ky
+    dx, dy = bx - ax, by - ay
+    seg_len_sq = dx * dx + dy * dy
+    if seg_len_sq == 0.0:
+        return math.hypot(ax, ay)
+    t = max(0.0, min(1.0, -(ax * dx + ay * dy) / seg_len_sq))
+    return math.hypot(ax + t * dx, ay + t * dy)
+
+
+def locate_on_path(coords: Sequence[float], lon: float, lat: float) -> Tuple[float, float, float, float]:
+    """
+    Proyecta el punto sobre el trazado plano [lon0, lat0, lon1, lat1, ...].
+    Devuelve (fracción, distancia_m, lon_proyectado, lat_proyectado), donde la
+    fracción es la posición relativa a lo largo de la ruta, como ST_LineLocatePoint.
+    """
+    kx = math.cos(math.radians(lat)) * METERS_PER_DEGREE
+    ky = METERS_PER_DEGREE
+    best = (math.inf, 0, 0.0)  # (distancia, segmento, t)
+    lengths = []
+    for i in range(len(coords) // 2 - 1):
+        ax, ay, bx, by = coords[2 * i:2 * i + 4]
+        ax, ay = (ax - lon) * kx, (ay - lat) * ky
+        bx, by = (bx - lon) * kx, (by - lat) * ky
+        dx, dy = bx - ax, by - ay
+        seg_len_sq = dx * dx + dy * dy
+        lengths.append(math.sqrt(seg_len_sq))
+        t = 0.0 if seg_len_sq == 0.0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg_len_sq))
+        d = math.hypot(ax + t * dx, ay + t * dy)
+        if d < best[0]:
+            best = (d, i, t)
+
+    distance, i, t = best
+    total = sum(lengths)
+    fraction = (sum(lengths[:i]) + t * lengths[i]) / total if total > 0 else 0.0
+    ax, ay, bx, by = coords[2 * i:2 * i + 4]
+    return fraction, distance, ax + t * (bx - ax), ay + t * (by - ay)
+
+
+class RouteIndex:
+    """Rejilla de segmentos de rutas, segura para uso desde varios hilos."""
+
+    def __init__(self, cell_degrees: float = 0.005):
+        self.cell_degrees = cell_degrees
+        self._routes: Dict[object, IndexedRoute] = {}
+        self._occurrences: Dict[object, IndexedOccurrence] = {}
+        self._cells: Dict[Cell, Dict[object, List[int]]] = {}
+        self._route_cells: Dict[object, List[Cell]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, route_id) -> bool:
+        return route_id in self._routes
+
+    def _cell(self, lon: float, lat: float) -> Cell:
+        return (math.floor(lon / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def _cells_in_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> Iterable[Cell]:
+        x0, y0 = self._cell(min_lon, min_lat)
+        x1, y1 = self._cell(max_lon, max_lat)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield (x, y)
+
+    # --- Mantenimiento ---
+
+    def upsert(self, route_id, coords: Sequence[Coordinate], available_seats: int, is_active: bool, departure_time: Optional[datetime] = None,
+               is_recurrent: bool = False):
+        """Inserta o reemplaza una ruta en el índice (conserva sus ocurrencias)."""
+        flat = array("d")
+        for lon, lat in coords:
+            flat.append(lon)
+            flat.append(lat)
+        with self._lock:
+            self._remove_cells(route_id)
+            previous = self._routes.get(route_id)
+            entry = self._routes[route_id] = IndexedRoute(route_id, flat, available_seats, is_active, departure_time, is_recurrent)
+            if previous is not None:
+                entry.occurrences = previous.occurrences
+            touched = []
+            for i in range(len(flat) // 2 - 1):
+                ax, ay, bx, by = flat[2 * i:2 * i + 4]
+                for cell in self._cells_in_bbox(min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)):
+                    bucket = self._cells.setdefault(cell, {})
+                    segments = bucket.get(route_id)
+                    if segments is None:
+                        bucket[route_id] = segments = []
+                        touched.append(cell)
+                    segments.append(i)
+            self._route_cells[route_id] = touched
+
+    def upsert_route(self, route):
+        """Inserta o reemplaza una instancia de `models.Route`."""
+        self.upsert(
+            route.id,
+            path_coordinates(route.path),
+            route.available_seats,
+            _is_active(route.status),
+            route.departure_time,
+            bool(route.is_recurrent),
+        )
+
+    def upsert_occurrence(self, occurrence_id, route_id, departure_time: datetime, available_seats: int, status) -> None:
+        """Agrega una ocurrencia de una ruta recurrente ya indexada (si la ruta no está, se ignora)."""
+        with self._lock:
+            route = self._routes.get(route_id)
+            if route is None:
+                return
+            if occurrence_id not in self._occurrences:
+                bisect.insort(route.occurrences, (as_utc(departure_time), occurrence_id))
+            self._occurrences[occurrence_id] = IndexedOccurrence(
+                occurrence_id, route_id, available_seats, _is_active(status), departure_time
+            )
+
+    def update_availability(self, trip_id, available_seats: int, status) -> None:
+        """Actualiza asientos/estado de una ruta u ocurrencia sin reindexar la geometría."""
+        with self._lock:
+            entry = self._routes.get(trip_id) or self._occurrences.get(trip_id)
+            if entry is not None:
+                entry.available_seats = available_seats
+                entry.is_active = _is_active(status)
+
+    def remove(self, route_id) -> None:
+        with self._lock:
+            self._remove_cells(route_id)
+            entry = self._routes.pop(route_id, None)
+            for _, occurrence_id in entry.occurrences if entry is not None else ():
+                self._occurrences.pop(occurrence_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._occurrences.clear()
+            self._cells.clear()
+            self._route_cells.clear()
+
+    def _remove_cells(self, route_id) -> None:
+        for cell in self._route_cells.pop(route_id, ()):
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                continue
+            bucket.pop(route_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    # --- Consultas ---
+
+    def _buckets(self, lon: float, lat: float, buffer_meters: float) -> List[Dict[object, List[int]]]:
+        """Celdas no vacías que cubren el radio alrededor del punto."""
+        dlat = buffer_meters / METERS_PER_DEGREE
+        dlon = buffer_meters / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        cells = self._cells_in_bbox(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        return [bucket for bucket in map(self._cells.get, cells) if bucket]
+
+    @staticmethod
+    def _segments(buckets: List[Dict[object, List[int]]], route_id) -> Set[int]:
+        segments: Set[int] = set()
+        for bucket in buckets:
+            segments.update(bucket.get(route_id, ()))
+        return segments
+
+    def _distance(self, route_id, segments: Iterable[int], lon: float, lat: float) -> float:
+        coords = self._routes[route_id].coords
+        return min(point_segment_distance_m(lon, lat, *coords[2 * i:2 * i + 4]) for i in segments)
+
+    def near(self, lon: float, lat: float, buffer_meters: float) -> Dict[object, float]:
+        """
+        Devuelve {route_id: distancia_m} de las rutas buscables cuyo trazado
+        pasa a menos de `buffer_meters` metros del punto.
+        """
+        found: Dict[object, float] = {}
+        with self._lock:
+            buckets = self._buckets(lon, lat, buffer_meters)
+            for route_id in set().union(*buckets):
+                if not self._routes[route_id].is_searchable:
+                    continue
+                distance = self._distance(route_id, self._segments(buckets, route_id), lon, lat)
+                if distance <= buffer_meters:
+                    found[route_id] = distance
+        return found
+
+    def search(
+        self,
+        from_lon: float,
+        from_lat: float,
+        to_lon: float,
+        to_lat: float,
+        buffer_meters: float,
+        departure_after: Optional[datetime] = None,
+        departure_before: Optional[datetime] = None,
+    ) -> List[object]:
+        """
+        Ids de rutas que pasan cerca del origen y luego cerca del destino (en ese
+        orden) y salen dentro de la ventana [departure_after, departure_before).
+        Primero se cruzan los ids candidatos de ambas zonas de la rejilla y sólo
+        a esos se les calcula la distancia exacta.
+        De las rutas recurrentes se devuelven los ids de sus ocurrencias en la ventana.
+        """
+        if departure_after is not None:
+            departure_after = as_utc(departure_after)
+        if departure_before is not None:
+            departure_before = as_utc(departure_before)
+        with self._lock:
+            origin_buckets = self._buckets(from_lon, from_lat, buffer_meters)
+            if not origin_buckets:
+                return []
+            destination_buckets = self._buckets(to_lon, to_lat, buffer_meters)
+            common = set().union(*origin_buckets) & set().union(*destination_buckets)
+            found = []
+            for route_id in common:
+                entry = self._routes[route_id]
+                if not entry.is_searchable:
+                    continue
+                if entry.is_recurrent:
+                    occurrences = self._occurrences_in_window(entry, departure_after, departure_before)
+                    if occurrences and self._passes_in_order(route_id, origin_buckets, destination_buckets,
+                                                             from_lon, from_lat, to_lon, to_lat, buffer_meters):
+                        found.extend(occurrences)
+                    continue
+                if departure_after is not None or departure_before is not None:
+                    departure = as_utc(entry.departure_time)
+                    if departure_after is not None and departure < departure_after:
+                        continue
+                    if departure_before is not None and departure >= departure_before:
+                        continue
+                if self._passes_in_order(route_id, origin_buckets, destination_buckets,
+                                         from_lon, from_lat, to_lon, to_lat, buffer_meters):
+                    found.append(route_id)
+            return found
+
+    def _passes_in_order(self, route_id, origin_buckets, destination_buckets,
+                         from_lon, from_lat, to_lon, to_lat, buffer_meters) -> bool:
+        return (self._distance(route_id, self._segments(origin_buckets, route_id), from_lon, from_lat) <= buffer_meters
+                and self._distance(route_id, self._segments(destination_buckets, route_id), to_lon, to_lat) <= buffer_meters
+                # La ruta debe recoger antes de dejar: pasar primero por el origen
+                and self.locate(route_id, from_lon, from_lat)[0] < self.locate(route_id, to_lon, to_lat)[0])
+
+    def _occurrences_in_window(self, entry: IndexedRoute, departure_after, departure_before) -> List[object]:
+        """Ocurrencias buscables de la ruta en la ventana; la lista ordenada se corta por bisección."""
+        start = 0 if departure_after is None else bisect.bisect_left(entry.occurrences, (departure_after,))
+        found = []
+        for departure, occurrence_id in entry.occurrences[start:]:
+            if departure_before is not None and departure >= departure_before:
+                break
+            if self._occurrences[occurrence_id].is_searchable:
+                found.append(occurrence_id)
+        return found
+
+    def locate(self, trip_id, lon: float, lat: float) -> Tuple[float, float, float, float]:
+        """`locate_on_path` sobre una ruta indexada (o sobre la ruta de una ocurrencia)."""
+        entry = self._routes.get(trip_id)
+        if entry is None:
+            entry = self._routes[self._occurrences[trip_id].route_id]
+        return locate_on_path(entry.coords, lon, lat)
+
+    def get(self, trip_id) -> Optional[Union[IndexedRoute, IndexedOccurrence]]:
+        return self._routes.get(trip_id) or self._occurrences.get(trip_id)
+
+
+def _is_active(status) -> bool:
+    # Se compara por valor para no importar los modelos (y la BD) desde aquí
+    return getattr(status, "value", status) == "active"
+
+
+route_index = RouteIndex(cell_degrees=settings.ROUTE_INDEX_CELL_DEGREES)
+
+
+def load_route_index(db, index: RouteIndex = route_index) -> int:
+    """
+    Llena el índice con las rutas activas o llenas y sus ocurrencias. Devuelve cuántas rutas
+    se cargaron. Las llenas se indexan como no buscables: al liberar un asiento vuelven a
+    `active` y `update_availability` sólo actualiza los viajes que ya están en el índice.
+    """
+    from app.models import models
+
+    # Las canceladas y completadas no vuelven a estar disponibles; las llenas sí
+    statuses = (models.RouteStatus.active, models.RouteStatus.full)
+    rows = db.query(
+        models.Route.id,
+        models.Route.path,
+        models.Route.available_seats,
+        models.Route.status,
+        models.Route.departure_time,
+        models.Route.is_recurrent,
+    ).filter(models.Route.status.in_(statuses)).yield_per(1000)
+
+    index.clear()
+    for row in rows:
+        index.upsert(row.id, path_coordinates(row.path), row.available_seats, _is_active(row.status),
+                     row.departure_time, bool(row.is_recurrent))
+
+    occurrences = db.query(
+        models.RouteOccurrence.id,
+        models.RouteOccurrence.route_id,
+        models.RouteOccurrence.departure_time,
+        models.RouteOccurrence.available_seats,
+        models.RouteOccurrence.status,
+    ).filter(models.RouteOccurrence.status.in_(statuses)).yield_per(1000)
+    for row in occurrences:
+        index.upsert_occurrence(row.id, row.route_id, row.departure_time, row.available_seats, row.status)
+    return len(index)
@@ -0,0 +1,271 @@
+"""
+Caché de `/routes/search` por corredor, para el camino PostGIS (sin ROUTE_INDEX_ENABLED).
+
+Casi todas las búsquedas se repiten entre los mismos pares de barrios, así que la
+consulta espacial se resuelve una vez por corredor:
+
+- Clave: celdas geohash (SEARCH_CACHE_GEOHASH_PRECISION) del origen y del destino,
+  el radio y el tramo de tiempo (SEARCH_CACHE_TIME_BUCKET_SECONDS) de
+  `departure_after`/`departure_before`. La celda sólo es la clave: la consulta se hace
+  desde el centro de cada celda con el radio ampliado en su media diagonal
+  (`corridor_meters`, ~108 m con precisión 7), así que el corredor incluye las rutas
+  de cualquier punto de la celda.
+- Valor: los viajes del corredor ordenados por (salida, id), hasta
+  SEARCH_CACHE_MAX_RESULTS, con la ventana ampliada al tramo completo. La ventana
+  exacta, el keyset y el límite se aplican en memoria; a la BD sólo se le piden las
+  filas de la página y, para sus rutas, la distancia exacta (en metros) a los puntos
+  del pasajero: el resultado es el mismo que sin caché.
+
+Invalidación precisa, con un índice inverso ruta -> corredores en los que aparece:
+- Cuando un viaje cacheado deja de ser reservable (se llena, se cancela) o vuelve a
+  serlo, se descartan sólo los corredores de su ruta. Por eso se guardan también los
+  viajes llenos del corredor, marcados como no reservables.
+- Cuando se crea una ruta, se descartan los corredores cuyos dos centros quedan a
+  menos del radio ampliado de su trazado, en orden, y con alguna salida dentro de su ventana.
+
+El estado es por proceso: los cambios confirmados en otro worker sólo se ven al vencer
+la entrada (SEARCH_CACHE_TTL_SECONDS). Si al cargar la página un viaje cacheado ya no
+es reservable, se descarta, se invalida el corredor y se cuenta en `stale_served`.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.config import settings
+from app.services import metrics
+from app.services.geolocation import geohash, geohash_center
+from app.services.pagination import as_utc
+from app.services.route_index import METERS_PER_DEGREE, locate_on_path
+
+# (celda origen, celda destino, radio, tramo de departure_after, tramo de departure_before)
+CorridorKey = Tuple[str, str, int, Optional[int], Optional[int]]
+# (salida en UTC, trip_id, route_id, reservable)
+CachedTrip = Tuple[datetime, object, object, bool]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def cell_radius_meters(precision: int) -> float:
+    """Media diagonal de una celda geohash, por exceso (la del ecuador, donde es máxima)."""
+    bits = 5 * precision
+    lon_degrees = 360.0 / 2 ** math.ceil(bits / 2)
+    lat_degrees = 180.0 / 2 ** (bits // 2)
+    return math.hypot(lon_degrees, lat_degrees) * METERS_PER_DEGREE / 2 * 1.01
+
+
+def is_bookable(available_seats: int, status) -> bool:
+    return available_seats > 0 and getattr(status, "value", status) == "active"
+
+
+class CorridorEntry:
+    __slots__ = ("points", "trips", "positions", "complete", "expires_at")
+
+    def __init__(self, points: Tuple[float, float, float, float], trips: List[CachedTrip], complete: bool, expires_at: float):
+        # Centros de las celdas (from_lon, from_lat, to_lon, to_lat), para `route_added`
+        self.points = points
+        self.trips = trips
+        self.positions = {trip[1]: i for i, trip in enumerate(trips)}
+        # False si el corredor tiene más de SEARCH_CACHE_MAX_RESULTS viajes: se consulta directo
+        self.complete = complete
+        self.expires_at = expires_at
+
+
+class SearchCache:
+    def __init__(self, maxsize: int, ttl: float, precision: int, bucket_seconds: int, max_results: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = precision
+        self.bucket_seconds = bucket_seconds
+        self.max_results = max_results
+        self.cell_radius = cell_radius_meters(precision)
+        self._clock = clock
+        self._entries: "OrderedDict[CorridorKey, CorridorEntry]" = OrderedDict()
+        self._by_route: Dict[object, Set[CorridorKey]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_served = 0
+        # Sube con cada ruta nueva: un corredor consultado antes no se guarda (podría no incluirla)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # --- Claves ---
+
+    def _bucket(self, value: Optional[datetime], round_up: bool) -> Optional[int]:
+        if value is None:
+            return None
+        seconds = (as_utc(value) - _EPOCH).total_seconds() / self.bucket_seconds
+        return math.ceil(seconds) if round_up else math.floor(seconds)
+
+    def key(self, from_lon: float, from_lat: float, to_lon: float, to_lat: float, buffer_meters: int,
+            departure_after: Optional[datetime] = None, departure_before: Optional[datetime] = None) -> CorridorKey:
+        return (
+            geohash(from_lat, from_lon, self.precision),
+            geohash(to_lat, to_lon, self.precision),
+            buffer_meters,
+            self._bucket(departure_after, round_up=False),
+            self._bucket(departure_before, round_up=True),
+        )
+
+    @staticmethod
+    def points(key: CorridorKey) -> Tuple[float, float, float, float]:
+        """(from_lon, from_lat, to_lon, to_lat) de los centros de las celdas del corredor."""
+        from_lat, from_lon = geohash_center(key[0])
+        to_lat, to_lon = geohash_center(key[1])
+        return from_lon, from_lat, to_lon, to_lat
+
+    def corridor_meters(self, key: CorridorKey) -> float:
+        """Radio de la consulta del corredor desde los centros: cubre cualquier punto de las celdas."""
+        return key[2] + self.cell_radius
+
+    def window(self, key: CorridorKey) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """La ventana de salida del corredor: la pedida, ampliada a tramos completos."""
+        return tuple(
+            None if bucket is None else _EPOCH + timedelta(seconds=bucket * self.bucket_seconds)
+            for bucket in key[3:]
+        )
+
+    # --- Lectura y escritura ---
+
+    def get(self, key: CorridorKey) -> Optional[CorridorEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def set(self, key: CorridorKey, trips: Sequence[CachedTrip], generation: Optional[int] = None) -> CorridorEntry:
+        """
+        Guarda los viajes del corredor (ordenados); si hay más de `max_results`, sólo la marca
+        de incompleto. `generation` es la de antes de la consulta: si desde entonces se creó
+        una ruta, la entrada se devuelve pero no se guarda.
+        """
+        complete = len(trips) <= self.max_results
+        entry = CorridorEntry(self.points(key), list(trips) if complete else [], complete, self._clock() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._drop(key)
+            self._entries[key] = entry
+            for route_id in {trip[2] for trip in entry.trips}:
+                self._by_route.setdefault(route_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+        return entry
+
+    def _drop(self, key: CorridorKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for route_id in {trip[2] for trip in entry.trips}:
+            keys = self._by_route.get(route_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_route[route_id]
+
+    def invalidate(self, key: CorridorKey) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_route.clear()
+
+    # --- Invalidación ---
+
+    def update_availability(self, route_id, trip_id, available_seats: int, status) -> int:
+        """Descarta los corredores de la ruta en los que el viaje cambió de reservable a no (o al revés)."""
+        bookable = is_bookable(available_seats, status)
+        with self._lock:
+            changed = []
+            for key in self._by_route.get(route_id, ()):
+                entry = self._entries[key]
+                position = entry.positions.get(trip_id)
+                if position is not None and entry.trips[position][3] != bookable:
+                    changed.append(key)
+            for key in changed:
+                self._drop(key)
+            self.invalidations += len(changed)
+        return len(changed)
+
+    def invalidate_routes(self, route_ids: Iterable) -> int:
+        """Descarta todos los corredores en los que aparecen las rutas (p. ej. con ocurrencias nuevas)."""
+        with self._lock:
+            keys = {key for route_id in route_ids for key in self._by_route.get(route_id, ())}
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def mark_stale(self, key: CorridorKey) -> None:
+        """Un viaje del corredor resultó no reservable al servirlo: el cambio no llegó por `update_availability`."""
+        self.stale_served += 1
+        self.invalidate(key)
+
+    def route_added(self, coords: Sequence[Sequence[float]], departure_times: Iterable[datetime]) -> int:
+        """Descarta los corredores por los que pasa una ruta nueva (en orden y dentro de su ventana)."""
+        flat = [float(value) for point in coords for value in point[:2]]
+        if len(flat) < 4:
+            return 0
+        departures = [as_utc(departure) for departure in departure_times]
+        lons, lats = flat[0::2], flat[1::2]
+        min_lon, max_lon, min_lat, max_lat = min(lons), max(lons), min(lats), max(lats)
+        # Margen en grados de longitud por metro, con la latitud más alejada del ecuador del trazado
+        lon_scale = 1 / max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 1e-6)
+        with self._lock:
+            self.generation += 1
+            corridors = [(key, entry.points) for key, entry in self._entries.items()]
+        affected = []
+        for key, (from_lon, from_lat, to_lon, to_lat) in corridors:
+            # Filtro grueso: los dos centros dentro del bounding box del trazado, ampliado con el radio
+            radius = self.corridor_meters(key)
+            margin_lat = radius / METERS_PER_DEGREE
+            margin_lon = margin_lat * lon_scale
+            if not (min_lon - margin_lon <= from_lon <= max_lon + margin_lon and min_lat - margin_lat <= from_lat <= max_lat + margin_lat
+                    and min_lon - margin_lon <= to_lon <= max_lon + margin_lon and min_lat - margin_lat <= to_lat <= max_lat + margin_lat):
+                continue
+            after, before = self.window(key)
+            if not any((after is None or departure >= after) and (before is None or departure < before) for departure in departures):
+                continue
+            from_fraction, from_distance, _, _ = locate_on_path(flat, from_lon, from_lat)
+            if from_distance > radius:
+                continue
+            to_fraction, to_distance, _, _ = locate_on_path(flat, to_lon, to_lat)
+            if to_distance <= radius and from_fraction < to_fraction:
+                affected.append(key)
+        for key in affected:
+            self.invalidate(key)
+        return len(affected)
+
+
+search_cache = SearchCache(
+    settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_SECONDS, settings.SEARCH_CACHE_GEOHASH_PRECISION,
+    settings.SEARCH_CACHE_TIME_BUCKET_SECONDS, settings.SEARCH_CACHE_MAX_RESULTS,
+)
+metrics.register_gauge("search_cache_size", lambda: len(search_cache), "Corredores en la caché de búsqueda")
+metrics.register_counter("search_cache_hits_total", lambda: search_cache.hits, "Aciertos de la caché de búsqueda")
+metrics.register_counter("search_cache_misses_total", lambda: search_cache.misses, "Fallos de la caché de búsqueda")
+metrics.register_gauge("search_cache_hit_ratio", lambda: search_cache.hit_ratio, "Tasa de aciertos de la caché de búsqueda")
+metrics.register_counter("search_cache_invalidations_total", lambda: search_cache.invalidations, "Corredores descartados por cambios en sus rutas")
+metrics.register_counter("search_cache_stale_served_total", lambda: search_cache.stale_served, "Viajes cacheados que ya no eran reservables al servirlos")
@@ -0,0 +1,242 @@
+"""
+Canal en vivo de asientos (`WS /routes/live`), para que las apps de pasajeros no
+tengan que repetir `/routes/search` para saber si una ruta se llenó.
+
+El cliente se suscribe a ids de rutas u ocurrencias y recibe los cambios de
+`available_seats` y `status` confirmados en la BD (ver `_defer_seat_update` en
+app/services/seats.py: se publican en el `after_commit` de la sesión, así que un
+rollback no llega a los clientes).
+
+- Pub/sub en el proceso: `SeatFeed` guarda suscriptores por id y reparte.
+- Agrupación por tick: lo publicado se acumula por viaje y se reparte cada
+  SEAT_FEED_TICK_SECONDS; varios cambios de un mismo viaje en un tick llegan como uno.
+- Contrapresión por conexión: cada suscriptor acumula a lo sumo SEAT_FEED_MAX_PENDING
+  viajes sin enviar (también agrupados) y cada envío tiene SEAT_FEED_SEND_TIMEOUT_SECONDS;
+  un cliente que no da abasto se desconecta (código 1013) en lugar de acumular memoria.
+  Al reconectarse recibe de nuevo el estado actual.
+
+El estado es por proceso: con varios workers, un cliente sólo ve los cambios
+confirmados en el worker al que está conectado.
+
+Protocolo (JSON):
+    -> {"action": "subscribe", "ids": ["<uuid>", ...]}
+    -> {"action": "unsubscribe", "ids": ["<uuid>", ...]}
+    <- {"type": "subscribed", "ids": [...]}  seguido del estado actual de esos viajes
+    <- {"type": "unsubscribed", "ids": [...]}
+    <- {"type": "seats", "updates": [{"route_id", "occurrence_id", "available_seats", "status"}, ...]}
+    <- {"type": "error", "detail": "..."}
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Set
+
+from starlette.websockets import WebSocketDisconnect
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Código de cierre para clientes lentos: "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def seat_update(route_id, occurrence_id, available_seats: int, status) -> dict:
+    return {
+        "route_id": str(route_id),
+        "occurrence_id": None if occurrence_id is None else str(occurrence_id),
+        "available_seats": available_seats,
+        "status": getattr(status, "value", status),
+    }
+
+
+def _trip_id(update: dict) -> str:
+    return update["occurrence_id"] or update["route_id"]
+
+
+class Subscriber:
+    """Una conexión: sus ids, los cambios aún no enviados (uno por viaje) y los mensajes de control."""
+
+    __slots__ = ("ids", "pending", "control", "ready", "max_pending", "overflowed")
+
+    def __init__(self, max_pending: int):
+        self.ids: Set[str] = set()
+        self.pending: Dict[str, dict] = {}
+        self.control: List[dict] = []
+        self.ready = asyncio.Event()
+        self.max_pending = max_pending
+        self.overflowed = False
+
+    def offer(self, update: dict) -> None:
+        trip_id = _trip_id(update)
+        if trip_id not in self.pending and len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self.pending[trip_id] = update
+        self.ready.set()
+
+    def send_control(self, message: dict) -> None:
+        self.control.append(message)
+        self.ready.set()
+
+    def drain(self) -> List[dict]:
+        messages = self.control
+        self.control = []
+        if self.pending:
+            messages.append({"type": "seats", "updates": list(self.pending.values())})
+            self.pending = {}
+        return messages
+
+
+class SeatFeed:
+    def __init__(self, max_pending: int = 500):
+        self.max_pending = max_pending
+        self._topics: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._subscribers: Set[Subscriber] = set()
+        # Publicado desde el último tick, un cambio por viaje. Se publica desde los
+        # eventos de la sesión, que pueden correr en otro hilo: de ahí el lock.
+        self._tick: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.disconnected_slow = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def connect(self) -> Subscriber:
+        subscriber = Subscriber(self.max_pending)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber) -> None:
+        self.unsubscribe(subscriber, list(subscriber.ids))
+        self._subscribers.discard(subscriber)
+
+    def subscribe(self, subscriber: Subscriber, ids: Iterable[str]) -> None:
+        for trip_id in ids:
+            subscriber.ids.add(trip_id)
+            self._topics[trip_id].add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, ids: Iterable[str]) -> None:
+        for trip_id in ids:
+            subscriber.ids.discard(trip_id)
+            subscribers = self._topics.get(trip_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._topics[trip_id]
+
+    def publish(self, update: dict) -> None:
+        with self._lock:
+            self._tick[_trip_id(update)] = update
+            self.published += 1
+
+    def flush(self) -> int:
+        """Reparte lo publicado en el tick. Devuelve cuántos envíos se encolaron."""
+        with self._lock:
+            updates, self._tick = self._tick, {}
+        offered = 0
+        for update in updates.values():
+            # Una ocurrencia llega a quien siga la ocurrencia o su ruta
+            targets = self._topics.get(update["route_id"], set())
+            if update["occurrence_id"] is not None:
+                targets = targets | self._topics.get(update["occurrence_id"], set())
+            for subscriber in targets:
+                subscriber.offer(update)
+            offered += len(targets)
+        self.delivered += offered
+        return offered
+
+    async def run(self, tick_seconds: float):
+        """Tarea de fondo: reparte lo publicado cada `tick_seconds`."""
+        while True:
+            await asyncio.sleep(tick_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Seat feed flush failed")
+
+
+def parse_ids(value) -> List[str]:
+    if not isinstance(value, list):
+        raise ValueError("ids must be a list of UUIDs")
+    return [str(uuid.UUID(str(item))) for item in value]
+
+
+async def _read_messages(websocket, feed: SeatFeed, subscriber: Subscriber,
+                         snapshot: Callable[[List[str]], Awaitable[List[dict]]], max_ids: int) -> None:
+    while True:
+        try:
+            message = json.loads(await websocket.receive_text())
+            if not isinstance(message, dict):
+                raise ValueError("Expected a JSON object")
+            action = message.get("action")
+            ids = parse_ids(message.get("ids"))
+        except ValueError as exc:
+            subscriber.send_control({"type": "error", "detail": str(exc)})
+            continue
+        if action == "unsubscribe":
+            feed.unsubscribe(subscriber, ids)
+            subscriber.send_control({"type": "unsubscribed", "ids": ids})
+        elif action == "subscribe":
+            new_ids = [trip_id for trip_id in dict.fromkeys(ids) if trip_id not in subscriber.ids]
+            if len(subscriber.ids) + len(new_ids) > max_ids:
+                subscriber.send_control({"type": "error", "detail": f"At most {max_ids} ids per connection"})
+                continue
+            feed.subscribe(subscriber, new_ids)
+            subscriber.send_control({"type": "subscribed", "ids": ids})
+            # El estado actual, para no perder lo que cambió entre la búsqueda y la suscripción
+            for update in await snapshot(new_ids) if new_ids else ():
+                subscriber.offer(update)
+        else:
+            subscriber.send_control({"type": "error", "detail": "action must be subscribe or unsubscribe"})
+
+
+async def serve(websocket, feed: SeatFeed, snapshot: Callable[[List[str]], Awaitable[List[dict]]],
+                max_ids: int, send_timeout: float) -> None:
+    """
+    Atiende una conexión ya aceptada hasta que se cierre. Un solo escritor (este bucle)
+    envía todo; la lectura corre en otra tarea y sólo encola.
+    """
+    subscriber = feed.connect()
+    reader = asyncio.create_task(_read_messages(websocket, feed, subscriber, snapshot, max_ids))
+    # Al terminar la lectura (desconexión o error) se despierta al escritor para que salga
+    reader.add_done_callback(lambda _: subscriber.ready.set())
+    try:
+        while True:
+            await subscriber.ready.wait()
+            subscriber.ready.clear()
+            if reader.done():
+                # El cliente se desconectó; cualquier otro error de lectura se propaga
+                error = None if reader.cancelled() else reader.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    raise error
+                return
+            if subscriber.overflowed:
+                feed.disconnected_slow += 1
+                await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                return
+            for message in subscriber.drain():
+                try:
+                    await asyncio.wait_for(websocket.send_json(message), send_timeout)
+                except asyncio.TimeoutError:
+                    feed.disconnected_slow += 1
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                    return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        feed.disconnect(subscriber)
+
+
+seat_feed = SeatFeed(settings.SEAT_FEED_MAX_PENDING)
+metrics.register_gauge("seat_feed_subscribers", lambda: len(seat_feed), "Conexiones suscritas al canal de asientos")
+metrics.register_counter("seat_feed_published_total", lambda: seat_feed.published, "Cambios de asientos publicados")
+metrics.register_counter("seat_feed_delivered_total", lambda: seat_feed.delivered, "Cambios encolados a suscriptores")
+metrics.register_counter("seat_feed_disconnected_slow_total", lambda: seat_feed.disconnected_slow, "Conexiones cerradas por no dar abasto")
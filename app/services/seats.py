@@ -0,0 +1,195 @@
+"""
+Inventario de asientos por ruta.
+
+En lugar de bloquear la fila de la ruta con SELECT ... FOR UPDATE durante todo el
+pago, cada cambio de `available_seats` es un UPDATE condicional atómico
+(`WHERE available_seats > 0 ... RETURNING`): dos pasajeros no pueden tomar el
+mismo asiento y el bloqueo de la fila dura sólo hasta el commit.
+
+Al crear una reserva se toma un asiento en retención (hold) que vence a los
+SEAT_HOLD_SECONDS. Pagar una reserva retenida no vuelve a tocar la ruta. Las
+retenciones vencidas sin pagar pasan a `expired` y devuelven su asiento; si la
+reserva se paga después, intenta tomar un asiento otra vez.
+
+En las rutas recurrentes los asientos son de cada ocurrencia (`route_occurrences`):
+con `occurrence_id` las mismas operaciones actúan sobre la fila de la ocurrencia.
+
+Las funciones no hacen commit: lo hace quien las llama, junto con el resto de la transacción.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, event, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import models
+from app.services.route_index import route_index
+from app.services.search_cache import search_cache
+from app.services.seat_feed import seat_feed, seat_update
+
+logger = logging.getLogger(__name__)
+
+Route = models.Route
+RouteOccurrence = models.RouteOccurrence
+Booking = models.Booking
+
+
+def _inventory(occurrence_id):
+    """Tabla que guarda los asientos: la ocurrencia si la hay, si no la ruta."""
+    return Route if occurrence_id is None else RouteOccurrence
+
+
+def _status(table, value: models.RouteStatus):
+    # Con el tipo de la columna para que el valor se envíe como el ENUM de la BD
+    return literal(value, type_=table.status.type)
+
+
+def hold_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.SEAT_HOLD_SECONDS)
+
+
+async def reserve_seat(db: AsyncSession, route_id, occurrence_id=None) -> Optional[Tuple[int, models.RouteStatus]]:
+    """
+    Descuenta un asiento si queda alguno. Devuelve (asientos_restantes, estado)
+    o None si la ruta (u ocurrencia) no está activa o ya no tiene asientos.
+    Pasa a `full` al tomar el último asiento.
+    """
+    table = _inventory(occurrence_id)
+    trip_id = occurrence_id or route_id
+    result = await db.execute(
+        update(table)
+        .where(table.id == trip_id, table.available_seats > 0, table.status == models.RouteStatus.active)
+        .values(
+            available_seats=table.available_seats - 1,
+            status=case((table.available_seats == 1, _status(table, models.RouteStatus.full)), else_=table.status),
+        )
+        .returning(table.available_seats, table.status)
+        .execution_options(synchronize_session=False)
+    )
+    return _result_seats(db, route_id, occurrence_id, result.first())
+
+
+async def release_seats(db: AsyncSession, route_id, count: int = 1, occurrence_id=None) -> Optional[Tuple[int, models.RouteStatus]]:
+    """Devuelve `count` asientos a la ruta (u ocurrencia); si estaba `full` vuelve a `active`."""
+    table = _inventory(occurrence_id)
+    trip_id = occurrence_id or route_id
+    result = await db.execute(
+        update(table)
+        .where(table.id == trip_id)
+        .values(
+            available_seats=table.available_seats + count,
+            status=case((table.status == models.RouteStatus.full, _status(table, models.RouteStatus.active)), else_=table.status),
+        )
+        .returning(table.available_seats, table.status)
+        .execution_options(synchronize_session=False)
+    )
+    return _result_seats(db, route_id, occurrence_id, result.first())
+
+
+def _result_seats(db: AsyncSession, route_id, occurrence_id, row) -> Optional[Tuple[int, models.RouteStatus]]:
+    if row is None:
+        return None
+    _defer_seat_update(db, route_id, occurrence_id, row.available_seats, row.status)
+    return row.available_seats, row.status
+
+
+async def confirm_booking(db: AsyncSession, booking: models.Booking) -> bool:
+    """
+    Confirma una reserva pendiente (o vencida) para el pago.
+
+    - Con retención vigente, o vencida pero aún no liberada: sólo cambia el estado de la reserva.
+    - Sin retención (reservas anteriores) o ya liberada: intenta tomar un asiento.
+
+    Devuelve False si no quedan asientos o si otra petición ya la confirmó; en ese
+    caso quien llama debe hacer rollback.
+    """
+    from_status = booking.status
+    if booking.hold_expires_at is None or from_status == models.BookingStatus.expired:
+        if await reserve_seat(db, booking.route_id, booking.occurrence_id) is None:
+            return False
+
+    result = await db.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, Booking.status == from_status)
+        .values(status=models.BookingStatus.confirmed)
+        .returning(Booking.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        # Otra petición u otro barrido cambió la reserva primero
+        await db.refresh(booking, ["status"])
+        if booking.status == models.BookingStatus.expired and from_status != models.BookingStatus.expired:
+            # El barrido la venció justo ahora: su asiento ya se liberó, se intenta tomar otro
+            return await confirm_booking(db, booking)
+        return False
+    booking.status = models.BookingStatus.confirmed
+    return True
+
+
+async def release_expired_holds(db: AsyncSession, route_id=None) -> Dict[object, int]:
+    """
+    Marca como `expired` las retenciones vencidas y devuelve sus asientos.
+    Devuelve {id de la ruta (o de la ocurrencia): asientos}.
+    """
+    stmt = (
+        update(Booking)
+        .where(
+            Booking.status == models.BookingStatus.pending,
+            Booking.hold_expires_at.is_not(None),
+            Booking.hold_expires_at < datetime.utcnow(),
+        )
+        .values(status=models.BookingStatus.expired)
+        .returning(Booking.route_id, Booking.occurrence_id)
+        .execution_options(synchronize_session=False)
+    )
+    if route_id is not None:
+        stmt = stmt.where(Booking.route_id == route_id)
+    released = Counter((row.route_id, row.occurrence_id) for row in (await db.execute(stmt)).all())
+    for (expired_route_id, occurrence_id), count in released.items():
+        await release_seats(db, expired_route_id, count, occurrence_id)
+    return {occurrence_id or expired_route_id: count for (expired_route_id, occurrence_id), count in released.items()}
+
+
+# --- Índice en memoria, caché de búsqueda y canal en vivo ---
+# Los asientos del índice (o los corredores de la caché de búsqueda) se actualizan, y el
+# cambio se publica a los suscriptores de WS /routes/live (ver app/services/seat_feed.py),
+# sólo si la transacción se confirma.
+
+def _defer_seat_update(db: AsyncSession, route_id, occurrence_id, available_seats, status):
+    if settings.ROUTE_INDEX_ENABLED or settings.SEARCH_CACHE_ENABLED or settings.SEAT_FEED_ENABLED:
+        db.info.setdefault("seat_updates", {})[occurrence_id or route_id] = (route_id, occurrence_id, available_seats, status)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_seat_updates(session):
+    for trip_id, (route_id, occurrence_id, available_seats, status) in session.info.pop("seat_updates", {}).items():
+        if settings.ROUTE_INDEX_ENABLED:
+            route_index.update_availability(trip_id, available_seats, status)
+        elif settings.SEARCH_CACHE_ENABLED:
+            search_cache.update_availability(route_id, trip_id, available_seats, status)
+        if settings.SEAT_FEED_ENABLED:
+            seat_feed.publish(seat_update(route_id, occurrence_id, available_seats, status))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_seat_updates(session):
+    session.info.pop("seat_updates", None)
+
+
+async def sweep_expired_holds(session_factory, interval: float):
+    """Tarea de fondo: libera las retenciones vencidas cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                released = await release_expired_holds(db)
+                await db.commit()
+            if released:
+                logger.info("Released %d expired seat holds", sum(released.values()))
+        except Exception:
+            logger.exception("Seat hold sweep failed")
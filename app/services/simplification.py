@@ -0,0 +1,68 @@
+"""
+Versiones simplificadas del path de una ruta (Douglas-Peucker).
+
+Al crear una ruta se guarda el path completo (para el precio y la ubicación de
+recogida/bajada) y dos versiones simplificadas:
+- `path_medium` (PATH_MEDIUM_TOLERANCE_M): para mostrar la ruta con zoom intermedio.
+- `path_coarse` (PATH_COARSE_TOLERANCE_M): para filtrar candidatas en la búsqueda
+  y para vistas lejanas del mapa.
+
+Douglas-Peucker garantiza que todo punto del path original queda a menos de la
+tolerancia de la versión simplificada. Por eso "a menos de R del path" implica
+"a menos de R + tolerancia del path simplificado", y el filtro grueso nunca descarta
+una ruta que sí cumple; la condición exacta se aplica después sobre el path completo.
+
+La tolerancia se pasa de metros a grados con la longitud de un grado de latitud;
+un grado de longitud nunca es más largo, así que el error en metros queda acotado.
+"""
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+
+from app.config import settings
+from app.services.route_index import METERS_PER_DEGREE
+
+# Niveles de zoom del mapa (convención de teselas web) desde los que se usa cada versión
+ZOOM_FULL = 16
+ZOOM_MEDIUM = 13
+
+
+def tolerance_degrees(meters: float) -> float:
+    return meters / METERS_PER_DEGREE
+
+
+def _line(coords: Union[LineString, np.ndarray, Sequence[Sequence[float]]]) -> LineString:
+    if isinstance(coords, LineString):
+        return coords
+    # Desde un arreglo numpy Shapely copia las coordenadas sin recorrerlas una a una en Python
+    if not isinstance(coords, np.ndarray):
+        coords = np.asarray([c[:2] for c in coords], dtype=np.float64)
+    return LineString(coords[:, :2])
+
+
+def simplify(coords: Union[LineString, Sequence[Sequence[float]]], tolerance_m: float) -> LineString:
+    line = _line(coords)
+    # preserve_topology=False es Douglas-Peucker puro (y el más rápido de GEOS)
+    simplified = line.simplify(tolerance_degrees(tolerance_m), preserve_topology=False)
+    return simplified if len(simplified.coords) >= 2 else LineString([line.coords[0], line.coords[-1]])
+
+
+def path_levels(coords: Sequence[Sequence[float]]) -> Dict[str, object]:
+    """Columnas `path`, `path_medium` y `path_coarse` de una ruta a partir de sus coordenadas."""
+    line = _line(coords)
+    return {
+        "path": from_shape(line, srid=4326, extended=True),
+        "path_medium": from_shape(simplify(line, settings.PATH_MEDIUM_TOLERANCE_M), srid=4326, extended=True),
+        "path_coarse": from_shape(simplify(line, settings.PATH_COARSE_TOLERANCE_M), srid=4326, extended=True),
+    }
+
+
+def level_for_zoom(zoom: Optional[int]) -> str:
+    """Columna del path que corresponde a un nivel de zoom (None = path completo)."""
+    if zoom is None or zoom >= ZOOM_FULL:
+        return "path"
+    if zoom >= ZOOM_MEDIUM:
+        return "path_medium"
+    return "path_coarse"
@@ -0,0 +1,147 @@
+"""
+Paradas de las rutas (`route_stops`) como índice precalculado de puntos de recogida.
+
+Cada parada guarda su ubicación y su fracción sobre el path (misma semántica que
+ST_LineLocatePoint, ver app/services/route_geometry.py). Se crean al crear la ruta:
+las que envía el conductor o, si no envía ninguna, una cada ROUTE_STOP_INTERVAL_M
+metros a lo largo del path (más la última).
+
+La parada más cercana a un punto es una consulta KNN (`location <-> punto`) sobre
+las paradas de la ruta, en lugar de proyectar el punto sobre todo el path; y como
+la fracción ya está guardada, el precio entre dos paradas no tiene que proyectar nada.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from geoalchemy2 import Geography
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+from sqlalchemy import bindparam, cast, func, insert, select, true
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import models
+from app.services.route_geometry import RouteGeometry
+
+RouteStop = models.RouteStop
+
+# (lon, lat, fracción)
+StopPoint = Tuple[float, float, float]
+
+
+def generate_stops(geometry: RouteGeometry, interval_m: float) -> List[StopPoint]:
+    """Una parada cada `interval_m` metros (geodésicos) sobre el path, desde el inicio, más el final."""
+    total = geometry.length_meters
+    targets = np.arange(0.0, total, interval_m) if interval_m > 0 and total > 0 else np.zeros(1)
+    targets = np.append(targets, total)
+
+    cumulative = geometry.geodesic_cumulative
+    segment = np.minimum(np.searchsorted(cumulative, targets, side="right") - 1, len(geometry.starts) - 1)
+    lengths = cumulative[segment + 1] - cumulative[segment]
+    t = np.divide(targets - cumulative[segment], lengths, out=np.zeros_like(targets), where=lengths > 0)
+    t = np.minimum(np.maximum(t, 0.0), 1.0)
+    points = geometry.starts[segment] + t[:, None] * geometry.deltas[segment]
+    if geometry.planar_total > 0:
+        fractions = (geometry.planar_cumulative[segment] + t * geometry.planar_lengths[segment]) / geometry.planar_total
+    else:
+        fractions = np.zeros(len(targets))
+    return list(zip(points[:, 0].tolist(), points[:, 1].tolist(), fractions.tolist()))
+
+
+def given_stops(geometry: RouteGeometry, locations: Sequence[Sequence[float]]) -> List[StopPoint]:
+    """Paradas enviadas por el conductor, con su fracción sobre el path."""
+    points = np.asarray([location[:2] for location in locations], dtype=np.float64)
+    fractions = geometry.locate(points)
+    return list(zip(points[:, 0].tolist(), points[:, 1].tolist(), fractions.tolist()))
+
+
+def stop_rows(route_id, stops: Sequence[StopPoint]) -> List[dict]:
+    """Filas de `route_stops` para las paradas de una ruta."""
+    return [
+        {
+            "route_id": route_id,
+            "location": from_shape(Point(lon, lat), srid=4326, extended=True),
+            "order": order,
+            "fraction": fraction,
+        }
+        for order, (lon, lat, fraction) in enumerate(stops)
+    ]
+
+
+async def save_stops(db: AsyncSession, route_id, stops: Sequence[StopPoint]) -> int:
+    """Guarda las paradas con un solo INSERT multi-fila. No hace commit."""
+    if not stops:
+        return 0
+    await db.execute(insert(RouteStop), stop_rows(route_id, stops))
+    return len(stops)
+
+
+def route_stop_points(coords: Sequence[Sequence[float]], locations: Optional[Sequence[Sequence[float]]] = None,
+                      interval_m: Optional[float] = None) -> List[StopPoint]:
+    """Paradas de una ruta nueva: las enviadas o, si no hay, generadas cada `interval_m` metros."""
+    points = coords[:, :2] if isinstance(coords, np.ndarray) else np.asarray([c[:2] for c in coords], dtype=np.float64)
+    geometry = RouteGeometry(points)
+    if locations:
+        return given_stops(geometry, locations)
+    interval_m = settings.ROUTE_STOP_INTERVAL_M if interval_m is None else interval_m
+    return generate_stops(geometry, interval_m) if interval_m > 0 else []
+
+
+async def create_route_stops(db: AsyncSession, route_id, coords: Sequence[Sequence[float]],
+                             locations: Optional[Sequence[Sequence[float]]] = None,
+                             interval_m: Optional[float] = None) -> int:
+    """Guarda las paradas de una ruta nueva (ver `route_stop_points`). No hace commit."""
+    return await save_stops(db, route_id, route_stop_points(coords, locations, interval_m))
+
+
+def _nearest_stop(route_ids, lon: float, lat: float):
+    """Parada más cercana al punto para cada ruta: LATERAL + ORDER BY location <-> punto LIMIT 1."""
+    point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+    routes = func.unnest(
+        bindparam("route_ids", list(route_ids), type_=ARRAY(UUID(as_uuid=True)))
+    ).table_valued("route_id").render_derived("r")
+    nearest = (
+        select(
+            RouteStop.id,
+            RouteStop.order,
+            RouteStop.fraction,
+            func.ST_X(RouteStop.location).label("lon"),
+            func.ST_Y(RouteStop.location).label("lat"),
+            func.ST_Distance(cast(RouteStop.location, Geography(srid=4326)), cast(point, Geography(srid=4326))).label("distance"),
+        )
+        .where(RouteStop.route_id == routes.c.route_id)
+        .order_by(RouteStop.location.op("<->")(point))
+        .limit(1)
+        .lateral("s")
+    )
+    return select(routes.c.route_id, nearest).select_from(routes).join(nearest, true())
+
+
+def _stop_payload(row) -> dict:
+    return {
+        "id": row.id,
+        "order": row.order,
+        "location": {"type": "Point", "coordinates": [float(row.lon), float(row.lat)]},
+        "fraction": float(row.fraction),
+        "distance_meters": float(row.distance),
+    }
+
+
+async def nearest_stops(db: AsyncSession, route_ids: Sequence, lon: float, lat: float) -> Dict[object, dict]:
+    """{route_id: parada más cercana al punto} para las rutas que tienen paradas."""
+    if not route_ids:
+        return {}
+    rows = await db.execute(_nearest_stop(route_ids, lon, lat))
+    return {row.route_id: _stop_payload(row) for row in rows}
+
+
+async def attach_nearest_stops(db: AsyncSession, routes: Sequence, from_lon: float, from_lat: float,
+                               to_lon: float, to_lat: float) -> None:
+    """Agrega a cada resultado de búsqueda `pickup_stop` y `dropoff_stop` (o None si la ruta no tiene paradas)."""
+    route_ids = list({route.id for route in routes})
+    pickups = await nearest_stops(db, route_ids, from_lon, from_lat)
+    dropoffs = await nearest_stops(db, route_ids, to_lon, to_lat)
+    for route in routes:
+        route.pickup_stop = pickups.get(route.id)
+        route.dropoff_stop = dropoffs.get(route.id)
@@ -0,0 +1,156 @@
+"""
+Configuración del sistema (`system_configs`) servida desde memoria.
+
+Cada proceso carga todas las filas al arrancar en `config_registry` y las lecturas
+no tocan la BD. Las claves conocidas se declaran con `config_key`, que dice cómo
+convertir el texto guardado a su tipo; `config_registry.get(DEFAULT_PRICE_PER_KM)`
+devuelve un float.
+
+Coherencia entre workers: quien escribe llama a `notify_change` dentro de su
+transacción, que hace `pg_notify('system_config', key)`. Postgres entrega la
+notificación sólo si la transacción se confirma, y cada proceso la recibe en
+`listen_for_changes` (una conexión dedicada con LISTEN) y recarga la tabla. Cada
+recarga sube `version`. Si la conexión de escucha se cae se recarga todo al
+reconectar, por las notificaciones perdidas, y además se recarga cada
+SYSTEM_CONFIG_RESYNC_SECONDS como red de seguridad.
+
+Si se edita la tabla a mano: `NOTIFY system_config;` para que los procesos recarguen.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Generic, Iterable, Tuple, TypeVar
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.models import models
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "system_config"
+
+T = TypeVar("T")
+
+
+class ConfigKey(Generic[T]):
+    """Una clave de `system_configs` y el conversor de su valor (texto) a su tipo."""
+
+    def __init__(self, name: str, parse: Callable[[str], T], description: str = ""):
+        self.name = name
+        self.parse = parse
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f"ConfigKey({self.name!r})"
+
+
+KEYS: Dict[str, ConfigKey] = {}
+
+
+def config_key(name: str, parse: Callable[[str], T], description: str = "") -> ConfigKey[T]:
+    key = KEYS[name] = ConfigKey(name, parse, description)
+    return key
+
+
+def validate(name: str, value: str) -> None:
+    """ValueError si `value` no es válido para una clave conocida. Las desconocidas se aceptan como texto."""
+    if name in KEYS:
+        KEYS[name].parse(value)
+
+
+DEFAULT_PRICE_PER_KM = config_key("default_price_per_km_cop", float, "Precio por km (COP) de las rutas que no lo indican")
+
+
+_MISSING = object()
+
+
+class ConfigRegistry:
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self.loaded = False
+        self.version = 0
+
+    def replace(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """Reemplaza todos los valores. Los que no se pueden convertir a su tipo se omiten (y se registra el error)."""
+        values = {}
+        for name, raw in rows:
+            key = KEYS.get(name)
+            try:
+                values[name] = key.parse(raw) if key is not None else raw
+            except (TypeError, ValueError):
+                logger.error("Invalid value for system config %r: %r", name, raw)
+        self._values = values
+        self.loaded = True
+        self.version += 1
+
+    def set(self, name: str, raw: str) -> None:
+        """Actualiza un valor en este proceso (tras confirmar la escritura; los demás reciben la notificación)."""
+        key = KEYS.get(name)
+        self._values = {**self._values, name: key.parse(raw) if key is not None else raw}
+        self.version += 1
+
+    def get(self, key: ConfigKey[T], default: Any = _MISSING) -> T:
+        value = self._values.get(key.name, default)
+        if value is _MISSING:
+            raise KeyError(key.name)
+        return value
+
+    async def load(self, db: AsyncSession) -> int:
+        rows = (await db.execute(select(models.SystemConfig.key, models.SystemConfig.value))).all()
+        self.replace(rows)
+        return len(rows)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        # Sólo consulta la BD si el arranque no pudo cargar la tabla
+        if not self.loaded:
+            await self.load(db)
+
+
+config_registry = ConfigRegistry()
+metrics.register_gauge("system_config_version", lambda: config_registry.version, "Recargas de la configuración del sistema")
+
+
+async def notify_change(db: AsyncSession, name: str) -> None:
+    """Avisa a todos los procesos del cambio; se entrega al confirmar la transacción de `db`."""
+    await db.execute(select(func.pg_notify(CHANNEL, name)))
+
+
+async def _reload(session_factory) -> None:
+    async with session_factory() as db:
+        await config_registry.load(db)
+
+
+async def listen_for_changes(session_factory, database_url: str, resync_seconds: float, retry_seconds: float = 5.0):
+    """
+    Tarea de fondo: LISTEN en una conexión dedicada (fuera del pool) y recarga la
+    configuración con cada notificación. Las notificaciones seguidas se agrupan en
+    una sola recarga.
+    """
+    changed = asyncio.Event()
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    try:
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(CHANNEL, lambda *args: changed.set())
+                    # Lo que cambió mientras no se escuchaba
+                    await _reload(session_factory)
+                    while True:
+                        try:
+                            await asyncio.wait_for(changed.wait(), resync_seconds)
+                        except asyncio.TimeoutError:
+                            # Sin avisos: comprobar que la conexión sigue viva y recargar por si acaso
+                            await raw.execute("SELECT 1")
+                        changed.clear()
+                        await _reload(session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("System config listener failed; reconnecting in %.0f s", retry_seconds)
+                await asyncio.sleep(retry_seconds)
+    finally:
+        await engine.dispose()
+
@@ -0,0 +1,102 @@
+"""
+Caché del usuario autenticado.
+
+`get_current_user` se ejecuta en cada petición autenticada; en lugar de ir a la
+tabla `users` cada vez, guarda una foto compacta (`CachedUser`) de los campos que
+usan los endpoints, con TTL y tamaño acotado. La entrada se invalida cuando se
+confirma (commit) una actualización o un borrado del usuario a través del ORM.
+
+Con AUTH_STATELESS_TOKENS=true esos mismos campos viajan dentro del JWT y no se
+consulta ni la BD ni la caché.
+"""
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.models import models
+from app.services import metrics
+from app.services.cache import TTLCache
+
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+metrics.register_cache("user_cache", user_cache)
+
+
+class CachedUser:
+    """Foto de solo lectura de un `models.User` con los campos que usan los endpoints."""
+
+    __slots__ = ("id", "full_name", "email", "phone_number", "profile_picture_url", "created_at", "role")
+
+    def __init__(self, id, full_name, email, phone_number, profile_picture_url, created_at, role):
+        self.id = id
+        self.full_name = full_name
+        self.email = email
+        self.phone_number = phone_number
+        self.profile_picture_url = profile_picture_url
+        self.created_at = created_at
+        self.role = role
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "CachedUser":
+        return cls(user.id, user.full_name, user.email, user.phone_number,
+                   user.profile_picture_url, user.created_at, user.role)
+
+    @classmethod
+    def from_claims(cls, user_id, claims: Dict[str, Any]) -> "CachedUser":
+        created_at = claims.get("created_at")
+        return cls(
+            user_id,
+            claims.get("full_name"),
+            claims.get("email"),
+            claims.get("phone_number"),
+            claims.get("profile_picture_url"),
+            datetime.fromisoformat(created_at) if created_at else None,
+            models.UserRole(claims.get("role", models.UserRole.user.value)),
+        )
+
+    def to_claims(self) -> Dict[str, Any]:
+        return {
+            "full_name": self.full_name,
+            "email": self.email,
+            "phone_number": self.phone_number,
+            "profile_picture_url": self.profile_picture_url,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "role": getattr(self.role, "value", self.role),
+        }
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    # Al hacer flush la fila nueva aún no es visible para otras sesiones: una lectura
+    # concurrente volvería a cachear la vieja. Se invalida al confirmar (ver abajo).
+    session = object_session(target)
+    if session is None:
+        user_cache.invalidate(str(target.id))
+        return
+    session.info.setdefault("stale_users", set()).add(str(target.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_user_change(orm_execute_state):
+    # query(User).update()/delete() no pasan por los eventos del mapper
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is models.User for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info["stale_users_all"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_stale_users(session):
+    if session.info.pop("stale_users_all", False):
+        user_cache.clear()
+    for user_id in session.info.pop("stale_users", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_users(session):
+    session.info.pop("stale_users_all", None)
+    session.info.pop("stale_users", None)
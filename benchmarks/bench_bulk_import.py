@@ -0,0 +1,164 @@
+"""
+Benchmark: importación masiva de rutas (app/services/route_import.py).
+
+Genera N rutas sintéticas (NDJSON o un FeatureCollection GeoJSON, con un 1% de filas
+inválidas) y mide, en rutas por segundo:
+- lectura en streaming del documento;
+- lectura + validación + preparación (paths simplificados, paradas, geocodificación
+  por lote), es decir todo menos la escritura;
+- con `--database-url`, la importación completa con commit por lote, comparada con
+  crear las rutas una por una como `POST /routes/` (una transacción por ruta).
+
+Uso:
+    python -m benchmarks.bench_bulk_import --routes 100000
+    python -m benchmarks.bench_bulk_import --routes 100000 --format geojson --database-url postgresql://...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.route_import import RouteImporter, iter_records  # noqa: E402
+from benchmarks.synthetic import synthetic_route  # noqa: E402
+
+READ_SIZE = 1 << 16
+# vehicle_id del documento generado; con --database-url se reemplaza por uno real
+BENCH_VEHICLE_ID = uuid.UUID("00000000-0000-4000-8000-000000000001")
+
+
+def synthetic_document(rng: random.Random, count: int, points: int, vehicle_id, fmt: str) -> bytes:
+    rows = []
+    for i in range(count):
+        day, hour = 1 + i % 28, 6 + i % 12
+        row = {
+            "vehicle_id": str(vehicle_id),
+            "departure_time": f"2026-11-{day:02d}T{hour:02d}:00:00Z",
+            "estimated_arrival_time": f"2026-11-{day:02d}T{hour:02d}:45:00Z",
+            "available_seats": rng.randint(1, 15),
+            "price_per_km": 350.0,
+            "path": {"type": "LineString", "coordinates": [list(c) for c in synthetic_route(rng, points, step_m=150.0)]},
+        }
+        if i % 100 == 99:
+            row["available_seats"] = "todos"  # fila inválida
+        rows.append(row)
+    if fmt == "ndjson":
+        return "\n".join(json.dumps(row) for row in rows).encode()
+    features = [
+        {"type": "Feature", "id": i, "geometry": row.pop("path"), "properties": row}
+        for i, row in enumerate(rows)
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode()
+
+
+async def chunks(data: bytes):
+    for i in range(0, len(data), READ_SIZE):
+        yield data[i:i + READ_SIZE]
+
+
+async def bench_parse(document: bytes, fmt: str) -> int:
+    return sum([1 async for _ in iter_records(chunks(document), fmt)])
+
+
+async def bench_prepare(document: bytes, fmt: str, vehicle_id, chunk_size: int) -> dict:
+    """Todo el importador salvo la escritura en la BD."""
+    importer = RouteImporter(db=None, driver_id=uuid.uuid4(), chunk_size=chunk_size)
+
+    async def resolve():
+        importer.vehicle_ids = {vehicle_id}
+        importer.default_price = 350.0
+
+    async def write(items):
+        importer.report.created += len(items)
+
+    importer._resolve = resolve
+    importer._write = write
+    return await importer.run(iter_records(chunks(document), fmt))
+
+
+async def bench_database(database_url: str, document: bytes, fmt: str, chunk_size: int, single: int):
+    from sqlalchemy import delete, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.db import async_database_url
+    from app.models import models
+    from app.services.route_import import import_routes
+
+    engine = create_async_engine(async_database_url(database_url))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    suffix = uuid.uuid4().hex[:8]
+    try:
+        async with session_factory() as db:
+            driver = models.User(full_name="Benchmark Flota", phone_number=f"39{suffix}")
+            db.add(driver)
+            await db.flush()
+            vehicle = models.Vehicle(owner_id=driver.id, brand="Bench", model="Bus", color="Gris", license_plate=f"BEN{suffix}")
+            db.add(vehicle)
+            await db.commit()
+        document = document.replace(str(BENCH_VEHICLE_ID).encode(), str(vehicle.id).encode())
+
+        async with session_factory() as db:
+            t0 = time.perf_counter()
+            report = await import_routes(db, driver.id, chunks(document), fmt, chunk_size)
+            elapsed = time.perf_counter() - t0
+        print(f"  importación completa    {report['created'] / elapsed:9.0f} rutas/s  "
+              f"({report['created']} creadas, {report['failed']} con error, {elapsed:.1f} s)")
+
+        # Referencia: una ruta por transacción, como POST /routes/ (lotes de 1)
+        one_by_one = b"\n".join(document.split(b"\n")[:single]) if fmt == "ndjson" else None
+        if one_by_one:
+            async with session_factory() as db:
+                t0 = time.perf_counter()
+                report = await import_routes(db, driver.id, chunks(one_by_one), fmt, chunk_size=1)
+                elapsed = time.perf_counter() - t0
+            print(f"  una por transacción     {report['created'] / elapsed:9.0f} rutas/s  ({report['created']} rutas)")
+
+        async with session_factory() as db:
+            route_ids = select(models.Route.id).where(models.Route.driver_id == driver.id)
+            await db.execute(delete(models.RouteOccurrence).where(models.RouteOccurrence.route_id.in_(route_ids)))
+            await db.execute(delete(models.RouteStop).where(models.RouteStop.route_id.in_(route_ids)))
+            await db.execute(delete(models.Route).where(models.Route.driver_id == driver.id))
+            await db.execute(delete(models.Vehicle).where(models.Vehicle.id == vehicle.id))
+            await db.execute(delete(models.User).where(models.User.id == driver.id))
+            await db.commit()
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=100_000)
+    parser.add_argument("--points", type=int, default=60, help="Vértices por ruta")
+    parser.add_argument("--format", choices=("ndjson", "geojson"), default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--single", type=int, default=2000, help="Rutas para la referencia de una por transacción")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    document = synthetic_document(random.Random(args.seed), args.routes, args.points, BENCH_VEHICLE_ID, args.format)
+    print(f"{args.routes} rutas de {args.points} vértices ({args.format}, {len(document) / 2**20:.0f} MiB), "
+          f"lotes de {args.chunk_size}:")
+
+    t0 = time.perf_counter()
+    parsed = asyncio.run(bench_parse(document, args.format))
+    elapsed = time.perf_counter() - t0
+    print(f"  lectura                 {parsed / elapsed:9.0f} rutas/s")
+
+    t0 = time.perf_counter()
+    report = asyncio.run(bench_prepare(document, args.format, BENCH_VEHICLE_ID, args.chunk_size))
+    elapsed = time.perf_counter() - t0
+    print(f"  lectura + preparación   {report['received'] / elapsed:9.0f} rutas/s  "
+          f"({report['created']} válidas, {report['failed']} con error, {elapsed:.1f} s)")
+
+    if args.database_url:
+        asyncio.run(bench_database(args.database_url, document, args.format, args.chunk_size, args.single))
+
+
+if __name__ == "__main__":
+    main()
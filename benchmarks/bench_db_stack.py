@@ -0,0 +1,107 @@
+"""
+Benchmark: pila síncrona (def + Session en el threadpool) vs. asíncrona (async def + AsyncSession).
+
+Monta dos apps mínimas con el mismo endpoint, que hace una consulta a la BD (con
+`pg_sleep` opcional para simular consultas más pesadas), y las golpea en el
+proceso con `--concurrency` clientes a través de httpx.ASGITransport. La síncrona
+queda limitada por el threadpool de Starlette (40 hilos) y la asíncrona por el
+pool de conexiones (DB_POOL_SIZE + DB_MAX_OVERFLOW). Reporta peticiones/s y p50/p95/p99.
+
+Uso:
+    python -m benchmarks.bench_db_stack --database-url postgresql://... --concurrency 200 --requests 5000 --query-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from app.db import async_database_url, pool_options  # noqa: E402
+from benchmarks.bench_route_index import percentile  # noqa: E402
+
+QUERY = text("SELECT pg_sleep(:sleep), count(*) FROM (SELECT 1 FROM pg_class LIMIT 20) AS t")
+
+
+def sync_app(database_url, sleep_s):
+    engine = create_engine(database_url, **pool_options())
+    app = FastAPI()
+
+    @app.get("/")
+    def endpoint():
+        with engine.connect() as conn:
+            return {"count": conn.execute(QUERY, {"sleep": sleep_s}).one()[1]}
+
+    return app, engine.dispose
+
+
+def async_app(database_url, sleep_s):
+    engine = create_async_engine(async_database_url(database_url), **pool_options())
+    app = FastAPI()
+
+    @app.get("/")
+    async def endpoint():
+        async with engine.connect() as conn:
+            return {"count": (await conn.execute(QUERY, {"sleep": sleep_s})).one()[1]}
+
+    return app, engine.dispose
+
+
+async def load(app, concurrency, requests, warmup=200):
+    samples = []
+
+    async def worker(client, pending):
+        for _ in pending:
+            t0 = time.perf_counter()
+            (await client.get("/")).raise_for_status()
+            samples.append(time.perf_counter() - t0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Calentamiento: abre las conexiones del pool antes de medir
+        pending = iter(range(warmup))
+        await asyncio.gather(*(worker(client, pending) for _ in range(concurrency)))
+        samples.clear()
+        pending = iter(range(requests))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, pending) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, samples
+
+
+def report(label, requests, elapsed, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"  {label:<6} {requests / elapsed:8.1f} req/s  p50={statistics.median(ms):8.2f} ms  "
+          f"p95={percentile(ms, 95):8.2f} ms  p99={percentile(ms, 99):8.2f} ms")
+
+
+async def run(args):
+    print(f"{args.requests} peticiones, {args.concurrency} concurrentes, consulta de {args.query_ms:.0f} ms")
+    for label, factory in (("sync", sync_app), ("async", async_app)):
+        app, dispose = factory(args.database_url, args.query_ms / 1000.0)
+        elapsed, samples = await load(app, args.concurrency, args.requests)
+        result = dispose()
+        if asyncio.iscoroutine(result):
+            await result
+        report(label, args.requests, elapsed, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--query-ms", type=float, default=5.0, help="pg_sleep por consulta")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
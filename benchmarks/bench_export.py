@@ -0,0 +1,88 @@
+"""
+Benchmark: exportación en streaming (app/services/export.py).
+
+Serializa N reservas sintéticas (entregadas por particiones, como el cursor del servidor
+con `yield_per`) a NDJSON y CSV, con y sin gzip, y mide filas por segundo y el pico de
+memoria de Python (tracemalloc) para comprobar que no crece con el tamaño del extracto.
+
+Uso:
+    python -m benchmarks.bench_export --rows 1000000
+    python -m benchmarks.bench_export --rows 1000000 --gzip
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.export import export_stream  # noqa: E402
+
+KEYS = ["id", "passenger_id", "route_id", "status", "calculated_price", "booked_at",
+        "pickup_lon", "pickup_lat", "dropoff_lon", "dropoff_lat"]
+
+
+class SyntheticResult:
+    """Como el resultado de `AsyncSession.stream`: las filas se generan partición a partición."""
+
+    def __init__(self, rows: int, batch: int):
+        self.rows, self.batch = rows, batch
+
+    def keys(self):
+        return KEYS
+
+    async def partitions(self):
+        start = datetime(2026, 10, 1)
+        passenger, route = uuid.uuid4(), uuid.uuid4()
+        for offset in range(0, self.rows, self.batch):
+            yield [
+                (uuid.uuid4(), passenger, route, "confirmed", Decimal("4520.75"), start + timedelta(seconds=i),
+                 -76.5321, 3.4516, -76.5012, 3.4418)
+                for i in range(offset, min(offset + self.batch, self.rows))
+            ]
+
+
+class SyntheticSession:
+    def __init__(self, rows: int, batch: int):
+        self.rows, self.batch = rows, batch
+
+    async def stream(self, statement):
+        return SyntheticResult(self.rows, self.batch)
+
+
+async def run_export(rows: int, batch: int, fmt: str, gzip: bool) -> int:
+    written = 0
+    async for chunk in export_stream(SyntheticSession(rows, batch), "bookings", fmt, until=datetime(2026, 11, 1), gzip=gzip):
+        written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=5000, help="Filas por partición (EXPORT_BATCH_SIZE)")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{args.rows} reservas, particiones de {args.batch}{', gzip' if args.gzip else ''}:")
+    for fmt in ("ndjson", "csv"):
+        for rows in (args.rows // 10, args.rows):
+            t0 = time.perf_counter()
+            written = asyncio.run(run_export(rows, args.batch, fmt, args.gzip))
+            elapsed = time.perf_counter() - t0
+            # tracemalloc hace más lento el proceso: la memoria se mide en otra pasada
+            tracemalloc.start()
+            asyncio.run(run_export(rows, args.batch, fmt, args.gzip))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {fmt:<6} {rows:>9} filas  {rows / elapsed:9.0f} filas/s  "
+                  f"{written / 2**20:8.1f} MiB escritos  pico de memoria {peak / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: geocodificación inversa de origen/destino al crear rutas.
+
+Genera unos miles de coordenadas al azar (la mayoría alrededor de ciudades, como los
+orígenes y destinos reales, y el resto en cualquier parte del país) y reporta:
+- gazetteer local: µs por consulta (una a una y en lote sobre el STRtree);
+- proveedor remoto simulado (latencia fija + jitter, sin red): llamadas al
+  proveedor y latencia por creación de ruta con y sin la caché por geohash
+  (que además agrupa las consultas simultáneas a una misma celda), y con las
+  dos consultas de la ruta en serie o en paralelo.
+
+Uso:
+    python -m benchmarks.bench_geocoder --points 5000
+    python -m benchmarks.bench_geocoder --points 5000 --latency 120 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.cache import TTLCache  # noqa: E402
+from app.services.geolocation import CachedGeocoder, Gazetteer  # noqa: E402
+from app.services.route_index import METERS_PER_DEGREE  # noqa: E402
+from benchmarks.bench_route_index import percentile  # noqa: E402
+
+# Colombia continental
+BBOX = (-79.0, -4.2, -66.9, 12.5)
+
+
+def random_points(rng: random.Random, gazetteer: Gazetteer, count: int, urban_share: float, spread_m: float):
+    """`urban_share` de los puntos a ~`spread_m` de una ciudad al azar; el resto, uniformes en BBOX."""
+    spread = spread_m / METERS_PER_DEGREE
+    points = []
+    for _ in range(count):
+        if rng.random() < urban_share:
+            i = rng.randrange(len(gazetteer))
+            points.append((gazetteer._lon[i] + rng.gauss(0, spread), gazetteer._lat[i] + rng.gauss(0, spread)))
+        else:
+            points.append((rng.uniform(BBOX[0], BBOX[2]), rng.uniform(BBOX[1], BBOX[3])))
+    return points
+
+
+class SimulatedProvider:
+    """Proveedor remoto falso: responde con el gazetteer tras `latency_ms` (± jitter)."""
+
+    def __init__(self, gazetteer: Gazetteer, latency_ms: float, rng: random.Random):
+        self.gazetteer = gazetteer
+        self.latency = latency_ms / 1000
+        self.rng = rng
+        self.calls = 0
+
+    async def reverse(self, lon, lat):
+        self.calls += 1
+        await asyncio.sleep(self.latency * self.rng.uniform(0.8, 1.2))
+        return self.gazetteer.lookup(lon, lat)
+
+
+def bench_gazetteer(gazetteer: Gazetteer, points):
+    lons, lats = [p[0] for p in points], [p[1] for p in points]
+    t0 = time.perf_counter()
+    single = [gazetteer.lookup(lon, lat) for lon, lat in points]
+    single_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batch = gazetteer.lookup_many(lons, lats)
+    batch_s = time.perf_counter() - t0
+    assert single == batch
+    found = sum(location is not None for location in batch)
+    print(f"gazetteer ({len(gazetteer)} lugares): {single_s / len(points) * 1e6:.1f} µs/consulta, "
+          f"{batch_s / len(points) * 1e6:.2f} µs/consulta en lote; {found}/{len(points)} con ciudad")
+
+
+async def create_routes(points, lookup, concurrency: int, parallel: bool):
+    """Simula creaciones de ruta (origen, destino) con `concurrency` solicitudes a la vez."""
+    pairs = list(zip(points[::2], points[1::2]))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(start, end):
+        async with semaphore:
+            t0 = time.perf_counter()
+            if parallel:
+                await asyncio.gather(lookup(*start), lookup(*end))
+            else:
+                await lookup(*start)
+                await lookup(*end)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(start, end) for start, end in pairs))
+    return time.perf_counter() - t0, latencies
+
+
+async def bench_remote(gazetteer: Gazetteer, points, args):
+    print(f"proveedor remoto simulado ({args.latency:.0f} ms), {len(points) // 2} rutas, "
+          f"{args.concurrency} solicitudes simultáneas:")
+    for label, cached, parallel in (
+        ("sin caché, en serie", False, False),
+        ("sin caché, en paralelo", False, True),
+        ("caché geohash, en paralelo", True, True),
+    ):
+        provider = SimulatedProvider(gazetteer, args.latency, random.Random(args.seed))
+        geocoder = CachedGeocoder(provider, gazetteer, TTLCache(maxsize=100_000, ttl=86400),
+                                  args.precision, timeout=10.0)
+        lookup = geocoder.reverse if cached else provider.reverse
+        elapsed, latencies = await create_routes(points, lookup, args.concurrency, parallel)
+        extra = (f"  aciertos {geocoder.cache.hit_ratio:6.1%}  agrupadas {geocoder.coalesced}"
+                 if cached else "")
+        print(f"  {label:<27} llamadas={provider.calls:6d}  p50={statistics.median(latencies):7.1f} ms  "
+              f"p99={percentile(latencies, 99):7.1f} ms  total={elapsed:6.2f} s{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--urban-share", type=float, default=0.8, help="Fracción de puntos alrededor de ciudades")
+    parser.add_argument("--spread", type=float, default=1500.0, help="Dispersión en metros alrededor de la ciudad")
+    parser.add_argument("--latency", type=float, default=80.0, help="Latencia del proveedor remoto en ms")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--precision", type=int, default=6, help="Precisión del geohash de la caché")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer()
+    t0 = time.perf_counter()
+    gazetteer.ensure_loaded()
+    print(f"carga del gazetteer: {(time.perf_counter() - t0) * 1000:.1f} ms")
+    points = random_points(random.Random(args.seed), gazetteer, args.points, args.urban_share, args.spread)
+    bench_gazetteer(gazetteer, points)
+    asyncio.run(bench_remote(gazetteer, points, args))
+
+
+if __name__ == "__main__":
+    main()
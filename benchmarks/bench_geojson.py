@@ -0,0 +1,125 @@
+"""
+Benchmark: serialización de `RouteResponse.path`.
+
+Compara, para una página de rutas sintéticas:
+- shapely:   el serializador anterior, `mapping(wkb.loads(bytes(path.data)))`.
+- wkb:       decodificación directa del WKB a listas, sin caché.
+- cacheado:  `serialize_path` con la caché por ruta ya caliente.
+- polyline:  polilínea codificada de Google (cacheada).
+- precision: GeoJSON con 5 decimales (cacheado).
+Y el tiempo de generar el JSON de toda la página (`List[RouteResponse]`) con el
+serializador anterior y con el nuevo, junto con el tamaño de la respuesta.
+
+Uso:
+    python -m benchmarks.bench_geojson --routes 200 --points 1000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, List
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from geoalchemy2.shape import from_shape  # noqa: E402
+from pydantic import TypeAdapter, field_serializer  # noqa: E402
+from shapely import wkb  # noqa: E402
+from shapely.geometry import LineString, mapping  # noqa: E402
+
+from app.schemas.schemas import RouteResponse  # noqa: E402
+from app.services import geojson  # noqa: E402
+from benchmarks.synthetic import synthetic_route  # noqa: E402
+
+
+class LegacyRouteResponse(RouteResponse):
+    @field_serializer('path')
+    def serialize_path(self, path: Any, _info):
+        if hasattr(path, 'data'):
+            return mapping(wkb.loads(bytes(path.data)))
+        return None
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def synthetic_page(rng, routes, points):
+    now = datetime.datetime(2026, 5, 1, 8, 0)
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(), driver_id=uuid.uuid4(), vehicle_id=uuid.uuid4(), status="active",
+            departure_time=now, estimated_arrival_time=now, available_seats=3, price_per_km=350.0,
+            start_city="Cali", start_country="Colombia", end_city="Cali", end_country="Colombia",
+            path=from_shape(LineString(synthetic_route(rng, points, step_m=20.0)), srid=4326, extended=True),
+        )
+        for _ in range(routes)
+    ]
+
+
+def with_options(path_format, precision, fn):
+    def run():
+        token = geojson._path_options.set((path_format, precision, None))
+        try:
+            return fn()
+        finally:
+            geojson._path_options.reset(token)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=200, help="Rutas por página")
+    parser.add_argument("--points", type=int, default=1000, help="Vértices por ruta")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    page = synthetic_page(random.Random(args.seed), args.routes, args.points)
+    paths = [(r.id, r.path) for r in page]
+    geojson.path_cache.clear()
+    geojson.path_cache.maxsize = max(geojson.path_cache.maxsize, args.routes * 3)
+
+    per_route = {
+        "shapely": lambda: [mapping(wkb.loads(bytes(p.data))) for _, p in paths],
+        "wkb": lambda: [geojson.encode_path(p.data) for _, p in paths],
+        "cacheado": lambda: [geojson.serialize_path(p, route_id) for route_id, p in paths],
+        "polyline": with_options(geojson.PathFormat.polyline, None,
+                                 lambda: [geojson.serialize_path(p, route_id) for route_id, p in paths]),
+        "precision": with_options(geojson.PathFormat.geojson, 5,
+                                  lambda: [geojson.serialize_path(p, route_id) for route_id, p in paths]),
+    }
+    print(f"{args.routes} rutas de {args.points} vértices")
+    baseline = None
+    for label, fn in per_route.items():
+        fn()  # llena la caché
+        elapsed = timed(fn, args.repeat)
+        baseline = baseline or elapsed
+        print(f"  {label:<10} {elapsed / args.routes * 1e6:10.1f} µs/ruta  x{baseline / elapsed:.1f}")
+
+    print("Página completa (List[RouteResponse] -> JSON)")
+    legacy = TypeAdapter(List[LegacyRouteResponse])
+    current = TypeAdapter(List[RouteResponse])
+    for label, adapter, path_format, precision in (
+        ("anterior", legacy, geojson.PathFormat.geojson, None),
+        ("geojson", current, geojson.PathFormat.geojson, None),
+        ("precision", current, geojson.PathFormat.geojson, 5),
+        ("polyline", current, geojson.PathFormat.polyline, None),
+    ):
+        fn = with_options(path_format, precision, lambda: adapter.dump_json(adapter.validate_python(page, from_attributes=True)))
+        size = len(fn())
+        elapsed = timed(fn, args.repeat)
+        print(f"  {label:<10} {elapsed * 1000:10.2f} ms  {size / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
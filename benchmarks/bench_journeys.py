@@ -0,0 +1,85 @@
+"""
+Benchmark: grafo de transbordos del planificador de viajes (app/services/journeys.py).
+
+Agrega N rutas sintéticas sobre Cali una por una (como `create_route`) y mide el
+tiempo total, los pares de rutas vecinas y, con `--memory`, la memoria de Python del
+grafo (tracemalloc, que hace la construcción varias veces más lenta). Luego mide el costo de agregar una ruta más con el grafo lleno y el de
+`candidates` (la parte geométrica de una consulta a /routes/journeys, con el
+cálculo de los puntos de transbordo; los horarios salen de la BD).
+
+Uso:
+    python -m benchmarks.bench_journeys --routes 1000,5000 --points 40 --queries 200 [--memory]
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+import os
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.journeys import TransferGraph  # noqa: E402
+from benchmarks.synthetic import synthetic_queries, synthetic_route  # noqa: E402
+from benchmarks.bench_route_index import percentile  # noqa: E402
+
+DEPARTURE = datetime(2026, 10, 20, 7, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default="1000,5000")
+    parser.add_argument("--points", type=int, default=40, help="Vértices por ruta (cada ~400 m)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--buffer", type=float, default=500.0)
+    parser.add_argument("--transfer", type=float, default=300.0)
+    parser.add_argument("--per-end", type=int, default=30, help="Rutas más cercanas al origen y al destino que se combinan")
+    parser.add_argument("--memory", action="store_true", help="Medir la memoria del grafo con tracemalloc")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.routes.split(",")]:
+        rng = random.Random(args.seed)
+        routes = [synthetic_route(rng, args.points) for _ in range(size)]
+        queries = synthetic_queries(rng, args.queries)
+        graph = TransferGraph(args.transfer)
+
+        if args.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        for i, coords in enumerate(routes):
+            graph.add(i, coords, DEPARTURE, DEPARTURE + timedelta(minutes=40))
+        build_s = time.perf_counter() - start
+        if args.memory:
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        added = []
+        for i in range(100):
+            coords = synthetic_route(rng, args.points)
+            t0 = time.perf_counter()
+            graph.add(size + i, coords, DEPARTURE, DEPARTURE + timedelta(minutes=40))
+            added.append(time.perf_counter() - t0)
+
+        timings, found = [], 0
+        for q in queries:
+            t0 = time.perf_counter()
+            found += len(graph.candidates(*q, args.buffer, routes_per_end=args.per_end))
+            timings.append(time.perf_counter() - t0)
+
+        last = [t * 1000 for t in added]
+        ms = [t * 1000 for t in timings]
+        print(f"{size} rutas de {args.points} vértices, transbordo {args.transfer:.0f} m")
+        print(f"  construcción {build_s:.1f} s; ruta nueva con el grafo lleno p50={statistics.median(last):.1f} ms "
+              f"p99={percentile(last, 99):.1f} ms")
+        print(f"  {graph.pair_count} pares ({graph.pair_count * 2 / size:.0f} vecinas por ruta)")
+        if args.memory:
+            print(f"  memoria {memory / 2**20:.0f} MiB ({memory / size / 1024:.1f} KiB por ruta)")
+        print(f"  candidates p50={statistics.median(ms):.2f} ms p99={percentile(ms, 99):.2f} ms "
+              f"({found / len(queries):.0f} pares por consulta)")
+
+
+if __name__ == "__main__":
+    main()
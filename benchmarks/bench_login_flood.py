@@ -0,0 +1,105 @@
+"""
+Benchmark: latencia de endpoints ajenos al login durante una ráfaga de logins.
+
+Contra un servidor en marcha, mide la latencia de un endpoint de sondeo (por
+defecto `GET /`, que corre en el threadpool) primero en reposo y luego mientras
+`--concurrency` clientes hacen login sin pausa contra `/auth/token`. Reporta
+p50/p95/p99 del sondeo y el resultado de los logins (200, 503, otros).
+
+Para comparar, levantar el servidor con PASSWORD_POOL_WORKERS=0 (bcrypt en el
+threadpool, comportamiento anterior) y con el pool de procesos:
+
+    PASSWORD_POOL_WORKERS=0 uvicorn app.main:app --port 8000
+    PASSWORD_POOL_WORKERS=2 uvicorn app.main:app --port 8000
+
+Uso:
+    python -m benchmarks.bench_login_flood --base-url http://localhost:8000 --concurrency 200 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from benchmarks.bench_route_index import percentile
+
+
+async def ensure_user(client, email, password):
+    # /auth/register responde 400 si el email ya existe; en ambos casos el usuario queda creado
+    await client.post("/auth/register", json={
+        "full_name": "Benchmark Login", "email": email,
+        "phone_number": "+57" + uuid.uuid4().hex[:10], "password": password,
+    })
+    response = await client.post("/auth/token", data={"username": email, "password": password})
+    response.raise_for_status()
+
+
+async def probe(client, path, stop_at, interval):
+    samples = []
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        (await client.get(path)).raise_for_status()
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def login_loop(client, email, password, stop_at, statuses, latencies):
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        try:
+            response = await client.post("/auth/token", data={"username": email, "password": password})
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+        latencies.append(time.perf_counter() - t0)
+
+
+def report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"  {label:<12} n={len(ms):6d}  p50={statistics.median(ms):8.2f} ms  "
+          f"p95={percentile(ms, 95):8.2f} ms  p99={percentile(ms, 99):8.2f} ms")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        await ensure_user(client, args.email, args.password)
+
+        idle = await probe(client, args.probe_path, time.perf_counter() + args.warmup, args.probe_interval)
+
+        stop_at = time.perf_counter() + args.duration
+        statuses, login_latencies = Counter(), []
+        flood = [
+            asyncio.create_task(login_loop(client, args.email, args.password, stop_at, statuses, login_latencies))
+            for _ in range(args.concurrency)
+        ]
+        loaded = await probe(client, args.probe_path, stop_at, args.probe_interval)
+        await asyncio.gather(*flood)
+
+    print(f"Sondeo {args.probe_path}, {args.concurrency} clientes de login durante {args.duration:.0f} s")
+    report("en reposo", idle)
+    report("con ráfaga", loaded)
+    report("login", login_latencies)
+    print(f"  logins/s     {sum(statuses.values()) / args.duration:8.1f}  respuestas={dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="bench-login@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos de ráfaga")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Segundos de sondeo en reposo")
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: cálculo de la distancia de una reserva en el proceso vs. PostGIS.
+
+Mide, sobre rutas sintéticas:
+- numpy (1 par):  `RouteGeometry.distances_km` con la geometría ya en caché.
+- numpy (frío):   decodificar el WKB + precalcular longitudes + 1 par.
+- numpy (lote):   N pares contra la misma ruta en una sola llamada.
+- postgis:        la consulta ROUTE_DISTANCE_SQL de `create_booking` (con --database-url),
+                  informando además la diferencia máxima contra el cálculo en el proceso.
+
+Uso:
+    python -m benchmarks.bench_pricing --points 50 --pairs 1000 [--database-url postgresql://...]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+import numpy as np  # noqa: E402
+from shapely import wkb  # noqa: E402
+from shapely.geometry import LineString  # noqa: E402
+
+from app.services.route_geometry import RouteGeometry  # noqa: E402
+from benchmarks.synthetic import synthetic_route  # noqa: E402
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def near_route(rng, coords, jitter=0.002):
+    lon, lat = coords[rng.randrange(len(coords))]
+    return (lon + rng.uniform(-jitter, jitter), lat + rng.uniform(-jitter, jitter))
+
+
+def bench_sql(database_url, coords, pickups, dropoffs):
+    from sqlalchemy import create_engine, text
+    from app.services.pricing import ROUTE_DISTANCE_SQL
+
+    engine = create_engine(database_url)
+    query = text(ROUTE_DISTANCE_SQL.text.replace("FROM routes", "FROM bench_pricing_routes"))
+    wkt = "LINESTRING(" + ", ".join(f"{x!r} {y!r}" for x, y in coords) + ")"
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TEMP TABLE bench_pricing_routes (id VARCHAR PRIMARY KEY, path GEOMETRY(LINESTRING, 4326))"))
+        conn.execute(text("INSERT INTO bench_pricing_routes VALUES ('r1', ST_GeomFromText(:wkt, 4326))"), {"wkt": wkt})
+        results, samples = [], []
+        for (start_lon, start_lat), (end_lon, end_lat) in zip(pickups, dropoffs):
+            t0 = time.perf_counter()
+            row = conn.execute(query, {
+                "route_id": "r1", "start_lon": start_lon, "start_lat": start_lat,
+                "end_lon": end_lon, "end_lat": end_lat,
+            }).first()
+            samples.append(time.perf_counter() - t0)
+            results.append(float(row.distance_km))
+    return statistics.median(samples), np.array(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=50, help="Vértices de la ruta")
+    parser.add_argument("--pairs", type=int, default=1000, help="Pares recogida/bajada")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    coords = synthetic_route(rng, args.points)
+    data = wkb.dumps(LineString(coords), srid=4326)
+    pickups = np.array([near_route(rng, coords) for _ in range(args.pairs)])
+    dropoffs = np.array([near_route(rng, coords) for _ in range(args.pairs)])
+
+    geometry = RouteGeometry.from_wkb(data)
+    single = timed(lambda: geometry.distances_km(pickups[:1], dropoffs[:1]), 200)
+    cold = timed(lambda: RouteGeometry.from_wkb(data).distances_km(pickups[:1], dropoffs[:1]), 200)
+    batch = timed(lambda: geometry.distances_km(pickups, dropoffs), 20)
+
+    print(f"Ruta de {args.points} vértices, {args.pairs} pares")
+    print(f"  numpy (1 par)   {single * 1e6:10.1f} µs/par")
+    print(f"  numpy (frío)    {cold * 1e6:10.1f} µs/par")
+    print(f"  numpy (lote)    {batch / args.pairs * 1e6:10.1f} µs/par  ({batch * 1000:.2f} ms el lote)")
+
+    if args.database_url:
+        sql, sql_km = bench_sql(args.database_url, coords, pickups, dropoffs)
+        max_diff_m = float(np.max(np.abs(sql_km - geometry.distances_km(pickups, dropoffs))) * 1000)
+        print(f"  postgis         {sql * 1e6:10.1f} µs/par  (diferencia máxima {max_diff_m * 100:.3f} cm)")
+        print(f"  speedup         x{sql / single:.1f} (1 par), x{sql / (batch / args.pairs):.1f} (lote)")
+
+
+if __name__ == "__main__":
+    main()
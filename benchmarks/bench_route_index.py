@@ -0,0 +1,127 @@
+"""
+Benchmark: índice espacial en memoria vs. consulta ST_DWithin en PostGIS.
+
+Genera rutas sintéticas dentro del área de Cali y mide el tiempo de búsqueda
+origen/destino con `RouteIndex`. Si se pasa `--database-url`, carga las mismas
+rutas en una tabla temporal con índice GiST y mide también la consulta SQL
+equivalente (con el radio convertido a grados, igual que la columna SRID 4326).
+
+Uso:
+    python -m benchmarks.bench_route_index --sizes 10000,100000,1000000
+    python -m benchmarks.bench_route_index --sizes 10000 --database-url postgresql://...
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.proximity import expand_degrees  # noqa: E402
+from app.services.route_index import RouteIndex  # noqa: E402
+from benchmarks.synthetic import synthetic_queries, synthetic_route  # noqa: E402
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def bench_index(routes, queries, buffer_m):
+    index = RouteIndex()
+    start = time.perf_counter()
+    for i, coords in enumerate(routes):
+        index.upsert(i, coords, available_seats=3, is_active=True)
+    build_s = time.perf_counter() - start
+
+    timings, matches = [], 0
+    for q in queries:
+        t0 = time.perf_counter()
+        matches += len(index.search(*q, buffer_m))
+        timings.append(time.perf_counter() - t0)
+    return build_s, timings, matches
+
+
+def bench_sql(database_url, routes, queries, buffer_m):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_routes"))
+        conn.execute(text(
+            "CREATE TABLE bench_routes (id INTEGER PRIMARY KEY, available_seats INTEGER, "
+            "status VARCHAR, path GEOMETRY(LINESTRING, 4326))"
+        ))
+        insert = text(
+            "INSERT INTO bench_routes (id, available_seats, status, path) "
+            "VALUES (:id, 3, 'active', ST_GeomFromText(:wkt, 4326))"
+        )
+        batch = []
+        for i, coords in enumerate(routes):
+            wkt = "LINESTRING(" + ", ".join(f"{x} {y}" for x, y in coords) + ")"
+            batch.append({"id": i, "wkt": wkt})
+            if len(batch) == 5000:
+                conn.execute(insert, batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+        conn.execute(text("CREATE INDEX ON bench_routes USING GIST (path)"))
+        conn.execute(text("ANALYZE bench_routes"))
+        conn.commit()
+
+        query = text("""
+            SELECT id FROM bench_routes
+            WHERE available_seats > 0 AND status = 'active'
+              AND path && ST_Expand(ST_SetSRID(ST_MakePoint(:from_lon, :from_lat), 4326), :from_dx, :from_dy)
+              AND path && ST_Expand(ST_SetSRID(ST_MakePoint(:to_lon, :to_lat), 4326), :to_dx, :to_dy)
+              AND ST_DWithin(path::geography, ST_SetSRID(ST_MakePoint(:from_lon, :from_lat), 4326)::geography, :buffer)
+              AND ST_DWithin(path::geography, ST_SetSRID(ST_MakePoint(:to_lon, :to_lat), 4326)::geography, :buffer)
+        """)  # El mismo predicado en metros que /routes/search (app/services/proximity.py)
+        timings, matches = [], 0
+        for from_lon, from_lat, to_lon, to_lat in queries:
+            t0 = time.perf_counter()
+            from_dx, from_dy = expand_degrees(from_lat, buffer_m)
+            to_dx, to_dy = expand_degrees(to_lat, buffer_m)
+            matches += len(conn.execute(query, {
+                "from_lon": from_lon, "from_lat": from_lat, "from_dx": from_dx, "from_dy": from_dy,
+                "to_lon": to_lon, "to_lat": to_lat, "to_dx": to_dx, "to_dy": to_dy, "buffer": buffer_m,
+            }).all())
+            timings.append(time.perf_counter() - t0)
+        conn.execute(text("DROP TABLE bench_routes"))
+        conn.commit()
+    return timings, matches
+
+
+def report(label, timings, matches):
+    ms = [t * 1000 for t in timings]
+    print(f"  {label:<8} p50={statistics.median(ms):8.3f} ms  p99={percentile(ms, 99):8.3f} ms  "
+          f"mean={statistics.fmean(ms):8.3f} ms  matches={matches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--points", type=int, default=12, help="Vértices por ruta")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--buffer", type=float, default=500.0, help="Radio de búsqueda en metros")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        rng = random.Random(args.seed)
+        routes = [synthetic_route(rng, args.points) for _ in range(size)]
+        queries = synthetic_queries(rng, args.queries)
+        print(f"{size} rutas, {args.queries} consultas, radio {args.buffer:.0f} m")
+
+        build_s, timings, matches = bench_index(routes, queries, args.buffer)
+        print(f"  build    {build_s:.2f} s")
+        report("index", timings, matches)
+        if args.database_url:
+            timings, matches = bench_sql(args.database_url, routes, queries, args.buffer)
+            report("postgis", timings, matches)
+
+
+if __name__ == "__main__":
+    main()
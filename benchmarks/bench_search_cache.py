@@ -0,0 +1,141 @@
+"""
+Benchmark: caché de búsqueda por corredor (app/services/search_cache.py).
+
+Simula, con un reloj sintético, un flujo de búsquedas concentrado en pocos pares de
+barrios (distribución de Zipf sobre `--pairs` pares, con los puntos dispersos unos
+cientos de metros alrededor de cada barrio), mientras se crean rutas y se llenan o
+liberan asientos. Las entradas se llenan con viajes de rutas sintéticas que pasan de
+verdad por el corredor. Informa la tasa de aciertos, las invalidaciones y el costo por
+operación (búsqueda en la caché, ruta nueva, cambio de asientos). No usa la BD: un
+fallo costaría además la consulta espacial completa.
+
+Uso:
+    python -m benchmarks.bench_search_cache --searches 200000 --rate 200 --pairs 40
+"""
+import argparse
+import math
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.route_index import METERS_PER_DEGREE, locate_on_path  # noqa: E402
+from app.services.search_cache import SearchCache  # noqa: E402
+from benchmarks.synthetic import MAX_LAT, MAX_LON, MIN_LAT, MIN_LON, synthetic_route  # noqa: E402
+
+BUFFER_METERS = 500
+START = datetime(2026, 10, 20, 6, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def jitter(rng: random.Random, lon: float, lat: float, meters: float):
+    return (lon + rng.gauss(0, meters) / (METERS_PER_DEGREE * math.cos(math.radians(lat))),
+            lat + rng.gauss(0, meters) / METERS_PER_DEGREE)
+
+
+def corridor_trips(routes, from_lon, from_lat, to_lon, to_lat):
+    trips = []
+    margin = BUFFER_METERS / METERS_PER_DEGREE * 1.1
+    for route_id, flat, departure, (min_lon, min_lat, max_lon, max_lat) in routes:
+        if not (min_lon - margin <= from_lon <= max_lon + margin and min_lat - margin <= from_lat <= max_lat + margin
+                and min_lon - margin <= to_lon <= max_lon + margin and min_lat - margin <= to_lat <= max_lat + margin):
+            continue
+        from_fraction, from_distance, _, _ = locate_on_path(flat, from_lon, from_lat)
+        if from_distance > BUFFER_METERS:
+            continue
+        to_fraction, to_distance, _, _ = locate_on_path(flat, to_lon, to_lat)
+        if to_distance <= BUFFER_METERS and from_fraction < to_fraction:
+            trips.append((departure, route_id, route_id, True))
+    return sorted(trips, key=lambda trip: (trip[0], trip[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=200_000)
+    parser.add_argument("--rate", type=float, default=200.0, help="Búsquedas por segundo")
+    parser.add_argument("--pairs", type=int, default=40, help="Pares de barrios frecuentes")
+    parser.add_argument("--routes", type=int, default=2000, help="Rutas iniciales")
+    parser.add_argument("--new-routes-per-minute", type=float, default=5.0)
+    parser.add_argument("--seat-changes-per-second", type=float, default=10.0)
+    parser.add_argument("--ttl", type=float, default=60.0)
+    parser.add_argument("--precision", type=int, default=7)
+    parser.add_argument("--spread", type=float, default=100.0, help="Dispersión (m) de los puntos alrededor de cada barrio")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clock = Clock()
+    cache = SearchCache(maxsize=5000, ttl=args.ttl, precision=args.precision, bucket_seconds=900,
+                        max_results=500, clock=clock)
+
+    def new_route():
+        coords = synthetic_route(rng, 40)
+        departure = START + timedelta(minutes=rng.randrange(0, 24 * 60))
+        lons, lats = [lon for lon, _ in coords], [lat for _, lat in coords]
+        bbox = (min(lons), min(lats), max(lons), max(lats))
+        return uuid.uuid4(), [value for point in coords for value in point], departure, bbox
+
+    routes = [new_route() for _ in range(args.routes)]
+    # Barrios: pares de puntos a unos kilómetros; pesos de Zipf
+    hoods = [(rng.uniform(MIN_LON, MAX_LON), rng.uniform(MIN_LAT, MAX_LAT)) for _ in range(args.pairs * 2)]
+    pairs = list(zip(hoods[0::2], hoods[1::2]))
+    weights = [1 / (rank + 1) for rank in range(len(pairs))]
+
+    lookup_s = fill_s = added_s = seats_s = 0.0
+    added = seat_changes = 0
+    step = 1 / args.rate
+    for i in range(args.searches):
+        clock.now = i * step
+        (from_lon, from_lat), (to_lon, to_lat) = rng.choices(pairs, weights)[0]
+        from_lon, from_lat = jitter(rng, from_lon, from_lat, args.spread)
+        to_lon, to_lat = jitter(rng, to_lon, to_lat, args.spread)
+        # Las apps buscan salidas desde "ahora"
+        departure_after = START + timedelta(seconds=clock.now)
+
+        t0 = time.perf_counter()
+        key = cache.key(from_lon, from_lat, to_lon, to_lat, BUFFER_METERS, departure_after)
+        entry = cache.get(key)
+        lookup_s += time.perf_counter() - t0
+        if entry is None:
+            t0 = time.perf_counter()
+            cache.set(key, corridor_trips(routes, *cache.points(key)))
+            fill_s += time.perf_counter() - t0
+
+        if rng.random() < args.new_routes_per_minute / 60 * step:
+            route = new_route()
+            routes.append(route)
+            t0 = time.perf_counter()
+            cache.route_added([route[1][j:j + 2] for j in range(0, len(route[1]), 2)], [route[2]])
+            added_s += time.perf_counter() - t0
+            added += 1
+        if rng.random() < args.seat_changes_per_second * step:
+            route_id = rng.choice(routes)[0]
+            t0 = time.perf_counter()
+            cache.update_availability(route_id, route_id, rng.choice((0, 1, 2)), "active")
+            seats_s += time.perf_counter() - t0
+            seat_changes += 1
+
+    misses = cache.misses
+    print(f"{args.searches} búsquedas a {args.rate:.0f}/s sobre {args.pairs} pares, {len(routes)} rutas, TTL {args.ttl:.0f} s")
+    print(f"  tasa de aciertos {cache.hit_ratio * 100:.1f} %  ({cache.hits} aciertos, {misses} fallos, "
+          f"{len(cache)} corredores en caché)")
+    print(f"  invalidaciones {cache.invalidations} por {added} rutas nuevas y {seat_changes} cambios de asientos")
+    print(f"  búsqueda en la caché {lookup_s / args.searches * 1e6:.1f} µs  "
+          f"ruta nueva {added_s / max(added, 1) * 1e3:.2f} ms  "
+          f"cambio de asientos {seats_s / max(seat_changes, 1) * 1e6:.1f} µs")
+    print(f"  llenado simulado (sin BD) {fill_s / max(misses, 1) * 1e3:.2f} ms por fallo")
+
+
+if __name__ == "__main__":
+    main()
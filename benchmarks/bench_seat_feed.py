@@ -0,0 +1,171 @@
+"""
+Benchmark: canal en vivo de asientos (app/services/seat_feed.py).
+
+En el proceso (por defecto): abre N conexiones simuladas por `serve`, cada una
+suscrita a una ruta de un conjunto de R, y mide la memoria de Python (tracemalloc)
+por suscriptor ocioso y el tiempo de un tick: repartir los cambios de K rutas y que
+cada escritor envíe su lote.
+
+Contra un servidor (`--url`): abre N WebSockets reales (librería `websockets`) contra
+`WS /routes/live`, se suscribe a `--route-ids` y los mantiene ociosos `--hold` segundos;
+informa cuántas conexiones se abrieron, cuántas siguen vivas y cuántos mensajes
+llegaron. La memoria del worker se lee aparte (RSS del proceso o /metrics). Con muchas
+conexiones hay que subir `ulimit -n` en ambos lados.
+
+Uso:
+    python -m benchmarks.bench_seat_feed --subscribers 10000 --routes 1000 --changed 200
+    python -m benchmarks.bench_seat_feed --url ws://localhost:8000/routes/live --token <jwt> \\
+        --route-ids <uuid>,<uuid> --subscribers 10000 --hold 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.seat_feed import SeatFeed, seat_update, serve  # noqa: E402
+
+
+class Delivered:
+    """Mensajes recibidos por todos los clientes simulados; avisa al llegar a `expected`."""
+
+    def __init__(self):
+        self.count = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def add(self) -> None:
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+
+    async def wait_for(self, expected: int) -> None:
+        self.expected = expected
+        self.done.clear()
+        if self.count < expected:
+            await self.done.wait()
+
+
+class IdleWebSocket:
+    """Un cliente que se suscribe y luego sólo escucha hasta que termina el benchmark."""
+
+    __slots__ = ("subscribe", "delivered", "closed")
+
+    def __init__(self, route_id: str, delivered: Delivered, closed: asyncio.Event):
+        self.subscribe = json.dumps({"action": "subscribe", "ids": [route_id]})
+        self.delivered = delivered
+        self.closed = closed
+
+    async def receive_text(self):
+        if self.subscribe is not None:
+            message, self.subscribe = self.subscribe, None
+            return message
+        await self.closed.wait()
+        raise asyncio.CancelledError
+
+    async def send_json(self, message):
+        self.delivered.add()
+
+    async def close(self, code=1000):
+        pass
+
+
+async def no_snapshot(ids):
+    return []
+
+
+async def run_in_process(subscribers: int, routes: int, changed: int, ticks: int) -> None:
+    route_ids = [str(uuid.uuid4()) for _ in range(routes)]
+    feed = SeatFeed()
+    delivered = Delivered()
+    closed = asyncio.Event()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    sockets = [IdleWebSocket(route_ids[i % routes], delivered, closed) for i in range(subscribers)]
+    tasks = [asyncio.create_task(serve(socket, feed, no_snapshot, max_ids=10, send_timeout=10)) for socket in sockets]
+    await delivered.wait_for(subscribers)  # el mensaje "subscribed" de cada conexión
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(feed)} suscriptores ociosos sobre {routes} rutas: "
+          f"{(after - before) / subscribers / 1024:.1f} KiB por suscriptor "
+          f"({(after - before) / 2**20:.1f} MiB en total, incluido el cliente simulado)")
+
+    # Cada suscriptor sigue una ruta: un tick con `changed` rutas toca ~subscribers*changed/routes conexiones
+    expected = delivered.count
+    elapsed = []
+    for tick in range(ticks):
+        for route_id in route_ids[:changed]:
+            for seats in (3, 2):  # dos cambios por ruta en el tick: se agrupan en uno
+                feed.publish(seat_update(route_id, None, seats - tick % 2, "active"))
+        t0 = time.perf_counter()
+        offered = feed.flush()
+        expected += offered
+        await delivered.wait_for(expected)
+        elapsed.append(time.perf_counter() - t0)
+    elapsed.sort()
+    print(f"tick con {changed} rutas cambiadas ({offered} envíos): "
+          f"p50 {elapsed[len(elapsed) // 2] * 1000:.1f} ms, máx {elapsed[-1] * 1000:.1f} ms")
+
+    closed.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_against_server(url: str, token: str, route_ids, subscribers: int, hold: float) -> None:
+    import websockets
+
+    received = 0
+
+    async def client(connections):
+        nonlocal received
+        try:
+            async with websockets.connect(f"{url}?token={token}", open_timeout=60) as websocket:
+                connections.append(websocket)
+                await websocket.send(json.dumps({"action": "subscribe", "ids": route_ids}))
+                async for _ in websocket:
+                    received += 1
+        except Exception:
+            pass
+
+    connections = []
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(client(connections)) for _ in range(subscribers)]
+    while len(connections) < subscribers and time.perf_counter() - t0 < 60:
+        await asyncio.sleep(0.1)
+    print(f"{len(connections)}/{subscribers} conexiones abiertas en {time.perf_counter() - t0:.1f} s")
+    await asyncio.sleep(hold)
+    alive = sum(1 for task in tasks if not task.done())
+    print(f"tras {hold:.0f} s: {alive} conexiones vivas, {received} mensajes recibidos")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--routes", type=int, default=1000, help="Rutas distintas entre los suscriptores")
+    parser.add_argument("--changed", type=int, default=200, help="Rutas que cambian en cada tick")
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--url", default=None, help="ws://.../routes/live de un servidor en marcha")
+    parser.add_argument("--token", default=None, help="JWT para --url")
+    parser.add_argument("--route-ids", default="", help="Ids (separados por comas) a los que se suscribe cada conexión")
+    parser.add_argument("--hold", type=float, default=30.0, help="Segundos que se mantienen las conexiones")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.token:
+            parser.error("--token is required with --url")
+        route_ids = [route_id for route_id in args.route_ids.split(",") if route_id]
+        asyncio.run(run_against_server(args.url, args.token, route_ids, args.subscribers, args.hold))
+    else:
+        asyncio.run(run_in_process(args.subscribers, args.routes, min(args.changed, args.routes), args.ticks))
+
+
+if __name__ == "__main__":
+    main()
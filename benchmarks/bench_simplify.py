@@ -0,0 +1,158 @@
+"""
+Benchmark: path completo vs. versiones simplificadas (Douglas-Peucker).
+
+Genera trazas GPS sintéticas con ruido (miles de vértices por ruta) y reporta,
+por nivel (`path`, `path_medium`, `path_coarse`):
+- vértices y bytes de WKB promedio por ruta (lo que ocupa la columna);
+- tiempo de la prueba de distancia en proceso (Shapely `dwithin`) para las consultas.
+Además comprueba que el filtro grueso (radio + tolerancia) no pierde ninguna ruta.
+
+Con `--database-url` carga las rutas en una tabla temporal con índices GiST sobre
+`path` y `path_coarse` y compara la consulta de búsqueda sólo con `path` contra
+la de filtro grueso + refinamiento, junto con el tamaño de cada índice.
+
+Uso:
+    python -m benchmarks.bench_simplify --routes 2000 --points 3000
+    python -m benchmarks.bench_simplify --routes 2000 --database-url postgresql://...
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+import shapely  # noqa: E402
+from geoalchemy2.shape import to_shape  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services.route_index import METERS_PER_DEGREE  # noqa: E402
+from app.services.simplification import path_levels, tolerance_degrees  # noqa: E402
+from benchmarks.synthetic import synthetic_queries, synthetic_route  # noqa: E402
+from benchmarks.bench_route_index import percentile  # noqa: E402
+
+LEVELS = ("path", "path_medium", "path_coarse")
+
+
+def noisy_trace(rng: random.Random, points: int, step_m: float, noise_m: float):
+    """Traza tipo GPS: una muestra cada `step_m` metros con error de posición de ~`noise_m`."""
+    noise = noise_m / METERS_PER_DEGREE
+    return [(lon + rng.gauss(0, noise), lat + rng.gauss(0, noise))
+            for lon, lat in synthetic_route(rng, points, step_m=step_m)]
+
+
+def within(lines, queries, buffer_deg):
+    """Rutas que pasan cerca del origen y del destino de cada consulta (prueba de distancia vectorizada)."""
+    matches = []
+    for from_lon, from_lat, to_lon, to_lat in queries:
+        near = (shapely.dwithin(lines, shapely.Point(from_lon, from_lat), buffer_deg)
+                & shapely.dwithin(lines, shapely.Point(to_lon, to_lat), buffer_deg))
+        matches.append(set(near.nonzero()[0].tolist()))
+    return matches
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def bench_sql(database_url, rows, queries, buffer_deg, coarse_buffer_deg):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_paths"))
+        conn.execute(text(
+            "CREATE TABLE bench_paths (id INTEGER PRIMARY KEY, "
+            "path GEOMETRY(LINESTRING, 4326), path_coarse GEOMETRY(LINESTRING, 4326))"
+        ))
+        insert = text(
+            "INSERT INTO bench_paths (id, path, path_coarse) "
+            "VALUES (:id, ST_GeomFromEWKB(:path), ST_GeomFromEWKB(:path_coarse))"
+        )
+        for start in range(0, len(rows), 500):
+            conn.execute(insert, [
+                {"id": i, "path": bytes(levels["path"].data), "path_coarse": bytes(levels["path_coarse"].data)}
+                for i, levels in enumerate(rows[start:start + 500], start)
+            ])
+        conn.execute(text("CREATE INDEX bench_paths_path_idx ON bench_paths USING GIST (path)"))
+        conn.execute(text("CREATE INDEX bench_paths_coarse_idx ON bench_paths USING GIST (path_coarse)"))
+        conn.execute(text("ANALYZE bench_paths"))
+        conn.commit()
+
+        sizes = conn.execute(text(
+            "SELECT pg_relation_size('bench_paths_path_idx'), pg_relation_size('bench_paths_coarse_idx')"
+        )).one()
+        print(f"  índice GiST path={sizes[0] / 1024:.0f} KiB  path_coarse={sizes[1] / 1024:.0f} KiB")
+
+        exact = """
+            ST_DWithin(path, ST_SetSRID(ST_MakePoint(:from_lon, :from_lat), 4326), :buffer)
+            AND ST_DWithin(path, ST_SetSRID(ST_MakePoint(:to_lon, :to_lat), 4326), :buffer)
+        """
+        coarse = """
+            ST_DWithin(path_coarse, ST_SetSRID(ST_MakePoint(:from_lon, :from_lat), 4326), :coarse_buffer)
+            AND ST_DWithin(path_coarse, ST_SetSRID(ST_MakePoint(:to_lon, :to_lat), 4326), :coarse_buffer)
+            AND
+        """
+        for label, where in (("completo", exact), ("grueso+ref", coarse + exact)):
+            query = text(f"SELECT id FROM bench_paths WHERE {where}")
+            timings, matches = [], 0
+            for from_lon, from_lat, to_lon, to_lat in queries:
+                t0 = time.perf_counter()
+                matches += len(conn.execute(query, {
+                    "from_lon": from_lon, "from_lat": from_lat, "to_lon": to_lon, "to_lat": to_lat,
+                    "buffer": buffer_deg, "coarse_buffer": coarse_buffer_deg,
+                }).all())
+                timings.append(time.perf_counter() - t0)
+            ms = [t * 1000 for t in timings]
+            print(f"  {label:<10} p50={statistics.median(ms):8.3f} ms  p99={percentile(ms, 99):8.3f} ms  "
+                  f"matches={matches}")
+        conn.execute(text("DROP TABLE bench_paths"))
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=3000, help="Vértices por traza")
+    parser.add_argument("--step", type=float, default=5.0, help="Metros entre muestras GPS")
+    parser.add_argument("--noise", type=float, default=3.0, help="Error GPS en metros")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--buffer", type=float, default=500.0, help="Radio de búsqueda en metros")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    traces = [noisy_trace(rng, args.points, args.step, args.noise) for _ in range(args.routes)]
+    build_s, rows = timed(lambda: [path_levels(coords) for coords in traces])
+    queries = synthetic_queries(rng, args.queries)
+    print(f"{args.routes} trazas de {args.points} vértices; simplificación {build_s / args.routes * 1000:.2f} ms/ruta")
+
+    buffer_deg = args.buffer / METERS_PER_DEGREE
+    coarse_buffer_deg = buffer_deg + tolerance_degrees(settings.PATH_COARSE_TOLERANCE_M)
+    full_bytes = None
+    results = {}
+    for level in LEVELS:
+        wkb_bytes = statistics.fmean(len(bytes(r[level].data)) for r in rows)
+        lines = [to_shape(r[level]) for r in rows]
+        vertices = statistics.fmean(len(line.coords) for line in lines)
+        full_bytes = full_bytes or wkb_bytes
+        elapsed, results[level] = timed(lambda: within(
+            lines, queries, coarse_buffer_deg if level == "path_coarse" else buffer_deg))
+        print(f"  {level:<12} {vertices:9.0f} vértices  {wkb_bytes / 1024:8.1f} KiB/ruta  "
+              f"x{full_bytes / wkb_bytes:6.1f} menos  consultas {elapsed / args.queries * 1000:8.3f} ms")
+
+    missed = sum(len(exact - coarse) for exact, coarse in zip(results["path"], results["path_coarse"]))
+    extra = sum(len(coarse - exact) for exact, coarse in zip(results["path"], results["path_coarse"]))
+    print(f"  filtro grueso: {missed} rutas perdidas, {extra} candidatas de más a refinar")
+
+    if args.database_url:
+        bench_sql(args.database_url, rows, queries, buffer_deg, coarse_buffer_deg)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Trazados y búsquedas sintéticos dentro del área de Cali, para los benchmarks y las pruebas.
+
+No depende de la BD ni de los demás scripts de `benchmarks/`: las pruebas unitarias lo
+importan sin arrastrar nada más. Vive con el harness para que `compare.py`, que copia
+`benchmarks/` sobre revisiones anteriores, lo encuentre también allí.
+"""
+import math
+import os
+import random
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/aventon")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+from app.services.route_index import METERS_PER_DEGREE  # noqa: E402
+
+# Bounding box aproximado de Cali
+MIN_LON, MAX_LON = -76.58, -76.46
+MIN_LAT, MAX_LAT = 3.33, 3.50
+
+
+def synthetic_route(rng: random.Random, points: int, step_m: float = 400.0):
+    """Polilínea de `points` vértices cada `step_m` metros, con giros suaves, que arranca en Cali."""
+    lon = rng.uniform(MIN_LON, MAX_LON)
+    lat = rng.uniform(MIN_LAT, MAX_LAT)
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = [(lon, lat)]
+    for _ in range(points - 1):
+        heading += rng.uniform(-0.6, 0.6)
+        lat += step_m * math.sin(heading) / METERS_PER_DEGREE
+        lon += step_m * math.cos(heading) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        coords.append((lon, lat))
+    return coords
+
+
+def synthetic_queries(rng: random.Random, count: int):
+    """`count` pares (from_lon, from_lat, to_lon, to_lat) al azar dentro del bounding box."""
+    return [
+        (rng.uniform(MIN_LON, MAX_LON), rng.uniform(MIN_LAT, MAX_LAT),
+         rng.uniform(MIN_LON, MAX_LON), rng.uniform(MIN_LAT, MAX_LAT))
+        for _ in range(count)
+    ]
@@ -1,12 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 import os
 from dotenv import load_dotenv
 
 from app.main import app
-from app.db import Base, get_db
+from app.db import Base, async_database_url, get_db
 from app.models import models # Importar para que se creen las tablas (Alembic sería mejor en producción)
 
 # Cargar variables de entorno para las pruebas
@@ -17,16 +19,17 @@ if not SQLALCHEMY_DATABASE_URL:
     raise RuntimeError("TEST_DATABASE_URL is not set in the .env file. Please create a separate PostgreSQL database for testing and set TEST_DATABASE_URL.")
 
 # Configuración del motor para la base de datos de prueba (PostgreSQL)
+# El síncrono crea las tablas y lo usan las pruebas; la app usa el asíncrono como en producción.
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: cada módulo de pruebas corre en su propio event loop y las conexiones asyncpg no se comparten entre loops
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # --- Sobrescribir la Dependencia get_db ---
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Aplicamos la sobrescritura a nuestra app
 app.dependency_overrides[get_db] = override_get_db
@@ -44,23 +47,12 @@ def client():
 # --- Fixture para la sesión de base de datos ---
 @pytest.fixture(scope="function")
 def db_session():
-    """Proporciona una sesión de BD para cada test, y se hace rollback después."""
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
-
-    # Reemplazamos get_db durante la duración del test con esta sesión transaccional
-    def override_get_db_for_session():
-        try:
-            yield session
-        finally:
-            session.close()
-
-    app.dependency_overrides[get_db] = override_get_db_for_session
-    
+    """
+    Proporciona una sesión de BD síncrona para preparar y verificar datos en cada test.
+    La app usa su propia sesión asíncrona, así que los cambios deben confirmarse con commit
+    para que los vea; las tablas se borran al terminar el módulo.
+    """
+    session = TestingSessionLocal()
     yield session
-
-    # Hacemos rollback de la transacción y cerramos la conexión
-    transaction.rollback()
-    connection.close()
-    app.dependency_overrides[get_db] = override_get_db # Restaurar la dependencia original
\ No newline at end of file
+    session.rollback()
+    session.close()
@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy.dialects import postgresql
+
+from app.models.models import BookingStatus
+from app.services import export
+from app.services.export import export_query, export_stream
+
+KEYS = ["id", "status", "calculated_price", "booked_at", "pickup_lon"]
+
+def booking_rows(count):
+    return [
+        (uuid.UUID(int=i), BookingStatus.confirmed, Decimal("1234.50"), datetime(2026, 10, 1, 8, 0) + timedelta(minutes=i), None)
+        for i in range(count)
+    ]
+
+class FakeResult:
+    def __init__(self, rows, size):
+        self.rows, self.size = rows, size
+
+    def keys(self):
+        return KEYS
+
+    async def partitions(self):
+        for i in range(0, len(self.rows), self.size):
+            yield self.rows[i:i + self.size]
+
+class FakeSession:
+    def __init__(self, rows, size=3):
+        self.rows, self.size, self.statements = rows, size, []
+
+    async def stream(self, statement):
+        self.statements.append(statement)
+        return FakeResult(self.rows, self.size)
+
+def collect(db, **kwargs):
+    async def run():
+        return [chunk async for chunk in export_stream(db, "bookings", **kwargs)]
+    return b"".join(asyncio.run(run()))
+
+def test_query_is_bounded_by_watermarks_and_ordered():
+    since = datetime(2026, 10, 1, 3, 0, tzinfo=timezone(timedelta(hours=-5)))
+    query = export_query("bookings", since, datetime(2026, 10, 2))
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert "bookings.booked_at <= '2026-10-02 00:00:00'" in sql
+    # since se pasa a UTC sin zona, como la columna
+    assert "bookings.booked_at > '2026-10-01 08:00:00'" in sql
+    assert sql.endswith("ORDER BY bookings.booked_at, bookings.id")
+
+    routes = str(export_query("routes", None, datetime(2026, 10, 2), include_path=True).compile(dialect=postgresql.dialect()))
+    assert "ST_AsGeoJSON(routes.path) AS path" in routes and ">" not in routes
+
+def test_ndjson_and_csv_encoding():
+    db = FakeSession(booking_rows(5))
+    lines = collect(db, until=datetime(2026, 10, 2)).decode().splitlines()
+    assert len(lines) == 5
+    assert json.loads(lines[1]) == {
+        "id": str(uuid.UUID(int=1)), "status": "confirmed", "calculated_price": "1234.50",
+        "booked_at": "2026-10-01T08:01:00", "pickup_lon": None,
+    }
+    assert db.statements[0].get_execution_options()["yield_per"] == export.settings.EXPORT_BATCH_SIZE
+
+    rows = list(csv.reader(io.StringIO(collect(FakeSession(booking_rows(5)), fmt="csv").decode())))
+    assert rows[0] == KEYS
+    assert rows[2] == [str(uuid.UUID(int=1)), "confirmed", "1234.50", "2026-10-01T08:01:00", ""]
+    assert len(rows) == 6
+
+def test_gzip_output_is_streamed_in_blocks(monkeypatch):
+    monkeypatch.setattr(export, "FLUSH_BYTES", 256)
+    # ids aleatorios: si no, zlib retiene casi todo en su buffer interno
+    rows = [(uuid.uuid4(),) + row[1:] for row in booking_rows(5000)]
+    db = FakeSession(rows, size=100)
+
+    async def run():
+        return [chunk async for chunk in export_stream(db, "bookings", "csv", gzip=True)]
+    chunks = asyncio.run(run())
+    assert len(chunks) > 1
+    text = gzip.decompress(b"".join(chunks)).decode()
+    assert text.startswith(",".join(KEYS) + "\n") and text.count("\n") == 5001
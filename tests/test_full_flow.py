@@ -118,6 +118,21 @@ def test_full_booking_flow(client: TestClient, db_session: Session, test_driver_
     found_route_ids = [r["id"] for r in search_response.json()]
     assert route_id in found_route_ids
 
+    # 3b. El emparejamiento devuelve la ruta con las fracciones en el orden correcto
+    match_response = client.get(
+        "/routes/match",
+        headers={"Authorization": f"Bearer {passenger_token}"},
+        params={
+            "from_lat": 3.421, "from_lon": -76.536,
+            "to_lat": 3.430, "to_lon": -76.520,
+            "buffer_meters": 1000,
+            "desired_departure": "2026-05-01T08:00:00Z"
+        }
+    )
+    assert match_response.status_code == 200, match_response.json()
+    match = next(m for m in match_response.json() if m["route"]["id"] == route_id)
+    assert 0 <= match["pickup_fraction"] < match["dropoff_fraction"] <= 1
+
     # 4. Pasajero solicita una reserva (booking)
     # Puntos de recogida y bajada a lo largo de la ruta
     booking_payload = {
@@ -125,6 +140,16 @@ def test_full_booking_flow(client: TestClient, db_session: Session, test_driver_
         "pickup_point": {"type": "Point", "coordinates": [-76.53676, 3.42158]}, # Punto A
         "dropoff_point": {"type": "Point", "coordinates": [-76.52000, 3.43000]} # Punto B
     }
+    # 4a. Cotizar primero; la reserva reutiliza el precio con el quote_token
+    quote_response = client.post(
+        "/bookings/quote",
+        headers={"Authorization": f"Bearer {passenger_token}"},
+        json=booking_payload
+    )
+    assert quote_response.status_code == 200, quote_response.json()
+    quoted_price = quote_response.json()["calculated_price"]
+    booking_payload["quote_token"] = quote_response.json()["quote_token"]
+
     booking_response = client.post(
         "/bookings",
         headers={"Authorization": f"Bearer {passenger_token}"},
@@ -134,10 +159,12 @@ def test_full_booking_flow(client: TestClient, db_session: Session, test_driver_
     booking_id = booking_response.json()["id"]
     calculated_price = booking_response.json()["calculated_price"]
     assert booking_response.json()["status"] == "pending"
+    assert booking_response.json()["hold_expires_at"] is not None # El asiento queda retenido hasta el pago
     # El precio calculado debería ser > 0 y razonable para la distancia entre los puntos
     assert calculated_price > 0
     # Ejemplo: distancia aproximada entre esos puntos es ~2.2km, * 500 = 1100
     assert decimal.Decimal(calculated_price) == pytest.approx(decimal.Decimal("1100.00"), abs=50)
+    assert calculated_price == pytest.approx(quoted_price, abs=0.01)
 
 
     # 5. Pasajero paga la reserva
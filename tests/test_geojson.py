@@ -0,0 +1,31 @@
+import uuid
+
+import numpy as np
+from geoalchemy2.shape import from_shape
+from shapely import wkb
+from shapely.geometry import LineString, mapping
+
+from app.services.geojson import PathFormat, encode_path, encode_polyline, path_cache, serialize_path
+
+CALI_PATH = [(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]
+
+def test_encode_polyline_matches_reference():
+    # Ejemplo de la documentación de Google (lat, lon) = (38.5, -120.2), (40.7, -120.95), (43.252, -126.453)
+    coords = np.array([[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]])
+    assert encode_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+def test_geojson_matches_shapely_mapping():
+    data = bytes(from_shape(LineString(CALI_PATH), srid=4326, extended=True).data)
+    expected = mapping(wkb.loads(data))
+    encoded = encode_path(data)
+    assert encoded["type"] == expected["type"]
+    assert encoded["coordinates"] == list(expected["coordinates"])
+    assert encode_path(data, PathFormat.geojson, precision=2)["coordinates"][0] == (-76.54, 3.42)
+
+def test_cached_path_is_recomputed_when_path_changes():
+    path_cache.clear()
+    route_id = uuid.uuid4()
+    first = serialize_path(from_shape(LineString(CALI_PATH), srid=4326, extended=True), route_id)
+    assert serialize_path(from_shape(LineString(CALI_PATH), srid=4326, extended=True), route_id) is first
+    changed = serialize_path(from_shape(LineString(CALI_PATH[:2]), srid=4326, extended=True), route_id)
+    assert len(changed["coordinates"]) == 2
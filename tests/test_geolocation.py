@@ -0,0 +1,53 @@
+import asyncio
+
+from app.services.cache import TTLCache
+from app.services.geolocation import CachedGeocoder, Gazetteer, geohash
+
+def test_geohash_known_value():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(3.42158, -76.53676, 6) == geohash(3.42160, -76.53670, 6)
+
+def test_gazetteer_returns_nearest_city_within_range():
+    gazetteer = Gazetteer()
+    assert gazetteer.lookup(-76.53676, 3.42158) == {"city": "Cali", "country": "Colombia"}
+    assert gazetteer.lookup(-74.08, 4.61)["city"] == "Bogotá"
+    # En medio del Pacífico no hay ciudad a menos de GEOCODER_MAX_DISTANCE_KM
+    assert gazetteer.lookup(-85.0, 2.0) is None
+    assert gazetteer.lookup_many([-76.53676, -85.0], [3.42158, 2.0])[1] is None
+
+class SlowProvider:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def reverse(self, lon, lat):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("provider down")
+        return {"city": "Remota", "country": "Colombia"}
+
+def _geocoder(provider):
+    return CachedGeocoder(provider, Gazetteer(), TTLCache(maxsize=100, ttl=60), precision=6, timeout=1.0)
+
+def test_concurrent_lookups_in_one_cell_share_one_call():
+    provider = SlowProvider()
+    geocoder = _geocoder(provider)
+
+    async def lookups():
+        # Puntos a unos metros entre sí: la misma celda geohash
+        first = await asyncio.gather(*(geocoder.reverse(-76.53676 + i * 1e-5, 3.42158) for i in range(20)))
+        again = await geocoder.reverse(-76.53676, 3.42158)
+        return first, again
+
+    first, again = asyncio.run(lookups())
+    assert provider.calls == 1
+    assert geocoder.coalesced == 19
+    assert all(location["city"] == "Remota" for location in first + [again])
+
+def test_provider_failure_falls_back_to_gazetteer():
+    provider = SlowProvider(fail=True)
+    geocoder = _geocoder(provider)
+    location = asyncio.run(geocoder.reverse(-76.53676, 3.42158))
+    assert location == {"city": "Cali", "country": "Colombia"}
+    assert geocoder.failures == 1
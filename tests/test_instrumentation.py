@@ -0,0 +1,74 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.config import settings
+from app.main import read_metrics
+from app.services import instrumentation, metrics
+from app.services.instrumentation import InstrumentationMiddleware, timed
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Prueba", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, '/a"b')
+    assert histogram.render() == [
+        'test_latency_seconds_bucket{route="/a\\"b",le="0.1"} 2',
+        'test_latency_seconds_bucket{route="/a\\"b",le="1"} 3',
+        'test_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'test_latency_seconds_sum{route="/a\\"b"} 3.65',
+        'test_latency_seconds_count{route="/a\\"b"} 4',
+    ]
+
+def instrumented_app():
+    engine = create_engine("sqlite://")
+    app = FastAPI()
+    app.add_middleware(InstrumentationMiddleware, server_timing=True, n_plus_one_threshold=5)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with engine.connect() as conn:
+            # Una consulta por "hijo": el patrón N+1
+            values = [conn.execute(text("SELECT :n"), {"n": n}).scalar() for n in range(item_id)]
+        with timed("pricing_numpy"):
+            total = sum(values)
+        return {"total": total}
+
+    return app
+
+def test_middleware_records_route_template_queries_and_n_plus_one():
+    client = TestClient(instrumented_app())
+    route = ("GET", "/items/{item_id}")
+    before = instrumentation.http_request_queries.count(*route), instrumentation.db_n_plus_one.value(*route)
+
+    response = client.get("/items/3")
+    assert response.json() == {"total": 3}
+    timing = response.headers["server-timing"]
+    assert 'db;dur=' in timing and 'desc="3 queries"' in timing and "pricing_numpy;dur=" in timing
+
+    client.get("/items/6")
+    assert instrumentation.http_request_queries.count(*route) == before[0] + 2
+    # Sólo la segunda repite la consulta 5 veces o más
+    assert instrumentation.db_n_plus_one.value(*route) == before[1] + 1
+
+    client.get("/missing")
+    exposition = metrics.render()
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"}' in exposition
+    assert 'route="unmatched",status="404"' in exposition
+    assert "# TYPE db_n_plus_one_total counter" in exposition
+
+def test_callback_totals_are_exported_as_counters():
+    metrics.register_counter("test_widgets_total", lambda: 7, "Prueba")
+    exposition = metrics.render()
+    assert "# TYPE test_widgets_total counter\ntest_widgets_total 7" in exposition
+    assert "# TYPE search_cache_hits_total counter" in exposition
+    assert "# TYPE search_cache_hit_ratio gauge" in exposition
+
+def test_metrics_require_the_token_when_set(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    app = FastAPI()
+    app.add_api_route("/metrics", read_metrics, methods=["GET"])
+    client = TestClient(app)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200 and "# TYPE" in response.text
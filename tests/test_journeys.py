@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import journeys
+from app.services.journeys import TransferGraph, segment_distance
+
+# Cali: una ruta oeste-este por la latitud 3.45 y otra sur-norte que la cruza en -76.52
+EAST = [(-76.56, 3.45), (-76.54, 3.45), (-76.50, 3.45)]
+NORTH = [(-76.52, 3.42), (-76.52, 3.45), (-76.52, 3.48)]
+SOUTH = list(reversed(NORTH))
+ORIGIN = (-76.555, 3.4505)
+DESTINATION = (-76.5205, 3.475)
+DEPARTURE = datetime(2026, 10, 20, 7, 0)
+
+def make_graph(*routes):
+    graph = TransferGraph(transfer_meters=300)
+    ids = []
+    for coords in routes:
+        route_id = uuid.uuid4()
+        graph.add(route_id, coords, DEPARTURE, DEPARTURE + timedelta(minutes=30))
+        ids.append(route_id)
+    return graph, ids
+
+def test_segment_distance_for_crossing_and_parallel_segments():
+    distance, s, t = segment_distance(0, 0, 10, 0, [5, 12], [-5, 3], [5, 20], [5, 3])
+    assert distance.tolist() == pytest.approx([0.0, (4 + 9) ** 0.5])
+    assert s.tolist() == [0.5, 1.0] and t.tolist() == [0.5, 0.0]
+
+def test_crossing_routes_are_neighbours_with_a_transfer_at_the_crossing():
+    graph, (east, north) = make_graph(EAST, NORTH)
+    assert graph.neighbours(east) == {north} and graph.neighbours(north) == {east}
+    from_fraction, to_fraction, walk, from_lon, from_lat, to_lon, to_lat = graph.transfer(east, north, 0.0, 1.0)
+    assert walk == pytest.approx(0, abs=1e-6)
+    assert from_fraction == pytest.approx(2 / 3, abs=0.01) and to_fraction == pytest.approx(0.5, abs=0.01)
+    assert (from_lon, from_lat) == pytest.approx((-76.52, 3.45)) == (to_lon, to_lat)
+    # Recogiendo después del cruce ya no hay transbordo
+    assert graph.transfer(east, north, 0.8, 1.0) is None
+    assert graph.add(east, EAST, DEPARTURE, DEPARTURE) == 0 and graph.pair_count == 1
+
+def test_far_routes_are_not_neighbours():
+    graph, (east, far) = make_graph(EAST, [(-76.52, 3.46), (-76.52, 3.50)])  # empieza a ~1.1 km
+    assert graph.neighbours(east) == set() and graph.pair_count == 0
+
+def test_candidates_respect_the_direction_of_both_legs():
+    graph, (east, north, south) = make_graph(EAST, NORTH, SOUTH)
+    found = graph.candidates(*ORIGIN, *DESTINATION, buffer_meters=200)
+    assert [(first, second) for first, second, *_ in found] == [(east, north)]
+    _, _, pickup, transfer, dropoff = found[0]
+    assert pickup[0] < transfer[0] and transfer[1] < dropoff[0]
+    # Sin la ruta hacia el norte no queda ninguna combinación
+    graph.remove(north)
+    assert graph.candidates(*ORIGIN, *DESTINATION, buffer_meters=200) == []
+
+def test_prune_removes_finished_routes_and_their_edges():
+    graph, (east, north) = make_graph(EAST, NORTH)
+    assert graph.prune(DEPARTURE + timedelta(hours=1)) == 2
+    assert len(graph) == 0 and graph.pair_count == 0
+    assert graph.near(*ORIGIN, 200) == {}
+    # Tras compactar, las rutas nuevas se encuentran igual
+    south = uuid.uuid4()
+    assert graph.add(south, SOUTH, DEPARTURE, DEPARTURE) == 0
+    assert set(graph.near(-76.5205, 3.475, 200)) == {south}
+
+def trip_row(route_id, departure, minutes):
+    return SimpleNamespace(route_id=route_id, trip_id=uuid.uuid4(), departure_time=departure,
+                           estimated_arrival_time=departure + timedelta(minutes=minutes))
+
+def test_plan_keeps_only_connections_with_compatible_times(monkeypatch):
+    graph, (east, north) = make_graph(EAST, NORTH)
+    first = trip_row(east, DEPARTURE, 30)  # pasa por el cruce a las 7:20
+    too_early = trip_row(north, DEPARTURE, 40)  # pasa a las 7:20: no alcanza el transbordo mínimo
+    on_time = trip_row(north, DEPARTURE + timedelta(minutes=15), 40)  # pasa a las 7:35
+    too_late = trip_row(north, DEPARTURE + timedelta(hours=2), 40)
+    bookable = {east: [first], north: [too_early, on_time, too_late]}
+
+    async def fake_bookable(db, route_ids, departure_before, departure_after=None, running_after=None):
+        return {route_id: bookable[route_id] for route_id in route_ids if route_id in bookable}
+
+    async def fake_load_trips(db, trip_ids):
+        return {trip_id: SimpleNamespace(id=trip_id) for trip_id in trip_ids}
+
+    monkeypatch.setattr(journeys, "_bookable", fake_bookable)
+    monkeypatch.setattr(journeys, "load_trips", fake_load_trips)
+    found = asyncio.run(journeys.plan_journeys(
+        None, *ORIGIN, *DESTINATION, 200, DEPARTURE, 5, DEPARTURE - timedelta(minutes=10), graph=graph
+    ))
+    assert len(found) == 1
+    journey = found[0]
+    assert [leg.route.id for leg in journey.legs] == [first.trip_id, on_time.trip_id]
+    assert journey.transfer_wait_seconds == pytest.approx(15 * 60, abs=5)
+    assert journey.legs[0].dropoff_point["coordinates"] == pytest.approx(journey.legs[1].pickup_point["coordinates"])
+    assert journey.arrival_time < on_time.estimated_arrival_time.replace(tzinfo=timezone.utc)
@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import otp
+from app.services.otp import EXPIRED, INVALID, VALID, MemoryOTPStore
+from app.services.rate_limit import TokenBucketLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_allows_bursts_then_refills():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(per_minute=6, burst=3, clock=clock)
+    assert [limiter.acquire("3001234567") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("3001234567") == 10.0  # una ficha cada 10 s
+    assert limiter.acquire("3109876543") == 0.0  # otra clave, otro balde
+    clock.now += 10
+    assert limiter.acquire("3001234567") == 0.0
+    assert limiter.rejected == 1
+
+def test_token_bucket_memory_is_bounded():
+    limiter = TokenBucketLimiter(per_minute=60, burst=1, maxsize=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert len(limiter) == 2
+
+def test_memory_store_consumes_valid_codes_once():
+    clock = FakeClock()
+    store = MemoryOTPStore(shards=4, clock=clock)
+
+    async def scenario():
+        await store.issue(None, "3001234567", "123456", ttl=300)
+        await store.issue(None, "3109876543", "654321", ttl=300)
+        results = [
+            await store.consume(None, "3001234567", "000000"),  # un intento fallido no borra el código
+            await store.consume(None, "3001234567", "123456"),
+            await store.consume(None, "3001234567", "123456"),
+        ]
+        clock.now += 301
+        results.append(await store.consume(None, "3109876543", "654321"))
+        return results
+
+    assert asyncio.run(scenario()) == [INVALID, VALID, INVALID, EXPIRED]
+
+def test_memory_store_sweeps_expired_codes():
+    clock = FakeClock()
+    store = MemoryOTPStore(shards=4, clock=clock)
+
+    async def scenario():
+        for i in range(10):
+            await store.issue(None, f"300000000{i}", "123456", ttl=60 if i % 2 else 600)
+        clock.now += 120
+        return await store.sweep()
+
+    assert asyncio.run(scenario()) == 5
+    assert len(store) == 5
+
+def test_otp_request_is_rate_limited_per_phone(monkeypatch):
+    monkeypatch.setattr(otp, "phone_limiter", TokenBucketLimiter(per_minute=1, burst=2))
+    monkeypatch.setattr(otp, "ip_limiter", TokenBucketLimiter(per_minute=60, burst=100))
+    monkeypatch.setattr(otp, "_store", MemoryOTPStore())
+    client = TestClient(app)
+
+    statuses = [client.post("/auth/otp/request", json={"phone_number": "3150001122"}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.post("/auth/otp/request", json={"phone_number": "3150001122"})
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) > 0
+    assert client.post("/auth/otp/request", json={"phone_number": "3150003344"}).status_code == 200
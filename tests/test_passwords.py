@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+from app.config import settings
+from app.services.passwords import PasswordPool, password_pool, verify_password
+
+def slow_task(seconds):
+    time.sleep(seconds)
+    return seconds
+
+def test_verify_rehashes_deprecated_hash():
+    old_hash = bcrypt.using(rounds=4).hash("secreta123")
+    valid, new_hash = asyncio.run(verify_password("secreta123", old_hash))
+    assert valid
+    assert new_hash is not None and f"${settings.BCRYPT_ROUNDS:02d}$" in new_hash
+    assert asyncio.run(verify_password("otra", old_hash)) == (False, None)
+
+def test_pool_rejects_when_saturated():
+    pool = PasswordPool(workers=1, queue_size=0)
+
+    async def flood():
+        first = asyncio.ensure_future(pool.run(slow_task, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(slow_task, 0)
+        assert exc.value.status_code == 503
+        assert await first == 0.5
+
+    try:
+        asyncio.run(flood())
+    finally:
+        pool.shutdown()
+        password_pool.shutdown()
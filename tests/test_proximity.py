@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.api import routes as routes_api
+from app.api.auth import create_user_access_token
+from app.models import models
+from app.services.proximity import expand_degrees
+from app.services.route_geometry import geodesic_distance
+
+# Ruta norte-sur en Cali; el pasajero busca a ~400 m al oriente del trazado
+PATH_LON = -76.530
+ORIGIN = (-76.5264, 3.440)
+DESTINATION = (-76.5264, 3.400)
+
+def test_expanded_box_covers_the_radius_at_any_latitude():
+    for lat in (0.0, 3.45, -33.4, 60.0, 84.0):
+        for meters in (50, 500, 5000):
+            dx, dy = expand_degrees(lat, meters)
+            assert geodesic_distance(0, lat, 0, lat + dy) >= meters
+            assert geodesic_distance(0, lat, 0, lat - dy) >= meters
+            # La caja se ensancha en grados hacia el polo: el borde más alejado del ecuador manda
+            far = min(abs(lat) + dy, 90.0)
+            assert geodesic_distance(0, far, dx, far) >= meters
+
+def test_search_query_filters_in_meters_with_a_bounding_box():
+    query, _ = routes_api._trips_near(*ORIGIN, *DESTINATION, 500)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert sql.count("&& ST_Expand") == 4 and "AS geography" in sql
+
+def create_route(db: Session):
+    suffix = uuid.uuid4().hex[:8]
+    driver = models.User(full_name="Conductor Proximidad", phone_number=f"38{suffix}")
+    db.add(driver)
+    db.flush()
+    vehicle = models.Vehicle(owner_id=driver.id, brand="Kia", model="Picanto", color="Gris", license_plate=f"PRX{suffix}")
+    db.add(vehicle)
+    db.flush()
+    path = LineString([(PATH_LON, 3.46), (PATH_LON, 3.38)])
+    route = models.Route(
+        driver_id=driver.id, vehicle_id=vehicle.id,
+        departure_time=datetime.utcnow() + timedelta(hours=1),
+        estimated_arrival_time=datetime.utcnow() + timedelta(hours=2),
+        available_seats=3, price_per_km=500,
+        path=from_shape(path, srid=4326), path_coarse=from_shape(path, srid=4326),
+    )
+    db.add(route)
+    db.commit()
+    return route.id, {"Authorization": f"Bearer {create_user_access_token(driver)}"}
+
+def search_ids(client: TestClient, headers, buffer_meters: int):
+    response = client.get("/routes/search", headers=headers, params={
+        "from_lat": ORIGIN[1], "from_lon": ORIGIN[0], "to_lat": DESTINATION[1], "to_lon": DESTINATION[0],
+        "buffer_meters": buffer_meters,
+    })
+    assert response.status_code == 200
+    return {route["id"] for route in response.json()}
+
+def test_search_radius_is_in_meters(client: TestClient, db_session: Session):
+    """A ~400 m del trazado: entra con 500 m y no con 300 m (en grados entraría con cualquiera)."""
+    route_id, headers = create_route(db_session)
+    assert str(route_id) in search_ids(client, headers, 500)
+    assert str(route_id) not in search_ids(client, headers, 300)
+
+def plan_indexes(plan) -> set:
+    if isinstance(plan, list):
+        return set().union(*(plan_indexes(node) for node in plan)) if plan else set()
+    found = {plan["Index Name"]} if "Index Name" in plan else set()
+    return found.union(*(plan_indexes(node) for key, node in plan.items() if key in ("Plan", "Plans")))
+
+def test_search_plan_uses_the_gist_index(client: TestClient, db_session: Session):
+    """Regresión: un `::geography` sin prefiltro haría un Seq Scan de routes aunque se prohíba."""
+    for _ in range(20):
+        create_route(db_session)
+    db_session.execute(text("ANALYZE routes"))
+    query, _ = routes_api._trips_near(*ORIGIN, *DESTINATION, 500)
+    sql = query.compile(dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True})
+    # Sin seq scan permitido, el planificador sólo lo elige si ningún índice sirve al predicado
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    assert plan_indexes(plan) & {"idx_routes_path", "idx_routes_path_coarse"}
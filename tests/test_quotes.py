@@ -0,0 +1,60 @@
+import asyncio
+import uuid
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+
+from app.services.cache import TTLCache
+from app.services.quotes import quote_cache, quote_pairs, redeem_quote_token
+
+CALI_PATH = [(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]
+
+@pytest.fixture
+def route():
+    quote_cache.clear()
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        path=from_shape(LineString(CALI_PATH), srid=4326, extended=True),
+        price_per_km=Decimal("500.00"),
+    )
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3) # "b" es la menos usada
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.hits == 1 and cache.misses == 2
+
+def test_quotes_are_cached_by_snapped_points(route):
+    [first] = asyncio.run(quote_pairs(None, route, [(CALI_PATH[0], CALI_PATH[-1])]))
+    assert first.calculated_price == pytest.approx(2.082176 * 500, abs=0.01)
+
+    # Un desplazamiento por debajo de la rejilla de ajuste reutiliza la cotización
+    nearby = (CALI_PATH[0][0] + 1e-7, CALI_PATH[0][1])
+    [second] = asyncio.run(quote_pairs(None, route, [(nearby, CALI_PATH[-1])]))
+    assert second is first
+
+    # Cambiar la tarifa cambia la clave
+    route.price_per_km = Decimal("600.00")
+    [third] = asyncio.run(quote_pairs(None, route, [(CALI_PATH[0], CALI_PATH[-1])]))
+    assert third is not first
+    assert third.calculated_price == pytest.approx(2.082176 * 600, abs=0.01)
+
+def test_quote_token_is_bound_to_route_points_and_price(route):
+    [quote] = asyncio.run(quote_pairs(None, route, [(CALI_PATH[0], CALI_PATH[-1])]))
+    token = quote.quote_token
+
+    assert redeem_quote_token(token, route, CALI_PATH[0], CALI_PATH[-1]) == pytest.approx(quote.calculated_price)
+    assert redeem_quote_token(token, route, CALI_PATH[1], CALI_PATH[-1]) is None
+    assert redeem_quote_token("not-a-token", route, CALI_PATH[0], CALI_PATH[-1]) is None
+
+    route.price_per_km = Decimal("600.00")
+    assert redeem_quote_token(token, route, CALI_PATH[0], CALI_PATH[-1]) is None
@@ -0,0 +1,112 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, create_engine, update
+from sqlalchemy.orm import Session, declarative_base
+
+from app.api import auth
+from app.db import recent_writers, wrote_recently
+from app.services import read_after_write
+from app.services.read_after_write import ReadAfterWriteMiddleware, make_marker, valid_marker
+
+LocalBase = declarative_base()
+
+class Counter(LocalBase):
+    __tablename__ = "counters"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, default=0)
+
+def make_session(user_id=None):
+    engine = create_engine("sqlite://")
+    LocalBase.metadata.create_all(engine)
+    session = Session(engine)
+    if user_id is not None:
+        session.info["user_id"] = user_id
+    return session
+
+def test_commit_with_writes_pins_user_to_primary():
+    recent_writers.clear()
+    user_id = str(uuid.uuid4())
+    session = make_session(user_id)
+    session.add(Counter(id=1))
+    session.commit()
+    assert wrote_recently(user_id)
+
+    other = str(uuid.uuid4())
+    session = make_session(other)
+    session.execute(update(Counter).values(value=2))
+    session.commit()
+    assert wrote_recently(other)
+
+def test_reads_and_rollbacks_do_not_pin_user():
+    recent_writers.clear()
+    user_id = str(uuid.uuid4())
+    session = make_session(user_id)
+    session.get(Counter, 1)
+    session.commit()
+    session.add(Counter(id=2))
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert not wrote_recently(user_id)
+
+def test_marker_is_signed_bound_to_the_user_and_expires():
+    user_id = str(uuid.uuid4())
+    marker = make_marker(user_id, now=1000.0)
+    assert valid_marker(marker, user_id, now=1004.0)
+    assert not valid_marker(marker, uuid.uuid4(), now=1004.0)
+    assert not valid_marker(marker, user_id, now=1010.0)
+    # Alargar el vencimiento invalida la firma
+    marker_user, expires, signature = marker.rsplit(".", 2)
+    assert not valid_marker(f"{marker_user}.{int(expires) + 3600}.{signature}", user_id, now=1004.0)
+    assert not valid_marker("basura", user_id) and not valid_marker(None, user_id)
+
+def replica_read(request, user_id):
+    """Qué sesión daría get_read_db: la del primario ("primary") o la de la réplica."""
+    async def read():
+        reads = auth.get_read_db(request, SimpleNamespace(id=user_id), "primary")
+        session = await reads.__anext__()
+        await reads.aclose()
+        return session
+    return asyncio.run(read())
+
+class ReplicaSession:
+    async def __aenter__(self):
+        return "replica"
+
+    async def __aexit__(self, *exc):
+        return False
+
+def test_marker_keeps_the_writer_on_the_primary_in_another_worker(monkeypatch):
+    """Regresión: el registro por proceso no servía si la lectura llegaba a otro worker."""
+    recent_writers.clear()
+    user_id = str(uuid.uuid4())
+    app = FastAPI()
+    app.add_middleware(ReadAfterWriteMiddleware)
+
+    @app.post("/counters")
+    def write():
+        session = make_session(user_id)
+        session.add(Counter(id=1))
+        session.commit()
+        return {}
+
+    @app.get("/counters")
+    def read():
+        make_session(user_id).get(Counter, 1)
+        return {}
+
+    assert read_after_write.HEADER not in TestClient(app).get("/counters").headers
+    response = TestClient(app).post("/counters")
+    marker = response.headers[read_after_write.HEADER]
+    assert response.cookies[read_after_write.COOKIE] == marker and valid_marker(marker, user_id)
+
+    # Otro worker: no vio la escritura, pero el cliente trae la marca (cabecera o cookie)
+    recent_writers.clear()
+    monkeypatch.setattr(auth, "ReadSessionLocal", ReplicaSession)
+    assert replica_read(SimpleNamespace(headers={}, cookies={}), user_id) == "replica"
+    assert replica_read(SimpleNamespace(headers={read_after_write.HEADER: marker}, cookies={}), user_id) == "primary"
+    assert replica_read(SimpleNamespace(headers={}, cookies={read_after_write.COOKIE: marker}), user_id) == "primary"
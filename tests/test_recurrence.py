@@ -0,0 +1,109 @@
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.db import async_database_url
+from app.models import models
+from app.services import recurrence, seats
+from app.services.recurrence import occurrence_departures
+from app.services.route_index import RouteIndex
+
+CALI_PATH = [(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]
+# Lunes 5 de octubre de 2026, 7:00 UTC
+FIRST = datetime(2026, 10, 5, 7, 0)
+WEEKDAYS = {"weekdays": [0, 1, 2, 3, 4]}
+
+def test_weekday_pattern():
+    departures = list(occurrence_departures(FIRST, WEEKDAYS, FIRST, FIRST + timedelta(days=14)))
+    assert len(departures) == 10
+    assert all(d.weekday() < 5 and d.time() == FIRST.time() for d in departures)
+
+def test_interval_until_and_exceptions():
+    pattern = {"weekdays": [0], "interval_weeks": 2, "until": "2026-11-30", "exceptions": ["2026-11-02"]}
+    departures = list(occurrence_departures(FIRST, pattern, FIRST, FIRST + timedelta(days=365)))
+    assert [d.date() for d in departures] == [date(2026, 10, 5), date(2026, 10, 19), date(2026, 11, 16), date(2026, 11, 30)]
+
+def test_nothing_before_first_departure():
+    departures = list(occurrence_departures(FIRST, WEEKDAYS, FIRST - timedelta(days=7), FIRST + timedelta(hours=1)))
+    assert departures == [FIRST]
+
+def test_incremental_expansion_matches_full_expansion():
+    """Expandir por tramos [a, b) + [b, c) da lo mismo que expandir [a, c) de una vez."""
+    end = FIRST + timedelta(days=60)
+    full = list(occurrence_departures(FIRST, WEEKDAYS, FIRST, end))
+    cuts = [FIRST, FIRST + timedelta(days=3, hours=5), FIRST + timedelta(days=17), end]
+    pieces = [d for a, b in zip(cuts, cuts[1:]) for d in occurrence_departures(FIRST, WEEKDAYS, a, b)]
+    assert pieces == full
+    # Las horas con zona horaria se normalizan a UTC
+    aware = datetime(2026, 10, 5, 2, 0, tzinfo=timezone(timedelta(hours=-5)))
+    assert list(occurrence_departures(aware, WEEKDAYS, FIRST, end)) == full
+
+def test_index_returns_occurrences_in_window():
+    index = RouteIndex()
+    index.upsert("weekly", CALI_PATH, 3, True, FIRST, is_recurrent=True)
+    for day in range(7):
+        index.upsert_occurrence(f"o{day}", "weekly", FIRST + timedelta(days=day), 3, "active")
+    index.update_availability("o2", 0, "full")
+
+    found = index.search(
+        -76.536, 3.421, -76.520, 3.430, 500,
+        departure_after=FIRST + timedelta(days=1), departure_before=FIRST + timedelta(days=4),
+    )
+    # Se devuelven las ocurrencias (no la plantilla) y no las llenas
+    assert found == ["o1", "o3"]
+    assert index.locate("o1", -76.53676, 3.42158)[0] == 0.0
+    index.remove("weekly")
+    assert index.get("o1") is None
+
+def test_occurrences_have_their_own_seats(client: TestClient, db_session: Session):
+    suffix = uuid.uuid4().hex[:8]
+    driver = models.User(full_name="Conductor Recurrente", phone_number=f"38{suffix}")
+    db_session.add(driver)
+    db_session.flush()
+    vehicle = models.Vehicle(owner_id=driver.id, brand="Kia", model="Picanto", color="Gris", license_plate=f"REC{suffix}")
+    db_session.add(vehicle)
+    db_session.flush()
+    first = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    route = models.Route(
+        driver_id=driver.id, vehicle_id=vehicle.id,
+        departure_time=first, estimated_arrival_time=first + timedelta(minutes=40),
+        available_seats=3, price_per_km=500, is_recurrent=True,
+        recurrence_pattern={"weekdays": list(range(7))},
+        path=from_shape(LineString(CALI_PATH), srid=4326),
+    )
+    db_session.add(route)
+    db_session.commit()
+
+    async def expand_and_reserve():
+        engine = create_async_engine(async_database_url(os.environ["TEST_DATABASE_URL"]))
+        try:
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            async with session_factory() as db:
+                inserted = await recurrence.extend_window(db)
+                await db.commit()
+            async with session_factory() as db:
+                # Extender otra vez no genera nada nuevo
+                again = await recurrence.extend_window(db)
+                await db.commit()
+            async with session_factory() as db:
+                occurrence_id = sorted(inserted, key=lambda row: row.departure_time)[0].id
+                reserved = await seats.reserve_seat(db, route.id, occurrence_id)
+                await db.commit()
+            return inserted, again, occurrence_id, reserved
+        finally:
+            await engine.dispose()
+
+    inserted, again, occurrence_id, reserved = asyncio.run(expand_and_reserve())
+    assert len([row for row in inserted if row.route_id == route.id]) == 14
+    assert [row for row in again if row.route_id == route.id] == []
+    assert reserved == (2, models.RouteStatus.active)
+    db_session.expire_all()
+    assert db_session.get(models.RouteOccurrence, occurrence_id).available_seats == 2
+    assert db_session.get(models.Route, route.id).available_seats == 3
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from shapely import wkb
+from shapely.geometry import LineString
+
+from app.services.route_geometry import RouteGeometry, RouteGeometryCache, decode_linestring
+
+# Misma ruta de Cali que usa test_full_flow
+CALI_PATH = [(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]
+
+# Valores de referencia calculados con GeographicLib (el mismo algoritmo que usa
+# ST_Length(::geography) en PostGIS) sobre las sub-líneas de ST_LineSubstring.
+FULL_LENGTH_M = 2082.175995484409
+PARTIAL_LENGTH_M = 1062.8958785098687
+
+def test_decode_ewkb_and_iso_wkb():
+    line = LineString(CALI_PATH)
+    assert np.allclose(decode_linestring(wkb.dumps(line, srid=4326)), CALI_PATH)
+    assert np.allclose(decode_linestring(wkb.dumps(line, big_endian=True)), CALI_PATH)
+    with_z = LineString([(x, y, 1000.0) for x, y in CALI_PATH])
+    assert np.allclose(decode_linestring(wkb.dumps(with_z, srid=4326)), CALI_PATH)
+
+def test_full_route_length_matches_postgis_within_centimeters():
+    geometry = RouteGeometry(CALI_PATH)
+    assert geometry.length_meters == pytest.approx(FULL_LENGTH_M, abs=0.01)
+    km = geometry.distances_km([CALI_PATH[0]], [CALI_PATH[-1]])
+    assert km[0] * 1000 == pytest.approx(FULL_LENGTH_M, abs=0.01)
+
+def test_fractions_and_partial_length():
+    geometry = RouteGeometry(CALI_PATH)
+    fractions = geometry.locate([(-76.533, 3.4225), (-76.525, 3.4279)])
+    assert fractions == pytest.approx([0.201020522577651, 0.7114939079413313], abs=1e-12)
+
+    # El orden de recogida/bajada no cambia la distancia (LEAST/GREATEST)
+    km = geometry.distances_km([(-76.533, 3.4225), (-76.525, 3.4279)], [(-76.525, 3.4279), (-76.533, 3.4225)])
+    assert km * 1000 == pytest.approx([PARTIAL_LENGTH_M, PARTIAL_LENGTH_M], abs=0.01)
+
+def test_same_point_has_zero_distance():
+    geometry = RouteGeometry(CALI_PATH)
+    assert geometry.distances_km([(-76.53, 3.425)], [(-76.53, 3.425)])[0] == pytest.approx(0.0, abs=1e-9)
+
+def test_cache_reuses_and_invalidates_on_path_change():
+    cache = RouteGeometryCache(maxsize=2)
+    data = wkb.dumps(LineString(CALI_PATH), srid=4326)
+    first = cache.get("r1", data)
+    assert cache.get("r1", data) is first
+
+    changed = wkb.dumps(LineString(CALI_PATH[:2]), srid=4326)
+    assert cache.get("r1", changed) is not first
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.api.auth import create_user_access_token
+from app.models import models
+from app.services.route_import import RouteImporter, iter_feature_collection, iter_ndjson
+
+CALI_PATH = [[-76.53676, 3.42158], [-76.53000, 3.42500], [-76.52000, 3.43000]]
+
+def route_row(vehicle_id, **overrides):
+    row = {
+        "vehicle_id": str(vehicle_id),
+        "departure_time": "2026-05-01T08:00:00Z",
+        "estimated_arrival_time": "2026-05-01T09:00:00Z",
+        "available_seats": 3,
+        "price_per_km": 400.0,
+        "path": {"type": "LineString", "coordinates": CALI_PATH},
+    }
+    row.update(overrides)
+    return row
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def read_all(records):
+    async def collect():
+        return [record async for record in records]
+    return asyncio.run(collect())
+
+def test_feature_collection_is_read_incrementally():
+    vehicle_id = uuid.uuid4()
+    features = [
+        {"type": "Feature", "id": f"r{i}", "geometry": {"type": "LineString", "coordinates": CALI_PATH},
+         "properties": {**route_row(vehicle_id), "path": None, "note": "ñandú"}}
+        for i in range(4)
+    ]
+    document = json.dumps({"type": "FeatureCollection", "crs": {"features": []}, "features": features}).encode()
+    # Bloques de cualquier tamaño, incluso cortando caracteres UTF-8 a la mitad
+    for size in (1, 7, 64, len(document)):
+        records = read_all(iter_feature_collection(_chunks(document, size)))
+        assert [(row, feature["id"], error) for row, feature, error in records] == [
+            (1, "r0", None), (2, "r1", None), (3, "r2", None), (4, "r3", None)
+        ]
+    truncated = read_all(iter_feature_collection(_chunks(document[:-40], 64)))
+    assert truncated[-1][1] is None and truncated[-1][2] is not None
+
+def test_ndjson_reports_bad_lines_by_line_number():
+    data = b'{"a": 1}\n\n{"a": \n{"b": 2}'
+    records = read_all(iter_ndjson(_chunks(data, 3)))
+    assert [(row, obj) for row, obj, _ in records] == [(1, {"a": 1}), (3, None), (4, {"b": 2})]
+    assert records[1][2].startswith("Invalid JSON")
+
+def test_prepare_validates_each_row():
+    vehicle_id = uuid.uuid4()
+    importer = RouteImporter(db=None, driver_id=uuid.uuid4())
+    importer.vehicle_ids = {vehicle_id}
+    importer.default_price = 350.0
+
+    item = importer.prepare(1, route_row(vehicle_id, price_per_km=None, ref="A-1"))
+    assert item.values["price_per_km"] == 350.0
+    assert item.values["departure_time"].tzinfo is None
+    assert item.stops[0][2] == 0.0 and item.stops[-1][2] == 1.0
+
+    assert importer.prepare(2, route_row(uuid.uuid4())) is None
+    assert importer.prepare(3, route_row(vehicle_id, available_seats="muchos")) is None
+    assert importer.prepare(4, route_row(vehicle_id, path={"type": "LineString", "coordinates": [[-76.5, 3.4]]})) is None
+    assert [(error["row"], error["detail"].split(":")[0]) for error in importer.report.errors] == [
+        (2, "Vehicle not found or does not belong to the current user"),
+        (3, "available_seats"),
+        (4, "path must have at least two [lon, lat] positions"),
+    ]
+
+def test_bulk_endpoint_creates_valid_rows_and_reports_the_rest(client: TestClient, db_session: Session):
+    suffix = uuid.uuid4().hex[:8]
+    driver = models.User(full_name="Flota Corporativa", phone_number=f"37{suffix}")
+    db_session.add(driver)
+    db_session.flush()
+    vehicle = models.Vehicle(owner_id=driver.id, brand="Mercedes", model="Sprinter", color="Blanco", license_plate=f"BLK{suffix}")
+    db_session.add(vehicle)
+    db_session.commit()
+
+    body = "\n".join([
+        json.dumps(route_row(vehicle.id, ref="ok-1")),
+        json.dumps(route_row(uuid.uuid4(), ref="other-vehicle")),
+        "{not json",
+        json.dumps(route_row(vehicle.id, ref="ok-2", recurrence={"weekdays": [0, 1, 2, 3, 4]})),
+    ])
+    response = client.post(
+        "/routes/bulk",
+        headers={"Authorization": f"Bearer {create_user_access_token(driver)}", "Content-Type": "application/x-ndjson"},
+        content=body,
+    )
+    assert response.status_code == 200, response.json()
+    report = response.json()
+    assert (report["received"], report["created"], report["failed"]) == (4, 2, 2)
+    assert [(error["row"], error["ref"]) for error in report["errors"]] == [(2, "other-vehicle"), (3, None)]
+
+    routes = db_session.query(models.Route).filter_by(driver_id=driver.id).all()
+    assert len(routes) == 2
+    assert {route.start_city for route in routes} == {"Cali"}
+    assert all(route.stops for route in routes)
+    recurrent = next(route for route in routes if route.is_recurrent)
+    assert recurrent.materialized_until is not None and recurrent.occurrences
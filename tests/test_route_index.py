@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+import uuid
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+
+from app.api.auth import create_user_access_token
+from app.config import settings
+from app.api import routes
+from app.main import app
+from app.models import models
+from app.services import matching, recurrence
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.route_index import RouteIndex, load_route_index
+
+# Misma ruta de Cali que usa test_full_flow
+CALI_PATH = [(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]
+
+def test_search_finds_route_near_both_points():
+    index = RouteIndex()
+    index.upsert("r1", CALI_PATH, available_seats=2, is_active=True)
+
+    assert index.search(-76.536, 3.421, -76.520, 3.430, 500) == ["r1"]
+    # Destino a ~5 km de la ruta
+    assert index.search(-76.536, 3.421, -76.480, 3.430, 500) == []
+
+def test_radius_is_in_meters():
+    index = RouteIndex()
+    index.upsert("r1", CALI_PATH, available_seats=2, is_active=True)
+
+    # Un punto ~330 m al sur del primer vértice (la ruta avanza hacia el noreste)
+    distances = index.near(-76.53676, 3.41858, 1000)
+    assert 300 < distances["r1"] < 360
+    assert index.near(-76.53676, 3.41858, 200) == {}
+
+def test_full_or_inactive_routes_are_not_returned():
+    index = RouteIndex()
+    index.upsert("r1", CALI_PATH, available_seats=1, is_active=True)
+
+    index.update_availability("r1", 0, "active")
+    assert index.search(-76.536, 3.421, -76.520, 3.430, 500) == []
+
+    index.update_availability("r1", 1, "cancelled")
+    assert index.search(-76.536, 3.421, -76.520, 3.430, 500) == []
+
+    index.update_availability("r1", 1, "active")
+    index.remove("r1")
+    assert len(index) == 0
+    assert index.search(-76.536, 3.421, -76.520, 3.430, 500) == []
+
+class FakeQuery:
+    """`db.query(...).filter(status IN (...)).yield_per(n)` sobre filas en memoria."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, criterion):
+        statuses = {getattr(status, "value", status) for status in criterion.right.value}
+        return FakeQuery([row for row in self.rows if row.status in statuses])
+
+    def yield_per(self, count):
+        return iter(self.rows)
+
+def test_routes_full_at_startup_come_back_when_a_seat_is_released():
+    """Regresión: el índice sólo cargaba las activas y las llenas nunca volvían a aparecer."""
+    path = from_shape(LineString(CALI_PATH), srid=4326)
+    route = lambda route_id, status: SimpleNamespace(id=route_id, path=path, available_seats=0 if status == "full" else 2,
+                                                     status=status, departure_time=None, is_recurrent=False)
+    queries = [FakeQuery([route("full", "full"), route("active", "active"), route("cancelled", "cancelled")]), FakeQuery([])]
+    index = RouteIndex()
+    assert load_route_index(SimpleNamespace(query=lambda *columns: queries.pop(0)), index) == 2
+    assert index.search(-76.536, 3.421, -76.520, 3.430, 500) == ["active"]
+
+    # release_seats: full -> active
+    index.update_availability("full", 1, "active")
+    assert sorted(index.search(-76.536, 3.421, -76.520, 3.430, 500)) == ["active", "full"]
+
+def stale_index(monkeypatch):
+    """Índice con tres viajes activos, de los que "first" ya se llenó en la BD."""
+    index = RouteIndex()
+    for hour, trip_id in enumerate(["first", "second", "third"]):
+        index.upsert(trip_id, CALI_PATH, 2, True, datetime(2026, 5, 1, 6 + hour, 0, tzinfo=timezone.utc))
+    rows = {trip_id: SimpleNamespace(id=trip_id, available_seats=2, status="active") for trip_id in ["second", "third"]}
+    rows["first"] = SimpleNamespace(id="first", available_seats=0, status="full")
+
+    async def load_trips(db, trip_ids):
+        return {trip_id: rows[trip_id] for trip_id in trip_ids}
+
+    monkeypatch.setattr(routes, "route_index", index)
+    monkeypatch.setattr(matching, "route_index", index)
+    monkeypatch.setattr(recurrence, "load_trips", load_trips)
+    monkeypatch.setattr(matching, "load_trips", load_trips)
+    return index
+
+def test_search_with_stale_index_skips_trips_that_are_no_longer_bookable(monkeypatch):
+    index = stale_index(monkeypatch)
+    found = asyncio.run(routes._search_with_index(None, -76.536, 3.421, -76.520, 3.430, 500, None, None, None, 2))
+    # La página se llena con las siguientes candidatas y el índice se corrige
+    assert [trip.id for trip in found] == ["second", "third"]
+    assert sorted(index.search(-76.536, 3.421, -76.520, 3.430, 500)) == ["second", "third"]
+
+def test_match_with_stale_index_skips_trips_that_are_no_longer_bookable(monkeypatch):
+    stale_index(monkeypatch)
+    desired = datetime(2026, 5, 1, 6, 0, tzinfo=timezone.utc)
+    found = asyncio.run(matching._match_with_index(None, -76.536, 3.421, -76.520, 3.430, 500, desired, 2, None, None))
+    assert [match.route.id for match in found] == ["second", "third"]
+
+def test_departure_window():
+    index = RouteIndex()
+    index.upsert("early", CALI_PATH, 2, True, datetime(2026, 5, 1, 6, 0))
+    index.upsert("late", CALI_PATH, 2, True, datetime(2026, 5, 1, 9, 0, tzinfo=timezone.utc))
+
+    found = index.search(
+        -76.536, 3.421, -76.520, 3.430, 500,
+        departure_after=datetime(2026, 5, 1, 7, 0, tzinfo=timezone.utc),
+        departure_before=datetime(2026, 5, 1, 12, 0),
+    )
+    assert found == ["late"]
+
+def test_cursor_roundtrip():
+    route_id = uuid.uuid4()
+    cursor = encode_cursor(datetime(2026, 5, 1, 8, 0), route_id)
+    assert decode_cursor(cursor) == (datetime(2026, 5, 1, 8, 0, tzinfo=timezone.utc), route_id)
+
+def test_direction_is_respected():
+    index = RouteIndex()
+    index.upsert("r1", CALI_PATH, available_seats=2, is_active=True)
+
+    # La ruta va de A a B: un pasajero que va de B a A no debe emparejarse
+    assert index.search(-76.520, 3.430, -76.536, 3.421, 500) == []
+
+    fraction, distance, lon, lat = index.locate("r1", -76.53000, 3.42500)
+    assert 0.3 < fraction < 0.5
+    assert distance < 1
+    assert (lon, lat) == pytest.approx((-76.53000, 3.42500))
+
+@pytest.mark.parametrize("path", ["/routes/search", "/routes/match", "/routes/journeys"])
+@pytest.mark.parametrize("buffer_meters", [0, -500, 10_000_000])
+def test_buffer_meters_is_bounded(monkeypatch, path, buffer_meters):
+    """Las celdas recorridas crecen con el cuadrado del radio: un radio enorme bloquearía el worker."""
+    monkeypatch.setattr(settings, "AUTH_STATELESS_TOKENS", True)
+    user = models.User(id=uuid.uuid4(), full_name="Ana", phone_number="3000000000", role=models.UserRole.user)
+    response = TestClient(app).get(path, headers={"Authorization": f"Bearer {create_user_access_token(user)}"}, params={
+        "from_lat": 3.421, "from_lon": -76.536, "to_lat": 3.430, "to_lon": -76.520, "buffer_meters": buffer_meters,
+    })
+    assert response.status_code == 422
@@ -0,0 +1,197 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.api import routes as routes_api
+from app.services.geolocation import geohash, geohash_center
+from app.services.route_geometry import geodesic_distance
+from app.services.search_cache import SearchCache
+
+# Cali: de San Antonio a Ciudad Jardín, sobre una ruta recta norte-sur
+PATH = [(-76.540, 3.460), (-76.535, 3.420), (-76.530, 3.380)]
+ORIGIN = (-76.5394, 3.4552)
+DESTINATION = (-76.5311, 3.3862)
+DEPARTURE = datetime(2026, 10, 20, 7, 30, tzinfo=timezone.utc)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_cache(clock=None, max_results=100):
+    return SearchCache(maxsize=100, ttl=60, precision=7, bucket_seconds=900, max_results=max_results,
+                       clock=clock or FakeClock())
+
+def corridor_key(cache, origin=ORIGIN, destination=DESTINATION, buffer_meters=500):
+    return cache.key(*origin, *destination, buffer_meters, departure_after=DEPARTURE - timedelta(hours=1))
+
+def trip(route_id=None, trip_id=None, bookable=True, departure=DEPARTURE):
+    route_id = route_id or uuid.uuid4()
+    return (departure, trip_id or route_id, route_id, bookable)
+
+def test_geohash_center_round_trips():
+    code = geohash(3.4516, -76.5320, 7)
+    lat, lon = geohash_center(code)
+    assert geohash(lat, lon, 7) == code
+    assert abs(lat - 3.4516) < 0.001 and abs(lon - -76.5320) < 0.001
+
+def test_corridor_radius_covers_every_point_of_the_cells():
+    cache = make_cache()
+    key = corridor_key(cache)
+    center_lon, center_lat = cache.points(key)[:2]
+    half = 180 / 2 ** 18 * 0.999  # media celda con precisión 7 (17-18 bits por eje), por dentro
+    for corner_lon, corner_lat in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+        lon, lat = center_lon + corner_lon * half, center_lat + corner_lat * half
+        assert geohash(lat, lon, 7) == key[0]
+        assert geodesic_distance(lon, lat, center_lon, center_lat) + 500 <= cache.corridor_meters(key)
+    assert 100 < cache.corridor_meters(key) - 500 < 120
+
+def test_nearby_searches_share_a_corridor_and_time_bucket():
+    cache = make_cache()
+    key = corridor_key(cache)
+    assert cache.key(ORIGIN[0] + 0.0001, ORIGIN[1], *DESTINATION, 500, DEPARTURE - timedelta(minutes=55)) == key
+    assert cache.key(*ORIGIN, *DESTINATION, 800, DEPARTURE - timedelta(hours=1)) != key
+    after, before = cache.window(key)
+    assert after <= DEPARTURE - timedelta(hours=1) < after + timedelta(seconds=900) and before is None
+
+def test_entries_expire_and_count_hits():
+    clock = FakeClock()
+    cache = make_cache(clock)
+    key = corridor_key(cache)
+    assert cache.get(key) is None
+    cache.set(key, [trip()])
+    assert len(cache.get(key).trips) == 1
+    clock.now += 61
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses, cache.hit_ratio) == (1, 2, 1 / 3)
+
+def test_large_corridors_are_only_marked_incomplete():
+    cache = make_cache(max_results=2)
+    entry = cache.set(corridor_key(cache), [trip() for _ in range(3)])
+    assert not entry.complete and entry.trips == []
+
+def test_availability_changes_invalidate_only_the_route_corridors():
+    cache = make_cache()
+    route_id, other_route_id = uuid.uuid4(), uuid.uuid4()
+    key = corridor_key(cache)
+    other_key = corridor_key(cache, buffer_meters=800)
+    cache.set(key, [trip(route_id), trip(other_route_id)])
+    cache.set(other_key, [trip(other_route_id)])
+
+    assert cache.update_availability(route_id, route_id, 2, "active") == 0  # sigue reservable
+    assert cache.update_availability(route_id, route_id, 0, "full") == 1
+    assert cache.get(key) is None and cache.get(other_key) is not None
+    assert cache.invalidations == 1
+
+def test_full_trips_are_cached_so_released_seats_invalidate():
+    cache = make_cache()
+    route_id = uuid.uuid4()
+    key = corridor_key(cache)
+    cache.set(key, [trip(route_id, bookable=False)])
+    assert cache.update_availability(route_id, route_id, 1, "active") == 1
+    assert cache.get(key) is None
+
+def test_new_routes_invalidate_corridors_they_serve():
+    cache = make_cache()
+    served = corridor_key(cache)
+    reversed_direction = corridor_key(cache, origin=DESTINATION, destination=ORIGIN)
+    far_away = corridor_key(cache, origin=(-76.60, 3.45), destination=(-76.60, 3.39))
+    for key in (served, reversed_direction, far_away):
+        cache.set(key, [])
+
+    # Sale antes de la ventana: no cambia ningún corredor
+    assert cache.route_added(PATH, [DEPARTURE - timedelta(days=1)]) == 0
+    assert cache.route_added(PATH, [DEPARTURE]) == 1
+    assert cache.get(served) is None
+    assert cache.get(reversed_direction) is not None and cache.get(far_away) is not None
+
+def test_entries_computed_before_a_new_route_are_not_stored():
+    cache = make_cache()
+    generation = cache.generation
+    cache.route_added(PATH, [DEPARTURE])
+    cache.set(corridor_key(cache), [trip()], generation)
+    assert len(cache) == 0
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = 0
+
+    async def execute(self, statement):
+        self.executed += 1
+        return list(self.rows)
+
+def test_search_pages_from_the_cache_and_drops_stale_trips(monkeypatch):
+    cache = make_cache()
+    monkeypatch.setattr(routes_api, "search_cache", cache)
+    route_ids = [uuid.uuid4() for _ in range(4)]
+    rows = [
+        SimpleNamespace(departure_time=(DEPARTURE + timedelta(minutes=i)).replace(tzinfo=None), trip_id=route_id,
+                        route_id=route_id, available_seats=0 if i == 1 else 2, status="full" if i == 1 else "active")
+        for i, route_id in enumerate(route_ids)
+    ]
+    # En la BD la tercera ya se llenó (en otro worker), pero la caché aún no lo sabe
+    current = {row.trip_id: SimpleNamespace(id=row.trip_id, available_seats=0 if i == 2 else 2, status="active")
+               for i, row in enumerate(rows)}
+
+    async def load_trips(db, trip_ids):
+        return {trip_id: current[trip_id] for trip_id in trip_ids}
+
+    async def routes_near(db, route_ids, *args):
+        return set(route_ids)
+
+    monkeypatch.setattr(routes_api.recurrence, "load_trips", load_trips)
+    monkeypatch.setattr(routes_api, "_routes_near", routes_near)
+    db = FakeDB(rows)
+
+    async def search():
+        return await routes_api._search_with_cache(
+            db, *ORIGIN, *DESTINATION, 500, DEPARTURE - timedelta(hours=1), None, None, 2
+        )
+
+    first = asyncio.run(search())
+    assert [found.id for found in first] == [route_ids[0], route_ids[3]]
+    assert cache.stale_served == 1 and len(cache) == 0  # el corredor se descartó al detectarlo
+
+    # La siguiente búsqueda vuelve a consultar el corredor y las demás salen de la caché
+    rows[2].available_seats, rows[2].status = 0, "full"
+    for _ in range(2):
+        assert [found.id for found in asyncio.run(search())] == [route_ids[0], route_ids[3]]
+    assert db.executed == 2 and (cache.hits, cache.misses, cache.stale_served) == (1, 2, 1)
+
+def test_cached_corridor_is_rechecked_against_the_exact_points(monkeypatch):
+    """Regresión: el corredor se consultaba desde el centro de la celda con el radio pedido."""
+    cache = make_cache()
+    monkeypatch.setattr(routes_api, "search_cache", cache)
+    near_id, far_id = uuid.uuid4(), uuid.uuid4()
+    rows = [
+        SimpleNamespace(departure_time=(DEPARTURE + timedelta(minutes=i)).replace(tzinfo=None), trip_id=route_id,
+                        route_id=route_id, available_seats=2, status="active")
+        for i, route_id in enumerate([far_id, near_id])
+    ]
+    radii, checked = [], []
+    trips_near = routes_api._trips_near
+
+    def record_trips_near(*args):
+        radii.append(args[-1])
+        return trips_near(*args)
+
+    async def routes_near(db, route_ids, from_lon, from_lat, to_lon, to_lat, buffer_meters):
+        checked.append(((from_lon, from_lat, to_lon, to_lat), buffer_meters, set(route_ids)))
+        return {near_id} & set(route_ids)  # la otra pasa a más de 500 m del punto pedido
+
+    async def load_trips(db, trip_ids):
+        return {trip_id: SimpleNamespace(id=trip_id, available_seats=2, status="active") for trip_id in trip_ids}
+
+    monkeypatch.setattr(routes_api, "_trips_near", record_trips_near)
+    monkeypatch.setattr(routes_api, "_routes_near", routes_near)
+    monkeypatch.setattr(routes_api.recurrence, "load_trips", load_trips)
+    found = asyncio.run(routes_api._search_with_cache(
+        FakeDB(rows), *ORIGIN, *DESTINATION, 500, DEPARTURE - timedelta(hours=1), None, None, 2
+    ))
+    assert [trip.id for trip in found] == [near_id]
+    assert radii == [cache.corridor_meters(corridor_key(cache))]
+    assert checked == [((*ORIGIN, *DESTINATION), 500, {far_id, near_id})]
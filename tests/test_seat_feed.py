@@ -0,0 +1,128 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.services.seat_feed import SLOW_CONSUMER_CLOSE_CODE, SeatFeed, seat_update, serve
+
+ROUTE_ID = str(uuid.uuid4())
+OCCURRENCE_ID = str(uuid.uuid4())
+
+class FakeWebSocket:
+    """Lo mínimo que usa `serve`: mensajes del cliente en una cola, envíos y cierre registrados."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.closed_with = None
+
+    async def receive_text(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect(1000)
+        return message
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    def send(self, **message):
+        self.incoming.put_nowait(json.dumps(message))
+
+async def no_snapshot(ids):
+    return []
+
+def test_flush_coalesces_updates_per_trip_and_fans_out_occurrences():
+    feed = SeatFeed()
+    by_route, by_occurrence, other = feed.connect(), feed.connect(), feed.connect()
+    feed.subscribe(by_route, [ROUTE_ID])
+    feed.subscribe(by_occurrence, [OCCURRENCE_ID])
+    feed.subscribe(other, [str(uuid.uuid4())])
+
+    feed.publish(seat_update(ROUTE_ID, OCCURRENCE_ID, 3, "active"))
+    feed.publish(seat_update(ROUTE_ID, OCCURRENCE_ID, 2, "active"))
+    assert feed.flush() == 2
+
+    expected = [{"type": "seats", "updates": [seat_update(ROUTE_ID, OCCURRENCE_ID, 2, "active")]}]
+    assert by_route.drain() == expected
+    assert by_occurrence.drain() == expected
+    assert other.drain() == []
+    assert feed.flush() == 0
+
+def test_serve_subscribes_sends_snapshot_and_updates():
+    feed = SeatFeed()
+    websocket = FakeWebSocket()
+
+    async def snapshot(ids):
+        return [seat_update(ROUTE_ID, None, 4, "active")]
+
+    async def scenario():
+        task = asyncio.create_task(serve(websocket, feed, snapshot, max_ids=10, send_timeout=1))
+        websocket.send(action="subscribe", ids=[ROUTE_ID])
+        await asyncio.sleep(0.01)
+        feed.publish(seat_update(ROUTE_ID, None, 3, "active"))
+        feed.flush()
+        await asyncio.sleep(0.01)
+        websocket.send(action="unsubscribe", ids=[ROUTE_ID])
+        await asyncio.sleep(0.01)
+        feed.publish(seat_update(ROUTE_ID, None, 0, "full"))
+        feed.flush()
+        websocket.incoming.put_nowait(None)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert websocket.sent == [
+        {"type": "subscribed", "ids": [ROUTE_ID]},
+        {"type": "seats", "updates": [seat_update(ROUTE_ID, None, 4, "active")]},
+        {"type": "seats", "updates": [seat_update(ROUTE_ID, None, 3, "active")]},
+        {"type": "unsubscribed", "ids": [ROUTE_ID]},
+    ]
+    assert len(feed) == 0
+
+def test_serve_rejects_bad_messages_and_too_many_ids():
+    feed = SeatFeed()
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        task = asyncio.create_task(serve(websocket, feed, no_snapshot, max_ids=1, send_timeout=1))
+        websocket.incoming.put_nowait("not json")
+        websocket.send(action="subscribe", ids=["not-a-uuid"])
+        websocket.send(action="subscribe", ids=[ROUTE_ID, OCCURRENCE_ID])
+        await asyncio.sleep(0.01)
+        websocket.incoming.put_nowait(None)
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert [message["type"] for message in websocket.sent] == ["error", "error", "error"]
+    assert websocket.sent[-1]["detail"] == "At most 1 ids per connection"
+
+def test_slow_subscriber_is_disconnected():
+    feed = SeatFeed(max_pending=2)
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        task = asyncio.create_task(serve(websocket, feed, no_snapshot, max_ids=10, send_timeout=1))
+        await asyncio.sleep(0)
+        subscriber = next(iter(feed._subscribers))
+        feed.subscribe(subscriber, [ROUTE_ID])
+        # Tres ocurrencias distintas sin que el escritor alcance a enviar
+        for _ in range(3):
+            subscriber.offer(seat_update(ROUTE_ID, uuid.uuid4(), 1, "active"))
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert websocket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert feed.disconnected_slow == 1 and len(feed) == 0
+
+def test_live_endpoint_rejects_invalid_tokens():
+    client = TestClient(app)
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/routes/live?token=not-a-jwt"):
+            pass
+    assert exc_info.value.code == 1008
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString, Point
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.db import async_database_url
+from app.models import models
+from app.services import seats
+
+SEATS = 20
+PAYERS = 500
+
+def create_route_with_bookings(db: Session, payers: int, hold: bool):
+    suffix = uuid.uuid4().hex[:8]
+    driver = models.User(full_name="Conductor Inventario", phone_number=f"39{suffix}")
+    db.add(driver)
+    db.flush()
+    vehicle = models.Vehicle(owner_id=driver.id, brand="Mazda", model="2", color="Rojo", license_plate=f"INV{suffix}")
+    db.add(vehicle)
+    db.flush()
+    route = models.Route(
+        driver_id=driver.id, vehicle_id=vehicle.id,
+        departure_time=datetime.utcnow() + timedelta(hours=1),
+        estimated_arrival_time=datetime.utcnow() + timedelta(hours=2),
+        available_seats=SEATS, price_per_km=500,
+        path=from_shape(LineString([(-76.53, 3.42), (-76.52, 3.43)]), srid=4326),
+    )
+    db.add(route)
+    db.flush()
+    point = from_shape(Point(-76.53, 3.42), srid=4326)
+    bookings = [
+        models.Booking(
+            passenger_id=driver.id, route_id=route.id, pickup_point=point, dropoff_point=point,
+            calculated_price=1000, hold_expires_at=seats.hold_expiry() if hold else None,
+        )
+        for _ in range(payers)
+    ]
+    db.add_all(bookings)
+    db.commit()
+    return route.id, [b.id for b in bookings]
+
+async def pay_concurrently(booking_ids):
+    engine = create_async_engine(async_database_url(os.environ["TEST_DATABASE_URL"]), pool_size=20, max_overflow=0)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def pay(booking_id):
+        async with session_factory() as db:
+            booking = await db.get(models.Booking, booking_id)
+            if await seats.confirm_booking(db, booking):
+                await db.commit()
+                return True
+            await db.rollback()
+            return False
+
+    try:
+        return await asyncio.gather(*(pay(booking_id) for booking_id in booking_ids))
+    finally:
+        await engine.dispose()
+
+def test_concurrent_payers_never_oversell(client: TestClient, db_session: Session):
+    """500 pagos simultáneos sobre una ruta de 20 asientos: exactamente 20 se confirman."""
+    route_id, booking_ids = create_route_with_bookings(db_session, PAYERS, hold=False)
+
+    start = time.perf_counter()
+    results = asyncio.run(pay_concurrently(booking_ids))
+    elapsed = time.perf_counter() - start
+
+    assert sum(results) == SEATS
+    assert elapsed < 30
+    db_session.expire_all()
+    route = db_session.get(models.Route, route_id)
+    assert route.available_seats == 0
+    assert route.status == models.RouteStatus.full
+    confirmed = db_session.query(models.Booking).filter_by(route_id=route_id, status=models.BookingStatus.confirmed).count()
+    assert confirmed == SEATS
+
+def test_expired_holds_return_seats(client: TestClient, db_session: Session):
+    route_id, booking_ids = create_route_with_bookings(db_session, 3, hold=True)
+    db_session.query(models.Route).filter_by(id=route_id).update({"available_seats": SEATS - 3})
+    db_session.query(models.Booking).filter(models.Booking.id.in_(booking_ids[:2])).update(
+        {"hold_expires_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db_session.commit()
+
+    async def sweep():
+        engine = create_async_engine(async_database_url(os.environ["TEST_DATABASE_URL"]))
+        try:
+            async with async_sessionmaker(engine)() as db:
+                released = await seats.release_expired_holds(db, route_id)
+                await db.commit()
+                return released
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(sweep()) == {route_id: 2}
+    db_session.expire_all()
+    assert db_session.get(models.Route, route_id).available_seats == SEATS - 1
+    assert db_session.get(models.Booking, booking_ids[0]).status == models.BookingStatus.expired
+    assert db_session.get(models.Booking, booking_ids[2]).status == models.BookingStatus.pending
@@ -0,0 +1,47 @@
+import random
+
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point
+
+from app.services.geojson import _path_options, PathFormat, serialize_path
+from app.services.simplification import level_for_zoom, path_levels, simplify, tolerance_degrees
+from benchmarks.synthetic import synthetic_route
+
+def test_simplified_path_stays_within_tolerance():
+    coords = synthetic_route(random.Random(7), 2000, step_m=20.0)
+    for tolerance_m in (5.0, 25.0):
+        simplified = simplify(coords, tolerance_m)
+        assert len(simplified.coords) < len(coords)
+        assert simplified.coords[0] == tuple(coords[0]) and simplified.coords[-1] == tuple(coords[-1])
+        # Garantía de Douglas-Peucker: ningún vértice original queda más lejos que la tolerancia
+        worst = max(simplified.distance(Point(c)) for c in coords)
+        assert worst <= tolerance_degrees(tolerance_m) + 1e-12
+
+def test_path_levels_reduce_vertices():
+    coords = synthetic_route(random.Random(3), 1000, step_m=20.0)
+    levels = {name: to_shape(value) for name, value in path_levels(coords).items()}
+    assert len(levels["path"].coords) == 1000
+    assert len(levels["path"].coords) > len(levels["path_medium"].coords) > len(levels["path_coarse"].coords)
+
+def test_level_for_zoom():
+    assert level_for_zoom(None) == "path"
+    assert level_for_zoom(18) == "path"
+    assert level_for_zoom(14) == "path_medium"
+    assert level_for_zoom(5) == "path_coarse"
+
+def test_serialize_path_uses_level_for_zoom():
+    levels = path_levels(synthetic_route(random.Random(5), 500, step_m=20.0))
+    simplified = {"path_medium": levels["path_medium"], "path_coarse": levels["path_coarse"]}
+    token = _path_options.set((PathFormat.geojson, None, 8))
+    try:
+        coarse = serialize_path(levels["path"], None, simplified)
+    finally:
+        _path_options.reset(token)
+    assert len(coarse["coordinates"]) == len(to_shape(levels["path_coarse"]).coords)
+    # Sin zoom (o si la ruta aún no tiene versiones simplificadas) se devuelve el path completo
+    assert len(serialize_path(levels["path"], None, simplified)["coordinates"]) == 500
+    token = _path_options.set((PathFormat.geojson, None, 8))
+    try:
+        assert len(serialize_path(levels["path"], None, {"path_coarse": None})["coordinates"]) == 500
+    finally:
+        _path_options.reset(token)
@@ -0,0 +1,49 @@
+import random
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString
+
+from app.services.pricing import stop_distance_km
+from app.services.route_geometry import RouteGeometry, geodesic_distance, price_pairs
+from app.services.stops import generate_stops, given_stops
+from benchmarks.synthetic import synthetic_route
+
+def test_generated_stops_are_evenly_spaced_along_the_path():
+    coords = synthetic_route(random.Random(11), 200, step_m=40.0)
+    geometry = RouteGeometry(np.asarray(coords))
+    stops = generate_stops(geometry, 250.0)
+
+    assert stops[0][:2] == coords[0] and stops[-1][:2] == coords[-1]
+    assert stops[0][2] == 0.0 and stops[-1][2] == 1.0
+    fractions = [fraction for _, _, fraction in stops]
+    assert fractions == sorted(fractions)
+    # La distancia sobre el path entre paradas consecutivas es el intervalo (salvo el último tramo)
+    along = geometry.length_between(fractions[:-1], fractions[1:])
+    assert np.allclose(along[:-1], 250.0, atol=0.5)
+    assert 0 < along[-1] <= 250.0 + 0.5
+    # Y cada parada está sobre el path: su fracción es la de ST_LineLocatePoint
+    points = np.asarray([stop[:2] for stop in stops])
+    assert np.allclose(geometry.locate(points), fractions, atol=1e-9)
+
+def test_given_stops_get_their_fraction():
+    geometry = RouteGeometry(np.asarray([(-76.53676, 3.42158), (-76.53000, 3.42500), (-76.52000, 3.43000)]))
+    stops = given_stops(geometry, [[-76.53676, 3.42158], [-76.53000, 3.42500, 0.0], [-76.52000, 3.43000]])
+    assert [round(fraction, 6) for _, _, fraction in stops][::2] == [0.0, 1.0]
+    assert 0 < stops[1][2] < 1
+
+def test_price_between_stops_matches_projected_price():
+    coords = synthetic_route(random.Random(5), 80, step_m=60.0)
+    route = SimpleNamespace(id=uuid.uuid4(), price_per_km=400,
+                            path=from_shape(LineString(coords), srid=4326, extended=True))
+    stops = generate_stops(RouteGeometry(np.asarray(coords)), 300.0)
+    pickup, dropoff = stops[2], stops[-3]
+    [projected], _ = price_pairs(route, [pickup[:2]], [dropoff[:2]])
+    assert abs(stop_distance_km(route, pickup[2], dropoff[2]) - projected) < 1e-6
+    # Un tramo recto de un solo segmento mide lo mismo que la distancia geodésica entre las paradas
+    straight = SimpleNamespace(id=uuid.uuid4(), price_per_km=400,
+                               path=from_shape(LineString([(-76.53, 3.42), (-76.52, 3.43)]), srid=4326, extended=True))
+    expected = float(geodesic_distance(np.array([-76.53]), np.array([3.42]), np.array([-76.52]), np.array([3.43]))[0])
+    assert abs(stop_distance_km(straight, 0.0, 1.0) * 1000 - expected) < 1e-6
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services import system_config
+from app.services.system_config import DEFAULT_PRICE_PER_KM, ConfigRegistry, validate
+
+def test_registry_serves_typed_values_from_memory():
+    registry = ConfigRegistry()
+    registry.replace([("default_price_per_km_cop", "350.0"), ("support_phone", "+573000000000")])
+    assert registry.get(DEFAULT_PRICE_PER_KM) == 350.0
+    assert isinstance(registry.get(DEFAULT_PRICE_PER_KM), float)
+    assert registry.version == 1
+
+    registry.set("default_price_per_km_cop", "420")
+    assert registry.get(DEFAULT_PRICE_PER_KM) == 420.0
+    assert registry.version == 2
+
+def test_invalid_and_missing_values():
+    registry = ConfigRegistry()
+    # Un valor que no se puede convertir no tumba la carga de las demás claves
+    registry.replace([("default_price_per_km_cop", "barato")])
+    assert registry.loaded
+    assert registry.get(DEFAULT_PRICE_PER_KM, None) is None
+    with pytest.raises(KeyError):
+        registry.get(DEFAULT_PRICE_PER_KM)
+    with pytest.raises(ValueError):
+        validate("default_price_per_km_cop", "barato")
+    validate("unknown_key", "anything")
+
+def test_notification_is_sent_in_the_writer_transaction():
+    class RecordingSession:
+        async def execute(self, statement):
+            self.sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    db = RecordingSession()
+    asyncio.run(system_config.notify_change(db, "default_price_per_km_cop"))
+    assert "pg_notify('system_config', 'default_price_per_km_cop')" in db.sql
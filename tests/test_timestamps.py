@@ -0,0 +1,72 @@
+import uuid
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.api.auth import create_user_access_token
+from app.config import settings
+from app.models import models
+
+# Las columnas son TIMESTAMP sin zona horaria; el cliente manda fechas con zona (Z u offset)
+PATH = [[-76.53676, 3.42158], [-76.53000, 3.42500], [-76.52000, 3.43000]]
+SEARCH = {"from_lat": 3.421, "from_lon": -76.536, "to_lat": 3.430, "to_lon": -76.520, "buffer_meters": 1000}
+
+def create_driver(db: Session):
+    suffix = uuid.uuid4().hex[:8]
+    driver = models.User(full_name="Conductor Zonas", phone_number=f"39{suffix}")
+    db.add(driver)
+    db.flush()
+    vehicle = models.Vehicle(owner_id=driver.id, brand="Renault", model="Logan", color="Azul", license_plate=f"TZ{suffix}")
+    db.add(vehicle)
+    db.commit()
+    return {"Authorization": f"Bearer {create_user_access_token(driver)}"}, str(vehicle.id)
+
+def create_route(client: TestClient, headers, vehicle_id, departure, arrival, **extra):
+    response = client.post("/routes/", headers=headers, json={
+        "departure_time": departure, "estimated_arrival_time": arrival, "available_seats": 2,
+        "price_per_km": 500.0, "vehicle_id": vehicle_id, "path": {"type": "LineString", "coordinates": PATH},
+        **extra,
+    })
+    assert response.status_code == 201, response.json()
+    return response.json()
+
+def test_aware_timestamps_on_create_search_and_match(client: TestClient, db_session: Session, monkeypatch):
+    # Sin índice en memoria ni caché: los filtros y el cursor van a la consulta de asyncpg
+    monkeypatch.setattr(settings, "ROUTE_INDEX_ENABLED", False)
+    monkeypatch.setattr(settings, "SEARCH_CACHE_ENABLED", False)
+    headers, vehicle_id = create_driver(db_session)
+    first = create_route(client, headers, vehicle_id, "2030-05-01T08:00:00Z", "2030-05-01T09:00:00Z")
+    second = create_route(client, headers, vehicle_id, "2030-05-01T04:30:00-05:00", "2030-05-01T05:30:00-05:00")
+    assert first["departure_time"].startswith("2030-05-01T08:00:00")
+    assert second["departure_time"].startswith("2030-05-01T09:30:00")
+
+    window = {"departure_after": "2030-05-01T07:00:00Z", "departure_before": "2030-05-01T05:00:00-05:00"}
+    response = client.get("/routes/search", headers=headers, params={**SEARCH, **window, "limit": 1})
+    assert response.status_code == 200, response.json()
+    assert [route["id"] for route in response.json()] == [first["id"]]
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/routes/search", headers=headers, params={**SEARCH, **window, "limit": 1, "cursor": cursor})
+    assert response.status_code == 200, response.json()
+    assert [route["id"] for route in response.json()] == [second["id"]]
+
+    # Sin desired_departure se usa ahora (con zona); con Z, la más cercana a esa hora va primero
+    response = client.get("/routes/match", headers=headers, params={**SEARCH, **window})
+    assert response.status_code == 200, response.json()
+    response = client.get("/routes/match", headers=headers, params={**SEARCH, "desired_departure": "2030-05-01T09:25:00Z"})
+    assert response.status_code == 200, response.json()
+    assert response.json()[0]["route"]["id"] == second["id"]
+
+def test_aware_window_on_route_occurrences(client: TestClient, db_session: Session):
+    headers, vehicle_id = create_driver(db_session)
+    day = date.today() + timedelta(days=1) # dentro de la ventana de ocurrencias generadas
+    route = create_route(client, headers, vehicle_id, f"{day}T07:00:00-05:00", f"{day}T08:00:00-05:00",
+                         recurrence={"weekdays": [0, 1, 2, 3, 4, 5, 6]})
+    response = client.get(f"/routes/{route['id']}/occurrences", headers=headers, params={
+        "departure_after": f"{day + timedelta(days=1)}T00:00:00Z",
+        "departure_before": f"{day + timedelta(days=3)}T00:00:00-05:00",
+    })
+    assert response.status_code == 200, response.json()
+    assert [occurrence["departure_time"][:16] for occurrence in response.json()] == [
+        f"{day + timedelta(days=1)}T12:00", f"{day + timedelta(days=2)}T12:00",
+    ]
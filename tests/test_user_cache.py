@@ -0,0 +1,76 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy.orm import Session
+
+from app.api.auth import create_user_access_token, get_current_user
+from app.config import settings
+from app.models import models
+from app.services.user_cache import CachedUser, user_cache
+
+def make_user():
+    return models.User(
+        id=uuid.uuid4(), full_name="Ana Gómez", email="ana@example.com",
+        phone_number="+573001112233", created_at=datetime(2024, 5, 1, 12, 30),
+        role=models.UserRole.user,
+    )
+
+class FailingSession:
+    def __init__(self):
+        self.info = {}
+
+    async def scalar(self, *args):
+        raise AssertionError("No debería consultar la BD")
+
+def test_cached_user_claims_roundtrip():
+    user = make_user()
+    cached = CachedUser.from_claims(user.id, CachedUser.from_model(user).to_claims())
+    assert cached.id == user.id
+    assert cached.email == user.email
+    assert cached.created_at == user.created_at
+    assert cached.role == models.UserRole.user
+
+def test_get_current_user_uses_cache():
+    user = make_user()
+    user_cache.clear()
+    user_cache.set(str(user.id), CachedUser.from_model(user))
+    token = create_user_access_token(user)
+    assert asyncio.run(get_current_user(token=token, db=FailingSession())).email == user.email
+    user_cache.invalidate(str(user.id))
+    assert user_cache.get(str(user.id)) is None
+
+def test_stateless_token_skips_database(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_STATELESS_TOKENS", True)
+    user = make_user()
+    user_cache.clear()
+    token = create_user_access_token(user)
+    assert jwt.get_unverified_claims(token)["usr"]["phone_number"] == user.phone_number
+    current = asyncio.run(get_current_user(token=token, db=FailingSession()))
+    assert current.id == user.id and current.full_name == user.full_name
+
+def test_update_evicts_only_after_commit(client: TestClient, db_session: Session):
+    """Regresión: invalidar al hacer flush dejaba que una lectura concurrente recacheara la fila vieja."""
+    suffix = uuid.uuid4().hex[:8]
+    user = models.User(full_name="Antes", phone_number=f"36{suffix}")
+    db_session.add(user)
+    db_session.commit()
+    user_id = str(user.id)
+    user_cache.clear()
+
+    user.full_name = "Después"
+    db_session.flush()
+    # Otra petición, en su propia conexión, aún lee la fila confirmada (la vieja) y la cachea
+    with Session(db_session.get_bind()) as other:
+        user_cache.set(user_id, CachedUser.from_model(other.get(models.User, user.id)))
+    assert user_cache.get(user_id).full_name == "Antes"
+    db_session.commit()
+    assert user_cache.get(user_id) is None
+
+    # Si se deshace, no queda nada pendiente de invalidar
+    user.full_name = "Descartado"
+    db_session.flush()
+    db_session.rollback()
+    assert "stale_users" not in db_session.info